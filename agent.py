@@ -1,140 +1,454 @@
 # backend/agent.py
-from langchain.agents import initialize_agent, Tool, AgentType
-from langchain.memory import ConversationBufferWindowMemory
 from tools.weather import get_weather_forecast
 from tools.crop_advisory import get_crop_advice
-from tools.finance_info import get_finance_info_tool
+from tools.finance_info import get_finance_info_tool, FORMATTERS
 from tools.policy_finder import get_policy_info_tool
+from tools.mandi_price import get_mandi_price_tool
+from utils.response_cache import response_cache, RESPONSE_CACHE_ENABLED
+from utils.intent_router import get_intent_router, ROUTER_ENABLED, TOOL_INTENTS, ARGUMENT_EXTRACTORS, OTHER
+from utils.retrieval import get_retrieval_index, MIN_CONFIDENCE
+from utils.upstream_health import upstream_available
+from utils.llm_client import get_llm_client, LLMError
+from utils.conversation_log import get_conversation_log, ConversationRecord
+from utils.tracing import span, traced, in_context
+from utils.rate_limit import charge_current
 from starlette.concurrency import run_in_threadpool
-from langchain_groq import ChatGroq
-from deep_translator import GoogleTranslator
 from datetime import datetime
-from typing import Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+import asyncio
+import json
 import os
+import re
+import time
 
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
+if TYPE_CHECKING:
+    from utils.conversation_memory import TokenBudgetMemory
+
 groq_key = os.getenv("GROQ_API_KEY")
 
-llm = ChatGroq(
-    model="meta-llama/llama-4-scout-17b-16e-instruct",
-    api_key=groq_key,
-)
+
+@lru_cache(maxsize=None)
+def get_llm():
+    """Chat model for the ReAct agent, created on first use (most turns never need it)"""
+    from langchain_groq import ChatGroq
+    return ChatGroq(
+        model="meta-llama/llama-4-scout-17b-16e-instruct",
+        api_key=groq_key,
+    )
+
+
+@dataclass(slots=True)
+class AgentTool:
+    """
+    A tool the agent can call. LangChain (and its Tool class) is only imported
+    when the ReAct agent is first built, keeping it out of `import main`.
+    """
+    name: str
+    func: Callable[[str], str]
+    description: str
+
 
 tools = [
-    Tool(name="WeatherTool", func=get_weather_forecast,
-         description="Get weather forecast by location. Use this when user asks about weather or when crop advice needs location-specific weather data."),
-    Tool(name="CropAdvisoryTool", func=get_crop_advice,
-         description="Get crop advice based on location, soil, weather conditions. Use this for questions about what crops to plant, harvest timing, or farming advice."),
-    Tool(name="FinanceTool", func=get_finance_info_tool,
-         description="Find finance information, loans, subsidies, and credit options for farmers. Use this for financial queries."),
-    Tool(name="PolicyTool", func=get_policy_info_tool,
-         description="Find relevant government schemes, policies, and agricultural programs. Use this for policy-related questions."),
+    AgentTool(name="WeatherTool", func=get_weather_forecast,
+              description="Get weather forecast by location. Use this when user asks about weather or when crop advice needs location-specific weather data."),
+    AgentTool(name="CropAdvisoryTool", func=get_crop_advice,
+              description="Get crop advice based on location, soil, weather conditions. Accepts any Indian district, town or village name (optionally with season), or soil_type=..., rainfall=..., temperature=.... Use this for questions about what crops to plant, harvest timing, or farming advice."),
+    AgentTool(name="FinanceTool", func=get_finance_info_tool,
+              description="Find finance information, loans, subsidies, and credit options for farmers. Use this for financial queries."),
+    AgentTool(name="PolicyTool", func=get_policy_info_tool,
+              description="Find relevant government schemes, policies, and agricultural programs. Use this for policy-related questions."),
+    AgentTool(name="MandiPriceTool", func=get_mandi_price_tool,
+              description="Get mandi (market) prices for a crop or commodity: latest prices, 7/30-day ranges and trend. Input the commodity and optionally a market or state, e.g. 'onion Nashik' or 'cotton Gujarat'. Use this when farmers ask about selling prices or market rates."),
 ]
 
+# Time every tool call, whichever path (router, parallel turn, ReAct) makes it
+for _tool in tools:
+    _tool.func = traced(f"tool.{_tool.name}")(_tool.func)
 
-def create_new_conversation() -> Dict:
-    """Create a new conversation with memory"""
-    memory = ConversationBufferWindowMemory(
-        k=10,  # Keep last 10 exchanges
-        return_messages=True,
-        memory_key="chat_history"
-    )
+# Tool functions the intent router may call directly, by intent
+ROUTED_TOOLS = {TOOL_INTENTS[t.name]: t.func for t in tools if t.name in TOOL_INTENTS}
+
+
+@lru_cache(maxsize=None)
+def _langchain_tools() -> List:
+    from langchain_core.tools import Tool
+    return [Tool(name=t.name, func=t.func, description=t.description) for t in tools]
+
+
+def tool_usage_recorder():
+    """Callback handler that collects the names of the tools the agent calls during one run"""
+    return _tool_usage_recorder_class()()
 
+
+@lru_cache(maxsize=None)
+def _tool_usage_recorder_class():
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class ToolUsageRecorder(BaseCallbackHandler):
+        def __init__(self):
+            self.tools_used: List[str] = []
+
+        def on_tool_start(self, serialized: Dict, input_str: str, **kwargs):
+            self.tools_used.append((serialized or {}).get("name", ""))
+
+        def on_llm_start(self, serialized: Dict, prompts: List[str], **kwargs):
+            # ReAct steps call Groq through LangChain, not LLMClient; charge them here
+            charge_current("llm_calls")
+
+    return ToolUsageRecorder
+
+
+AGENT_SYSTEM_MESSAGE = """You are an expert agricultural advisor helping Indian farmers. Your role is to:
+
+1. **Always be helpful and informative** - Provide detailed, practical advice
+2. **Ask for missing information** - If a user asks about crops but doesn't provide location, ask them to specify their location
+3. **Use appropriate tools** - Use weather tool for location-specific weather, crop advisory for farming advice, finance tool for money matters, policy tool for government schemes
+4. **Provide context-aware responses** - Consider the conversation history and previous questions
+5. **Be encouraging and supportive** - Farming is challenging, so be positive and motivating
+6. **Give actionable advice** - Provide specific, implementable recommendations
+7. **Mention relevant schemes** - Always inform about applicable government programs
+
+Remember: If someone asks "what crop is suitable here" without specifying location, ask them to provide their location first, then use the weather and crop advisory tools to give specific recommendations."""
+
+# Plan independent tool calls in one LLM step and run them concurrently
+PARALLEL_TOOLS_ENABLED = os.getenv("AGENT_PARALLEL_TOOLS", "1") != "0"
+MAX_PARALLEL_TOOLS = int(os.getenv("AGENT_MAX_PARALLEL_TOOLS", 4))
+TOOL_TIMEOUT = float(os.getenv("AGENT_TOOL_TIMEOUT", 30))
+
+AGENT_TOOL_WORKERS = int(os.getenv("AGENT_TOOL_WORKERS", 8))
+_tool_executor = ThreadPoolExecutor(max_workers=AGENT_TOOL_WORKERS, thread_name_prefix="agent-tool")
+
+
+def _new_tool_executor():
+    # Executor threads are not copied into forked workers
+    global _tool_executor
+    _tool_executor = ThreadPoolExecutor(max_workers=AGENT_TOOL_WORKERS, thread_name_prefix="agent-tool")
+
+
+os.register_at_fork(after_in_child=_new_tool_executor)
+
+PLANNER_PROMPT = """You plan tool calls for an agricultural assistant for Indian farmers.
+
+Available tools:
+{tools}
+
+Conversation so far:
+{history}
+
+Farmer's question: {query}
+
+List every tool call needed to answer the question. The calls run at the same time, so only include calls whose input does not depend on another call's output. Use the conversation to fill in missing details such as the location.
+Reply with JSON only, in the form {{"calls": [{{"tool": "<tool name>", "input": "<tool input>"}}]}}.
+Reply {{"calls": []}} if no tool is needed or a required detail (such as the location) is unknown."""
+
+# Answers given while the LLM is unreachable (pre-translated at warm-up)
+OFFLINE_HELP = ("I can't reach the online assistant right now, so I can only answer simple questions. "
+                "Ask about the weather in your district, which crops to grow, mandi prices, loans or "
+                "government schemes.")
+OFFLINE_NEED_LOCATION = "Please tell me your district or village so I can check the weather."
+OFFLINE_MESSAGES = (OFFLINE_HELP, OFFLINE_NEED_LOCATION)
+
+SYNTHESIS_PROMPT = """Conversation so far:
+{history}
+
+Farmer's question: {query}
+
+Tool results:
+{observations}
+
+Using the tool results, answer the farmer's question completely and practically."""
+
+DIRECT_ANSWER_PROMPT = """Conversation so far:
+{history}
+
+Farmer's question: {query}
+
+No tool is needed, or a required detail is missing. Answer the farmer's question directly; if a detail such as the location is needed, ask for it."""
+
+
+def create_new_conversation() -> Dict:
+    """Create a new conversation; its memory is built on first use (see conversation_memory)"""
     return {
-        "memory": memory,
+        "memory": None,
         "created_at": datetime.now(),
         "last_activity": datetime.now(),
-        "conversation_history": []
+        "log": get_conversation_log()
     }
 
 
-def create_agent_with_memory(memory: ConversationBufferWindowMemory):
+def conversation_memory(conversation_data: Dict) -> "TokenBudgetMemory":
+    """
+    The conversation's memory, created on first use so that LangChain, which
+    the memory builds on, is not imported with the app.
+    """
+    if conversation_data["memory"] is None:
+        from utils.conversation_memory import TokenBudgetMemory
+        # Recent turns plus a rolling summary, bounded by MEMORY_TOKEN_LIMIT
+        conversation_data["memory"] = TokenBudgetMemory(
+            return_messages=True,
+            memory_key="chat_history",
+            # Shared across worker processes when a shared store is configured
+            store_key="conversation:global"
+        )
+    return conversation_data["memory"]
+
+
+def warm_up_agent():
+    """Import the agent stack and build one executor so the first ReAct turn starts hot"""
+    from utils.conversation_memory import TokenBudgetMemory
+    create_agent_with_memory(TokenBudgetMemory())
+
+
+def create_agent_with_memory(memory: "TokenBudgetMemory"):
     """Create an agent with conversation memory"""
+    from langchain.agents import initialize_agent, AgentType
     return initialize_agent(
-        tools,
-        llm,
+        _langchain_tools(),
+        get_llm(),
         agent=AgentType.CONVERSATIONAL_REACT_DESCRIPTION,
         verbose=True,
         memory=memory,
         handle_parsing_errors=True,
         max_iterations=5,
         agent_kwargs={
-            "system_message": """You are an expert agricultural advisor helping Indian farmers. Your role is to:
+            "system_message": AGENT_SYSTEM_MESSAGE
+        }
+    )
 
-1. **Always be helpful and informative** - Provide detailed, practical advice
-2. **Ask for missing information** - If a user asks about crops but doesn't provide location, ask them to specify their location
-3. **Use appropriate tools** - Use weather tool for location-specific weather, crop advisory for farming advice, finance tool for money matters, policy tool for government schemes
-4. **Provide context-aware responses** - Consider the conversation history and previous questions
-5. **Be encouraging and supportive** - Farming is challenging, so be positive and motivating
-6. **Give actionable advice** - Provide specific, implementable recommendations
-7. **Mention relevant schemes** - Always inform about applicable government programs
 
-Remember: If someone asks "what crop is suitable here" without specifying location, ask them to provide their location first, then use the weather and crop advisory tools to give specific recommendations."""
-        }
+def _history_messages(memory) -> List:
+    return memory.load_memory_variables({}).get("chat_history", [])
+
+
+def _history_text(memory, max_messages: int = 6) -> str:
+    messages = _history_messages(memory)[-max_messages:]
+    speakers = {"human": "Farmer", "ai": "Advisor", "system": "Earlier"}
+    lines = [f"{speakers.get(m.type, m.type)}: {m.content}" for m in messages]
+    return "\n".join(lines) or "(none)"
+
+
+def _parse_plan(text: str) -> Optional[List[Tuple[str, str]]]:
+    """
+    Valid, de-duplicated (tool, input) pairs from the planner's JSON reply;
+    None when the reply is not a plan at all.
+    """
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    if not match:
+        return None
+    try:
+        calls = json.loads(match.group(0)).get("calls", [])
+    except (ValueError, AttributeError):
+        return None
+    if not isinstance(calls, list):
+        return None
+
+    tool_names = {t.name for t in tools}
+    plan = []
+    for call in calls:
+        if not isinstance(call, dict):
+            continue
+        name, tool_input = call.get("tool"), str(call.get("input", "")).strip()
+        if name in tool_names and (name, tool_input) not in plan:
+            plan.append((name, tool_input))
+    return plan[:MAX_PARALLEL_TOOLS]
+
+
+def _run_tool(name: str, tool_input: str) -> str:
+    tool = next(t for t in tools if t.name == name)
+    try:
+        return str(tool.func(tool_input))
+    except Exception as e:
+        return f"Error: {e}"
+
+
+async def run_parallel_turn(query: str, memory) -> Optional[Tuple[str, List[str]]]:
+    """
+    One planning call that may request several tools, the tools run concurrently,
+    then one call that answers from all observations (or, with no tool needed, straight
+    from the question). Tools still running after TOOL_TIMEOUT are left out of the answer.
+    Returns (response, tools used), or None when the question should go through the
+    ReAct agent instead.
+    """
+    client = get_llm_client()
+    if not client.configured:
+        return None
+
+    history = _history_text(memory)
+    tool_list = "\n".join(f"- {t.name}: {t.description}" for t in tools)
+    try:
+        with span("agent.plan"):
+            plan_text = await client.acomplete(
+                PLANNER_PROMPT.format(tools=tool_list, history=history, query=query),
+                temperature=0, max_tokens=300
+            )
+    except LLMError as e:
+        print(f"Tool planning failed, using ReAct agent: {e}")
+        return None
+
+    plan = _parse_plan(plan_text)
+    if plan is None:
+        return None
+    if not plan:
+        # Nothing to look up (or the location is missing): one call answers or asks
+        try:
+            with span("agent.answer"):
+                response = await client.acomplete(
+                    DIRECT_ANSWER_PROMPT.format(history=history, query=query),
+                    system=AGENT_SYSTEM_MESSAGE
+                )
+        except LLMError as e:
+            print(f"Direct answer failed, using ReAct agent: {e}")
+            return None
+        return response, []
+
+    loop = asyncio.get_running_loop()
+    # run_in_executor does not carry the request context over to the worker threads
+    futures = [loop.run_in_executor(_tool_executor, in_context(_run_tool), name, tool_input)
+               for name, tool_input in plan]
+    _, pending = await asyncio.wait(futures, timeout=TOOL_TIMEOUT)
+    # Answer from the tools that finished rather than rerunning all of them through ReAct;
+    # queued calls are dropped, ones already running finish in the background
+    for future in pending:
+        future.cancel()
+
+    observations = "\n\n".join(
+        f"[{name}] input: {tool_input}\n"
+        + (future.result() if future.done() and not future.cancelled()
+           else f"No answer within {TOOL_TIMEOUT:g}s")
+        for (name, tool_input), future in zip(plan, futures)
     )
+    try:
+        with span("agent.synthesize"):
+            response = await client.acomplete(
+                SYNTHESIS_PROMPT.format(history=history, query=query, observations=observations),
+                system=AGENT_SYSTEM_MESSAGE
+            )
+    except LLMError as e:
+        print(f"Answer synthesis failed, using ReAct agent: {e}")
+        return None
+    return response, [name for name, _ in plan]
+
+
+def answer_offline(query: str, decision) -> str:
+    """
+    Answer without the LLM: run the tools the query's keywords (or a confident
+    router prediction) point at, else the best FAQ/scheme passage, else help text.
+    """
+    intents = [intent for intent in ROUTED_TOOLS if intent in decision.keyword_intents]
+    if not intents and decision.intent != OTHER:
+        intents = [decision.intent]
+
+    answers = []
+    for intent in intents[:MAX_PARALLEL_TOOLS]:
+        extractor = ARGUMENT_EXTRACTORS.get(intent)
+        argument = extractor(query) if extractor else query
+        if argument is None:
+            answers.append(OFFLINE_NEED_LOCATION)
+            continue
+        try:
+            answers.append(ROUTED_TOOLS[intent](argument))
+        except Exception as e:
+            print(f"Offline {intent} answer failed: {e}")
+    if answers:
+        return "\n\n".join(answers)
+
+    hits = get_retrieval_index().search(query, k=1, sources=("faq", "scheme"))
+    if hits and hits[0].confidence >= MIN_CONFIDENCE:
+        return FORMATTERS[hits[0].source](hits[0].record)
+    return OFFLINE_HELP
 
 
 async def run_agent_with_memory(
         query: str,
         conversation_data: Dict,
         language: str = "en"
-) -> Tuple[str, List[Dict]]:
+) -> Tuple[str, ConversationRecord]:
     """
     Run agent with conversation memory
-    Returns: (response, conversation_history)
+    Returns: (response, the logged record of this turn)
     """
     try:
         # Update last activity
         conversation_data["last_activity"] = datetime.now()
 
         # Get memory from conversation
-        memory = conversation_data["memory"]
-
-        # Create agent with memory
-        agent = create_agent_with_memory(memory)
-
-        # The query is already translated to English by main.py
-        # Just run the agent with the English query
-        english_response = await run_in_threadpool(agent.run, query)
-
-        # Update conversation history
-        conversation_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "user_message": query,  # This is the English version from main.py
-            "user_language": language,
-            "agent_response": english_response,  # Keep as English, let main.py translate
-            "english_query": query,
-            "english_response": english_response
-        }
+        memory = conversation_memory(conversation_data)
+
+        # Answer repeated questions from the cache without running the agent
+        with span("agent.cache_lookup"):
+            cached_response = response_cache.get(query) if RESPONSE_CACHE_ENABLED else None
+        with span("agent.route"):
+            decision = get_intent_router().decide(query) if ROUTER_ENABLED and cached_response is None else None
+        answered_by = "cache" if cached_response is not None else "agent"
+        # Answers that may lean on earlier turns ("is it safe here?") are only right for this conversation
+        used_history = False
+
+        if cached_response is not None:
+            memory.save_context({"input": query}, {"output": cached_response})
+            english_response = cached_response
+        elif not upstream_available("groq"):
+            # Offline: deterministic tools and retrieval only, never cached over a real answer
+            decision = decision or get_intent_router().decide(query)
+            english_response = await run_in_threadpool(answer_offline, query, decision)
+            memory.save_context({"input": query}, {"output": english_response})
+            answered_by = "offline"
+        elif decision is not None and decision.routed:
+            # Single clear intent: call the tool directly instead of the ReAct loop
+            started = time.perf_counter()
+            english_response = await run_in_threadpool(ROUTED_TOOLS[decision.intent], decision.argument)
+            get_intent_router().record_routed(decision, time.perf_counter() - started)
+            memory.save_context({"input": query}, {"output": english_response})
+            answered_by = f"router:{decision.intent}"
+        else:
+            started = time.perf_counter()
+            used_history = bool(_history_messages(memory))
+            parallel = await run_parallel_turn(query, memory) if PARALLEL_TOOLS_ENABLED else None
 
-        conversation_data["conversation_history"].append(conversation_entry)
+            if parallel is not None:
+                english_response, tools_used = parallel
+                memory.save_context({"input": query}, {"output": english_response})
+                answered_by = "parallel"
+            else:
+                # Create agent with memory
+                agent = create_agent_with_memory(memory)
+                recorder = tool_usage_recorder()
+
+                # The query is already translated to English by main.py
+                # Just run the agent with the English query
+                with span("agent.react"):
+                    english_response = await run_in_threadpool(agent.run, query, callbacks=[recorder])
+                tools_used = recorder.tools_used
+
+            if decision is not None:
+                get_intent_router().record_agent(decision, tools_used, time.perf_counter() - started)
+
+        if RESPONSE_CACHE_ENABLED and cached_response is None and answered_by != "offline" and not used_history:
+            response_cache.put(query, english_response)
+
+        # Log the English query and response (main.py translates for the user)
+        record = conversation_data["log"].append(query, english_response, language, answered_by)
 
         # Return English response, let main.py handle translation
-        return english_response, conversation_data["conversation_history"]
+        return english_response, record
 
     except Exception as e:
         error_response = f"❌ Agent error: {str(e)}"
-        conversation_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "user_message": query,
-            "user_language": language,
-            "agent_response": error_response,
-            "english_query": query,
-            "english_response": error_response,
-            "error": str(e)
-        }
-
-        conversation_data["conversation_history"].append(conversation_entry)
-        return error_response, conversation_data["conversation_history"]
+        record = conversation_data["log"].append(query, error_response, language, "error", str(e))
+        return error_response, record
 
 
 # Keep the old function for backward compatibility
 async def run_agent(query: str, language: str = "en") -> str:
     """Legacy function for backward compatibility"""
+    from deep_translator import GoogleTranslator
     try:
         # Step 1: Translate the user's query to English
         if language != "en":
@@ -143,9 +457,10 @@ async def run_agent(query: str, language: str = "en") -> str:
             translated_query = query
 
         # Step 2: Run the agent with the translated English query
+        from langchain.agents import initialize_agent, AgentType
         agent = initialize_agent(
-            tools,
-            llm,
+            _langchain_tools(),
+            get_llm(),
             agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
             verbose=True,
         )
@@ -0,0 +1,147 @@
+# benchmarks/import_time.py
+"""
+Cold-start benchmark for the FastAPI app.
+
+Imports `main` in fresh interpreters and reports the wall time, the slowest
+imports from `python -X importtime`, and whether any of the heavy voice, image
+or LangChain modules were loaded (they should only load on first use or at
+warm-up). It exits 1 when one was, or when the median import is over
+--max-seconds (1 s by default, the cold-start goal).
+
+    python benchmarks/import_time.py                  # 5 runs, top 25 imports; exit 1 over 1 s
+    python benchmarks/import_time.py --runs 10 --json
+    python benchmarks/import_time.py --max-seconds 0  # report only, no time limit
+    python benchmarks/import_time.py --save NAME      # store the report under NAME in the baseline
+
+baselines/import_time.json holds reports measured before ("before_lazy_imports")
+and after ("after_lazy_imports") the heavy modules were made lazy, with every
+requirement installed. Like the micro-benchmark baseline, the timings are from
+one machine; re-measure both on yours before comparing.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baselines", "import_time.json")
+
+# Modules that must not be imported by `import main`
+HEAVY_MODULES = ["whisper", "torch", "speech_recognition", "pydub", "gtts", "langdetect", "PIL",
+                 "langchain_groq", "langchain", "langchain_core", "langsmith"]
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"seconds": elapsed, "heavy_loaded": heavy, "modules": len(sys.modules)}}))
+"""
+
+
+def _run(args: List[str]) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True,
+                          env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"})
+
+
+def measure(module: str) -> Dict:
+    """One cold import of the module in a fresh interpreter"""
+    proc = _run(["-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)])
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def import_profile(module: str) -> List[Tuple[int, int, str]]:
+    """(self µs, cumulative µs, module) for every import, from -X importtime"""
+    proc = _run(["-X", "importtime", "-c", f"import {module}"])
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        # Nested imports are indented under the module that imported them
+        rows.append((int(self_us), int(cumulative_us), name[1:].rstrip()))
+    return rows
+
+
+def _commit() -> Optional[str]:
+    proc = subprocess.run(["git", "rev-parse", "--short=12", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+    return proc.stdout.strip() or None
+
+
+def save_baseline(name: str, report: Dict):
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            baseline = json.load(f)
+    baseline[name] = report
+    os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+    with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--json", action="store_true", help="print a JSON report")
+    parser.add_argument("--max-seconds", type=float, default=1.0,
+                        help="fail if the median import is slower (default 1; 0 disables)")
+    parser.add_argument("--save", metavar="NAME", help="store the report under NAME in " + BASELINE_PATH)
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    seconds = [r["seconds"] for r in runs]
+    # The module itself and what it imports directly; deeper imports are inside those totals
+    top_level = sorted((row for row in import_profile(args.module) if not row[2].startswith("    ")),
+                       key=lambda row: row[1], reverse=True)
+    report = {
+        "module": args.module,
+        "commit": _commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"python": sys.version.split()[0], "system": platform.system(),
+                    "processor": platform.processor() or platform.machine()},
+        "runs": args.runs,
+        "median_seconds": round(statistics.median(seconds), 4),
+        "min_seconds": round(min(seconds), 4),
+        "max_seconds": round(max(seconds), 4),
+        "modules_loaded": runs[-1]["modules"],
+        "heavy_loaded": runs[-1]["heavy_loaded"],
+        "slowest_top_level_imports": [
+            {"module": name.strip(), "cumulative_ms": round(cum / 1000, 1), "self_ms": round(own / 1000, 1)}
+            for own, cum, name in top_level[:args.top]
+        ],
+    }
+
+    if args.save:
+        save_baseline(args.save, report)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"import {args.module}: median {report['median_seconds'] * 1000:.0f} ms "
+              f"(min {report['min_seconds'] * 1000:.0f}, max {report['max_seconds'] * 1000:.0f}) "
+              f"over {args.runs} runs, {report['modules_loaded']} modules")
+        print(f"heavy modules loaded: {', '.join(report['heavy_loaded']) or 'none'}")
+        print(f"\n{'cumulative ms':>14} {'self ms':>9}  module")
+        for row in report["slowest_top_level_imports"]:
+            print(f"{row['cumulative_ms']:>14.1f} {row['self_ms']:>9.1f}  {row['module']}")
+
+    failed = bool(report["heavy_loaded"])
+    if args.max_seconds and report["median_seconds"] > args.max_seconds:
+        print(f"median import of {args.module} is over the {args.max_seconds:g} s limit", file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+# benchmarks/loadtest/fake_upstreams.py
+"""
+Local stand-ins for every upstream the app calls, so load tests measure our
+code and not Groq's or Google's day.
+
+One threaded HTTP server answers, by path prefix:
+
+    /groq       Groq chat completions (OpenAI-compatible) and /models
+    /weather    weatherapi.com forecast.json
+    /translate  Google Translate's mobile page (what deep_translator scrapes)
+    /stt        Google speech API v2 (what SpeechRecognition's recognize_google posts to)
+    /tts        Google Translate batchexecute (what gTTS posts to)
+
+Every service has its own latency, jitter, error rate and error status, drawn
+from a seeded generator so a run is reproducible. env() gives the variables
+that point the app at the fakes.
+
+    python benchmarks/loadtest/fake_upstreams.py --port 9100 --latency groq=0.8 --error-rate stt=0.1
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from fixtures import load_queries
+
+
+@dataclass(slots=True)
+class Profile:
+    # Seconds before answering; jitter is the standard deviation around it
+    latency: float
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+
+
+# Roughly what the real services take from an Indian region
+DEFAULT_PROFILES = {
+    "groq": Profile(0.35, 0.1),
+    "weather": Profile(0.15, 0.05),
+    "translate": Profile(0.12, 0.04),
+    "stt": Profile(0.6, 0.2),
+    "tts": Profile(0.3, 0.1),
+}
+
+SERVICES = tuple(DEFAULT_PROFILES)
+
+FAKE_KEY = "loadtest-fake-key"
+
+# What the fake STT "hears" for each recognition language
+TRANSCRIPTS = {
+    "en": "which crops should I grow in Warangal during kharif",
+    "te": "వరంగల్ లో ఖరీఫ్ కాలంలో ఏ పంటలు వేయాలి",
+    "hi": "रबी में इंदौर में कौन सी फसल बोनी चाहिए",
+}
+
+
+def _plan_for(query: str) -> Dict:
+    """Planner reply in the JSON shape the agent's parallel turn expects"""
+    text = query.lower()
+    calls = []
+    if "weather" in text or "rain" in text:
+        calls.append({"tool": "WeatherTool", "input": "Guntur"})
+    if "price" in text or "mandi" in text or "market" in text:
+        calls.append({"tool": "MandiPriceTool", "input": "onion Nashik"})
+    if "crop" in text or "grow" in text or "sow" in text:
+        calls.append({"tool": "CropAdvisoryTool", "input": "Warangal kharif"})
+    if "loan" in text or "credit" in text:
+        calls.append({"tool": "FinanceTool", "input": text})
+    if "scheme" in text or "kisan" in text:
+        calls.append({"tool": "PolicyTool", "input": text})
+    return {"calls": calls}
+
+
+class FakeUpstreams:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, profiles: Optional[Dict[str, Profile]] = None,
+                 seed: int = 0):
+        self.profiles = {name: Profile(**asdict(p)) for name, p in DEFAULT_PROFILES.items()}
+        self.profiles.update(profiles or {})
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {name: {"requests": 0, "errors": 0} for name in SERVICES}
+        self.translations = {q["query"]: q["english"] for q in load_queries()}
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        """Environment that points the app at these fakes"""
+        url = self.base_url
+        return {
+            "GROQ_API_KEY": FAKE_KEY,
+            "GROQ_BASE_URL": f"{url}/groq/openai/v1",
+            # langchain-groq's own setting (the SDK adds /openai/v1 itself)
+            "GROQ_API_BASE": f"{url}/groq",
+            "WEATHER_API_KEY": FAKE_KEY,
+            "WEATHER_API_URL": f"{url}/weather/v1/forecast.json",
+            "GOOGLE_TRANSLATE_URL": f"{url}/translate/m",
+            "GOOGLE_STT_ENDPOINT": f"{url}/stt/speech-api/v2/recognize",
+            "GOOGLE_TTS_URL": f"{url}/tts",
+        }
+
+    def start(self) -> "FakeUpstreams":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-upstreams", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {name: {**asdict(self.profiles[name]), **self.stats[name]} for name in SERVICES}
+
+    def _delay_and_fail(self, service: str) -> Optional[int]:
+        """Sleep for the service's latency; the error status to answer with, if this call fails"""
+        profile = self.profiles[service]
+        with self._lock:
+            delay = max(0.0, self._rng.gauss(profile.latency, profile.jitter)) if profile.jitter else profile.latency
+            failed = self._rng.random() < profile.error_rate
+            self.stats[service]["requests"] += 1
+            self.stats[service]["errors"] += int(failed)
+        time.sleep(delay)
+        return profile.error_status if failed else None
+
+    # Service responses: (status, content type, body)
+
+    def groq(self, method: str, path: str, query: Dict, body: bytes):
+        if path.endswith("/models"):
+            return 200, "application/json", json.dumps({"object": "list", "data": [{"id": "fake", "object": "model"}]})
+        if not path.endswith("/chat/completions"):
+            return 404, "application/json", json.dumps({"error": {"message": f"no route {path}"}})
+
+        request = json.loads(body or b"{}")
+        prompt = "\n".join(str(m.get("content", "")) for m in request.get("messages", []))
+        if "You plan tool calls" in prompt:
+            question = prompt.rsplit("Farmer's question:", 1)[-1].split("\n", 1)[0]
+            content = json.dumps(_plan_for(question))
+        elif "Do I need to use a tool?" in prompt:
+            # Conversational ReAct agent: answer straight away
+            content = "Thought: Do I need to use a tool? No\nAI: " + _canned_answer(prompt)
+        elif "Action Input" in prompt:
+            # Zero-shot ReAct agent
+            content = "Thought: I now know the final answer\nFinal Answer: " + _canned_answer(prompt)
+        else:
+            content = _canned_answer(prompt)
+        prompt_tokens, completion_tokens = len(prompt) // 4, len(content) // 4
+        return 200, "application/json", json.dumps({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        })
+
+    def weather(self, method: str, path: str, query: Dict, body: bytes):
+        location = query.get("q", [""])[0]
+        if not location.strip():
+            return 400, "application/json", json.dumps({"error": {"code": 1003, "message": "Parameter q is missing."}})
+        seed = int(hashlib.sha256(location.lower().encode("utf-8")).hexdigest()[:8], 16)
+        days = []
+        for i in range(int(query.get("days", ["3"])[0])):
+            low = 18 + (seed >> i) % 8
+            days.append({
+                "date": time.strftime("%Y-%m-%d", time.gmtime(time.time() + 86400 * i)),
+                "day": {
+                    "condition": {"text": ("Sunny", "Partly cloudy", "Patchy rain possible")[(seed >> i) % 3]},
+                    "mintemp_c": float(low),
+                    "maxtemp_c": float(low + 9),
+                    "daily_chance_of_rain": (seed >> (i + 3)) % 100,
+                },
+            })
+        return 200, "application/json", json.dumps(
+            {"location": {"name": location, "country": "India"}, "forecast": {"forecastday": days}})
+
+    def translate(self, method: str, path: str, query: Dict, body: bytes):
+        text = query.get("q", [""])[0]
+        # Known queries translate to English; anything else comes back unchanged
+        translated = self.translations.get(text, text) if query.get("tl", ["en"])[0] == "en" else text
+        escaped = translated.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+        return 200, "text/html; charset=utf-8", f'<html><body><div class="result-container">{escaped}</div></body></html>'
+
+    def stt(self, method: str, path: str, query: Dict, body: bytes):
+        language = query.get("lang", ["en-US"])[0].split("-")[0]
+        transcript = TRANSCRIPTS.get(language, TRANSCRIPTS["en"])
+        result = {"result": [{"alternative": [{"transcript": transcript, "confidence": 0.92}], "final": True}],
+                  "result_index": 0}
+        return 200, "application/json; charset=utf-8", '{"result":[]}\n' + json.dumps(result, ensure_ascii=False) + "\n"
+
+    def tts(self, method: str, path: str, query: Dict, body: bytes):
+        form = parse_qs(body.decode("utf-8"))
+        text = form.get("f.req", [""])[0]
+        # About the size of real MP3 speech: ~1 KiB per 10 characters of text
+        audio = b"ID3\x04\x00\x00\x00\x00\x00\x00" + b"\xff\xfb\x90\x00" * max(64, len(text) * 25)
+        line = json.dumps([["wrb.fr", "jQ1olc", json.dumps([base64.b64encode(audio).decode("ascii")]),
+                            None, None, None, "generic"]], separators=(",", ":"))
+        return 200, "application/json; charset=utf-8", ")]}'\n\n" + line + "\n"
+
+    def _handler_class(self):
+        upstreams = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self):
+                parts = urlsplit(self.path)
+                service, _, rest = parts.path.lstrip("/").partition("/")
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                if service == "_stats":
+                    self._reply(200, "application/json", json.dumps(upstreams.snapshot()))
+                    return
+                if service not in SERVICES:
+                    self._reply(404, "application/json", json.dumps({"error": f"unknown service {service}"}))
+                    return
+                error_status = upstreams._delay_and_fail(service)
+                if error_status is not None:
+                    self._reply(error_status, "application/json",
+                                json.dumps({"error": {"message": "injected failure", "type": "fake_upstream"}}))
+                    return
+                status, content_type, text = getattr(upstreams, service)(
+                    self.command, "/" + rest, parse_qs(parts.query), body)
+                self._reply(status, content_type, text)
+
+            def _reply(self, status: int, content_type: str, text: str):
+                payload = text.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def _canned_answer(prompt: str) -> str:
+    return ("Based on the latest information, sow short-duration varieties after the first good rain, "
+            "keep fields well drained, and check the local mandi before selling. "
+            f"(fake answer to a {len(prompt)}-character prompt)")
+
+
+def parse_overrides(values, cast=float) -> Dict[str, object]:
+    """["groq=0.5,stt=1.2", "tts=0.1"] -> {"groq": 0.5, "stt": 1.2, "tts": 0.1}"""
+    overrides = {}
+    for value in values or []:
+        for item in value.split(","):
+            name, _, number = item.partition("=")
+            name = name.strip()
+            if name not in SERVICES:
+                raise ValueError(f"unknown service {name!r} (expected one of {', '.join(SERVICES)})")
+            overrides[name] = cast(number)
+    return overrides
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", action="append", help="service=seconds, e.g. groq=0.8,stt=1.5")
+    parser.add_argument("--jitter", action="append", help="service=seconds (standard deviation)")
+    parser.add_argument("--error-rate", action="append", help="service=fraction, e.g. translate=0.05")
+    parser.add_argument("--error-status", action="append", help="service=HTTP status, e.g. groq=429")
+
+
+def profiles_from_args(args) -> Dict[str, Profile]:
+    profiles = {name: Profile(**asdict(p)) for name, p in DEFAULT_PROFILES.items()}
+    for field, values, cast in (("latency", args.latency, float), ("jitter", args.jitter, float),
+                                ("error_rate", args.error_rate, float), ("error_status", args.error_status, int)):
+        for name, value in parse_overrides(values, cast).items():
+            setattr(profiles[name], field, value)
+    return profiles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--seed", type=int, default=0)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    upstreams = FakeUpstreams(args.host, args.port, profiles_from_args(args), args.seed).start()
+    print(f"Fake upstreams on {upstreams.base_url} (stats at {upstreams.base_url}/_stats); point the app at them with:")
+    for name, value in upstreams.env().items():
+        print(f"export {name}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        upstreams.stop()
+
+
+if __name__ == "__main__":
+    main()
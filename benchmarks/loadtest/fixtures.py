@@ -0,0 +1,99 @@
+# benchmarks/loadtest/fixtures.py
+"""
+Canned request payloads for the load test: audio clips, leaf images and
+multilingual queries.
+
+Clips and images are generated from a fixed seed instead of being checked in,
+so every run (and every machine) sends byte-identical payloads.
+
+    python benchmarks/loadtest/fixtures.py --out /tmp/fixtures   # write them to disk
+"""
+import argparse
+import io
+import json
+import os
+import wave
+from typing import Dict, List
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+QUERIES_PATH = os.path.join(HERE, "queries.json")
+
+SAMPLE_RATE = 16000
+CLIP_SECONDS = (2, 5, 10)
+IMAGE_SIZES = (256, 1024, 2048)
+
+
+def load_queries() -> List[Dict]:
+    """[{"language", "query", "english"}] in English, Hindi and Telugu"""
+    with open(QUERIES_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def audio_clip(seconds: float, seed: int = 0) -> bytes:
+    """16 kHz mono 16-bit WAV with speech-like bursts: voiced tones with syllable envelopes and noise"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pitch = 120 + 40 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+    # ~4 syllables a second with pauses between words
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) * (np.sin(2 * np.pi * 0.7 * t) > -0.3)
+    signal = 0.5 * voiced * envelope + 0.02 * rng.standard_normal(t.size)
+    samples = (np.clip(signal / np.abs(signal).max(), -1, 1) * 0.8 * 32767).astype("<i2")
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+def leaf_image(size: int, seed: int = 0) -> bytes:
+    """JPEG of a green leaf with brown lesions on a soil-coloured background"""
+    from PIL import Image, ImageDraw, ImageFilter
+
+    rng = np.random.default_rng(seed)
+    image = Image.new("RGB", (size, size), (96, 72, 48))
+    draw = ImageDraw.Draw(image)
+    margin = size // 10
+    draw.ellipse((margin, size // 4, size - margin, size - size // 4), fill=(52, 128, 44))
+    draw.line((margin, size // 2, size - margin, size // 2), fill=(90, 160, 70), width=max(1, size // 100))
+    for _ in range(12):
+        x, y = rng.integers(size // 5, 4 * size // 5), rng.integers(size // 3, 2 * size // 3)
+        r = int(rng.integers(size // 60 + 1, size // 25 + 2))
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=(120, 84, 40), outline=(230, 210, 90))
+    # Camera-like texture so the JPEG is not trivially compressible
+    noise = rng.normal(0, 8, (size, size, 3))
+    pixels = np.clip(np.asarray(image.filter(ImageFilter.GaussianBlur(1)), dtype=np.float32) + noise, 0, 255)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels.astype(np.uint8)).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def audio_clips(seed: int = 0) -> Dict[str, bytes]:
+    return {f"clip_{s}s.wav": audio_clip(s, seed + i) for i, s in enumerate(CLIP_SECONDS)}
+
+
+def leaf_images(seed: int = 0) -> Dict[str, bytes]:
+    return {f"leaf_{s}px.jpg": leaf_image(s, seed + i) for i, s in enumerate(IMAGE_SIZES)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="directory to write the fixtures to")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for name, payload in {**audio_clips(args.seed), **leaf_images(args.seed)}.items():
+        with open(os.path.join(args.out, name), "wb") as f:
+            f.write(payload)
+        print(f"{name}: {len(payload) / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
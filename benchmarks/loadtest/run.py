@@ -0,0 +1,404 @@
+# benchmarks/loadtest/run.py
+"""
+Reproducible load test for the expensive endpoints.
+
+Starts the fake upstreams (fake_upstreams.py) and the app pointed at them,
+waits for /health/ready, then drives each endpoint in turn with a fixed number
+of requests at a fixed concurrency, using the canned queries, audio clips and
+leaf images from fixtures.py. For each endpoint it reports throughput,
+p50/p95/p99 latency, status codes and the server's CPU time and RSS (the whole
+process tree, so gunicorn workers are included), and writes everything to a
+JSON file that later runs can be compared against.
+
+    python benchmarks/loadtest/run.py                              # all endpoints, 200 requests, 8 concurrent
+    python benchmarks/loadtest/run.py --endpoints /ask --requests 500 --concurrency 32
+    python benchmarks/loadtest/run.py --latency groq=1.5 --error-rate stt=0.2
+    python benchmarks/loadtest/run.py --server gunicorn --env WEB_CONCURRENCY=4
+    python benchmarks/loadtest/run.py --baseline results/before.json --max-regression 0.1   # exit 1 on regression
+
+Rate limiting is off (all load comes from one address) and the response cache
+is off unless --cache is given, so repeated queries do real work.
+"""
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import os
+import platform
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+from fake_upstreams import FakeUpstreams, add_profile_arguments, profiles_from_args
+from fixtures import audio_clips, leaf_images, load_queries
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(os.path.dirname(HERE))
+RESULTS_DIR = os.path.join(HERE, "results")
+
+ENDPOINTS = ("/ask", "/voice/ask", "/voice/ask-file", "/detect-disease")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ProcessTree:
+    """CPU seconds and RSS of a process and its children (psutil if installed, else /proc)"""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        try:
+            import psutil
+            self._psutil = psutil
+        except ImportError:
+            self._psutil = None
+        self._ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self._page = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def _pids(self) -> List[int]:
+        if self._psutil:
+            root = self._psutil.Process(self.pid)
+            return [root.pid] + [p.pid for p in root.children(recursive=True)]
+        children: Dict[int, List[int]] = {}
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                stat = self._stat(int(entry))
+                if stat:
+                    children.setdefault(int(stat[1]), []).append(int(entry))
+        pids, stack = [], [self.pid]
+        while stack:
+            pid = stack.pop()
+            pids.append(pid)
+            stack.extend(children.get(pid, []))
+        return pids
+
+    @staticmethod
+    def _stat(pid: int) -> Optional[List[str]]:
+        """Fields of /proc/<pid>/stat after the command name (state, ppid, ...)"""
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                return f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            return None
+
+    def sample(self) -> Dict[str, float]:
+        """{"cpu_seconds": user + system, "rss_bytes": summed resident memory}"""
+        cpu = rss = 0.0
+        for pid in self._pids():
+            if self._psutil:
+                try:
+                    process = self._psutil.Process(pid)
+                    times = process.cpu_times()
+                    cpu += times.user + times.system
+                    rss += process.memory_info().rss
+                except self._psutil.Error:
+                    continue
+            else:
+                stat = self._stat(pid)
+                if stat:
+                    # utime and stime are fields 14 and 15 of stat, rss (in pages) is 24
+                    cpu += (int(stat[11]) + int(stat[12])) / self._ticks
+                    rss += int(stat[21]) * self._page
+        return {"cpu_seconds": cpu, "rss_bytes": rss}
+
+
+class Server:
+    """The app under test, in a subprocess pointed at the fake upstreams"""
+
+    def __init__(self, kind: str, port: int, env: Dict[str, str]):
+        self.kind, self.port, self.env = kind, port, env
+        self.url = f"http://127.0.0.1:{port}"
+        self.proc: Optional[subprocess.Popen] = None
+        self.log = tempfile.NamedTemporaryFile(prefix="loadtest-server-", suffix=".log", delete=False)
+
+    def start(self):
+        if self.kind == "gunicorn":
+            command = [sys.executable, "-m", "gunicorn", "main:app", "-c", "gunicorn.conf.py",
+                       "--bind", f"127.0.0.1:{self.port}"]
+        else:
+            command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                       "--port", str(self.port), "--log-level", "warning"]
+        self.proc = subprocess.Popen(command, cwd=ROOT, env={**os.environ, **self.env},
+                                     stdout=self.log, stderr=subprocess.STDOUT)
+
+    def wait_ready(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"server exited with {self.proc.returncode}, see {self.log.name}")
+            try:
+                if httpx.get(f"{self.url}/health/ready", timeout=2).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.5)
+        raise RuntimeError(f"server not ready after {timeout:.0f}s, see {self.log.name}")
+
+    def stop(self):
+        if self.proc and self.proc.poll() is None:
+            self.proc.send_signal(signal.SIGTERM)
+            try:
+                self.proc.wait(15)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+
+def request_factories(seed: int) -> Dict[str, Callable[[int], Dict]]:
+    """endpoint -> f(request number) giving the httpx request arguments for it"""
+    queries = load_queries()
+    clips = list(audio_clips(seed).items())
+    images = list(leaf_images(seed).items())
+    encoded = [(name, base64.b64encode(data).decode("ascii")) for name, data in clips]
+
+    def ask(i):
+        return {"json": {"query": queries[i % len(queries)]["query"]}}
+
+    def voice_ask(i):
+        _, audio = encoded[i % len(encoded)]
+        return {"json": {"audio_data": audio, "language": "auto", "session_id": f"loadtest-{i % 16}"}}
+
+    def voice_ask_file(i):
+        name, data = clips[i % len(clips)]
+        return {"files": {"audio_file": (name, data, "audio/wav")},
+                "data": {"language": "auto", "session_id": f"loadtest-{i % 16}"}}
+
+    def detect_disease(i):
+        name, data = images[i % len(images)]
+        return {"files": {"file": (name, data, "image/jpeg")}}
+
+    return {"/ask": ask, "/voice/ask": voice_ask, "/voice/ask-file": voice_ask_file,
+            "/detect-disease": detect_disease}
+
+
+def _percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p
+    low = int(k)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (k - low)
+
+
+async def _sample_rss(tree: ProcessTree, samples: List[float], interval: float = 0.25):
+    while True:
+        samples.append(tree.sample()["rss_bytes"])
+        await asyncio.sleep(interval)
+
+
+async def drive(url: str, endpoint: str, make_request: Callable[[int], Dict], requests: int, concurrency: int,
+                warmup: int, timeout: float, tree: Optional[ProcessTree]) -> Dict:
+    """Send requests to one endpoint from `concurrency` closed-loop clients"""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        for i in range(warmup):
+            try:
+                await client.post(endpoint, **make_request(i))
+            except httpx.HTTPError:
+                pass
+
+        counter = itertools.count()
+        latencies: List[float] = []
+        statuses: Dict[str, int] = {}
+
+        async def worker():
+            while (i := next(counter)) < requests:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(endpoint, **make_request(warmup + i))
+                    status = str(response.status_code)
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                elapsed = time.perf_counter() - started
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == "200":
+                    latencies.append(elapsed)
+
+        rss_samples: List[float] = []
+        sampler = asyncio.create_task(_sample_rss(tree, rss_samples)) if tree else None
+        before = tree.sample() if tree else None
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+        after = tree.sample() if tree else None
+        if sampler:
+            sampler.cancel()
+
+    latencies.sort()
+    ok = statuses.get("200", 0)
+    report = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "ok": ok,
+        "statuses": dict(sorted(statuses.items())),
+        "error_rate": round(1 - ok / requests, 4) if requests else 0.0,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(ok / wall, 3) if wall else None,
+        "latency_ms": {
+            name: round(value * 1000, 1) if value is not None else None
+            for name, value in (("mean", statistics.fmean(latencies) if latencies else None),
+                                ("p50", _percentile(latencies, 0.50)), ("p95", _percentile(latencies, 0.95)),
+                                ("p99", _percentile(latencies, 0.99)), ("max", latencies[-1] if latencies else None))
+        },
+    }
+    if tree:
+        cpu = after["cpu_seconds"] - before["cpu_seconds"]
+        rss_samples.append(after["rss_bytes"])
+        report["server"] = {
+            "cpu_seconds": round(cpu, 3),
+            # 100% is one core fully busy
+            "cpu_percent": round(100 * cpu / wall, 1) if wall else None,
+            "cpu_ms_per_request": round(1000 * cpu / requests, 2) if requests else None,
+            "rss_mb_mean": round(statistics.fmean(rss_samples) / 2 ** 20, 1),
+            "rss_mb_peak": round(max(rss_samples) / 2 ** 20, 1),
+        }
+    return report
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Human-readable regressions of p95 latency and throughput beyond threshold (a fraction)"""
+    regressions = []
+    for endpoint, result in current["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(endpoint)
+        if not base:
+            continue
+        p95, base_p95 = result["latency_ms"]["p95"], base["latency_ms"]["p95"]
+        if p95 is not None and base_p95 and p95 > base_p95 * (1 + threshold):
+            regressions.append(f"{endpoint}: p95 {base_p95:.0f} -> {p95:.0f} ms (+{p95 / base_p95 - 1:.0%})")
+        rps, base_rps = result["throughput_rps"], base["throughput_rps"]
+        if rps is not None and base_rps and rps < base_rps * (1 - threshold):
+            regressions.append(f"{endpoint}: throughput {base_rps:.2f} -> {rps:.2f} req/s ({rps / base_rps - 1:.0%})")
+    return regressions
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_table(report: Dict):
+    print(f"\n{'endpoint':<18}{'ok':>6}{'err%':>7}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'cpu%':>8}{'rss MB':>9}")
+    for endpoint, r in report["endpoints"].items():
+        latency, server = r["latency_ms"], r.get("server", {})
+
+        def ms(value):
+            return f"{value:.0f}" if value is not None else "-"
+
+        print(f"{endpoint:<18}{r['ok']:>6}{r['error_rate'] * 100:>6.1f}%{r['throughput_rps'] or 0:>9.2f}"
+              f"{ms(latency['p50']):>9}{ms(latency['p95']):>9}{ms(latency['p99']):>9}"
+              f"{server.get('cpu_percent', '-'):>8}{server.get('rss_mb_peak', '-'):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS), choices=ENDPOINTS)
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup-requests", type=int, default=5, help="unmeasured requests per endpoint first")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--server", choices=("uvicorn", "gunicorn"), default="uvicorn")
+    parser.add_argument("--url", help="test an already running server instead (no CPU/RSS unless --pid)")
+    parser.add_argument("--pid", type=int, help="server process to measure when using --url")
+    parser.add_argument("--startup-timeout", type=float, default=180.0)
+    parser.add_argument("--cache", action="store_true", help="leave the response cache on")
+    parser.add_argument("--env", action="append", default=[], help="KEY=VALUE for the server, repeatable")
+    parser.add_argument("--output", help="JSON report path (default results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.15,
+                        help="allowed p95/throughput change against the baseline, as a fraction")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    upstreams = FakeUpstreams(profiles=profiles_from_args(args), seed=args.seed).start()
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    server_env = {
+        **upstreams.env(),
+        "RATE_LIMIT_ENABLED": "0",
+        "RESPONSE_CACHE_ENABLED": "1" if args.cache else "0",
+        # Keep the run's conversation log and shared state out of data/
+        "CONVERSATION_LOG_DIR": os.path.join(workdir, "conversation_log"),
+        "SHARED_STORE_PATH": os.path.join(workdir, "shared_store.sqlite") if args.server == "gunicorn" else "",
+        "PYTHONUNBUFFERED": "1",
+    }
+    for item in args.env:
+        key, _, value = item.partition("=")
+        server_env[key] = value
+
+    server = None
+    try:
+        if args.url:
+            url, tree = args.url.rstrip("/"), ProcessTree(args.pid) if args.pid else None
+        else:
+            server = Server(args.server, _free_port(), server_env)
+            server.start()
+            print(f"Starting {args.server} on {server.url} (log: {server.log.name}) ...")
+            started = time.perf_counter()
+            server.wait_ready(args.startup_timeout)
+            print(f"Ready after {time.perf_counter() - started:.1f}s")
+            url, tree = server.url, ProcessTree(server.proc.pid)
+
+        factories = request_factories(args.seed)
+        endpoints = {}
+        for endpoint in args.endpoints:
+            print(f"{endpoint}: {args.requests} requests, {args.concurrency} concurrent ...")
+            endpoints[endpoint] = asyncio.run(drive(url, endpoint, factories[endpoint], args.requests,
+                                                    args.concurrency, args.warmup_requests, args.timeout, tree))
+    finally:
+        if server:
+            server.stop()
+        upstreams_report = upstreams.snapshot()
+        upstreams.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": _git_commit(),
+        "host": {"python": sys.version.split()[0], "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {
+            "server": "external" if args.url else args.server,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup_requests": args.warmup_requests,
+            "seed": args.seed,
+            "response_cache": args.cache,
+            "env": {item.partition("=")[0]: item.partition("=")[2] for item in args.env},
+        },
+        "upstreams": upstreams_report,
+        "endpoints": endpoints,
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    _print_table(report)
+    print(f"\nReport written to {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        if regressions:
+            print(f"\nRegressions against {args.baseline}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.max_regression:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
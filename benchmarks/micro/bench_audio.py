@@ -0,0 +1,45 @@
+# benchmarks/micro/bench_audio.py
+import shutil
+
+import pytest
+
+pytest.importorskip("pydub")
+
+from utils.voice_utils_simple import SimpleVoiceProcessor  # noqa: E402
+
+HEADERS = {
+    "wav": b"RIFF\x24\x08\x00\x00WAVEfmt ",
+    "mp3": b"ID3\x04\x00\x00\x00\x00\x00\x00\x00\x00",
+    "webm": b"\x1a\x45\xdf\xa3\x9f\x42\x86\x81\x01\x42\xf7\x81",
+    "flac": b"fLaC\x00\x00\x00\x22\x10\x00\x10\x00",
+    None: b"\x00" * 12,
+}
+
+
+@pytest.fixture(scope="module")
+def processor():
+    processor = SimpleVoiceProcessor()
+    # Import pydub and look for ffmpeg outside the timed loop
+    processor.detect_format_from_bytes(HEADERS["wav"])
+    return processor
+
+
+@pytest.mark.parametrize("fmt", ["wav", "mp3", "webm", "flac", None])
+def bench_detect_format_from_bytes(benchmark, processor, fmt):
+    assert benchmark(processor.detect_format_from_bytes, HEADERS[fmt] + b"\x00" * 4096) == fmt
+
+
+@pytest.mark.parametrize("seconds", [2, 10])
+def bench_convert_audio_to_segment(benchmark, processor, audio_clips, seconds):
+    segment = benchmark(processor._convert_audio_to_segment, audio_clips[seconds])
+    assert abs(len(segment) - seconds * 1000) < 10
+
+
+@pytest.mark.parametrize("seconds", [2, 10])
+def bench_convert_audio_format_wav(benchmark, processor, audio_clips, seconds):
+    assert benchmark(processor.convert_audio_format, audio_clips[seconds], "wav", "wav")[:4] == b"RIFF"
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs ffmpeg")
+def bench_convert_audio_format_mp3(benchmark, processor, audio_clips):
+    assert benchmark.pedantic(processor.convert_audio_format, (audio_clips[2], "mp3", "wav"), rounds=5)
@@ -0,0 +1,25 @@
+# benchmarks/micro/bench_crop_advice.py
+import pytest
+
+from tools.crop_advisory import get_crop_advice, parse_conditions
+
+STRUCTURED = "soil_type=loamy; rainfall: 250mm, temperature='28', season=kharif, bogus"
+
+QUERIES = {
+    "structured": "soil_type=loamy, rainfall=250, temperature=28",
+    "district": "rabi crops for Guntur",
+    "district_structured": "location=Warangal, season=kharif, soil=red",
+    "no_location": "what crop is suitable here to harvest",
+}
+
+
+def bench_parse_conditions(benchmark):
+    assert benchmark(parse_conditions, STRUCTURED) == {
+        "soil_type": "loamy", "rainfall": 250.0, "temperature": 28.0, "season": "kharif"}
+
+
+@pytest.mark.parametrize("kind", list(QUERIES))
+def bench_get_crop_advice(benchmark, kind):
+    # Load the district index and crop table outside the timed loop
+    get_crop_advice(QUERIES[kind])
+    assert benchmark(get_crop_advice, QUERIES[kind])
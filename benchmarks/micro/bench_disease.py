@@ -0,0 +1,17 @@
+# benchmarks/micro/bench_disease.py
+import pytest
+
+from tools.disease_detector import detect_plant_disease
+
+DESCRIPTION = "brown spots on the lower leaves and some yellow leaves"
+
+
+@pytest.mark.parametrize("size", [256, 1024, 2048])
+def bench_detect_plant_disease_image(benchmark, leaf_images, size):
+    result = benchmark(detect_plant_disease, DESCRIPTION, leaf_images[size])
+    assert "Image Analysis" in result
+
+
+def bench_detect_plant_disease_description_only(benchmark):
+    result = benchmark(detect_plant_disease, DESCRIPTION)
+    assert "Leaf Blight" in result
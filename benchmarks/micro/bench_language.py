@@ -0,0 +1,20 @@
+# benchmarks/micro/bench_language.py
+import pytest
+
+from utils.translator import contains_hindi, contains_telugu, detect_language
+
+
+# English would fall through to the Google detector, which is a network call
+@pytest.mark.parametrize("lang", ["hi", "te"])
+def bench_detect_language(benchmark, texts, lang):
+    assert benchmark(detect_language, texts[lang]) == lang
+
+
+@pytest.mark.parametrize("sample", ["en", "en_long", "te"])
+def bench_contains_telugu(benchmark, texts, sample):
+    assert benchmark(contains_telugu, texts[sample]) == (sample == "te")
+
+
+@pytest.mark.parametrize("sample", ["en", "en_long", "hi"])
+def bench_contains_hindi(benchmark, texts, sample):
+    assert benchmark(contains_hindi, texts[sample]) == (sample == "hi")
@@ -0,0 +1,142 @@
+# benchmarks/micro/compare.py
+"""
+Compare micro-benchmark results against the stored baseline.
+
+Runs the suite (or reads a pytest-benchmark --benchmark-json file) and fails
+when any benchmark is slower than the baseline by more than the threshold.
+The minimum is compared by default: it is the timing least disturbed by other
+load on the machine, so it is the one that moves when the code does.
+Baselines hold timings from one machine, so refresh them (--update) on the
+machine that runs the comparison before relying on it.
+
+    python benchmarks/micro/compare.py                      # run the suite, compare, exit 1 on regression
+    python benchmarks/micro/compare.py results.json --threshold 0.1
+    python benchmarks/micro/compare.py --update             # run the suite and store it as the new baseline
+    python benchmarks/micro/compare.py -- -k disease        # extra arguments after -- go to pytest
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(os.path.dirname(HERE))
+BASELINE_PATH = os.path.join(HERE, "baselines", "baseline.json")
+
+STATS = ("min", "median", "mean", "stddev", "rounds")
+
+
+def run_suite(pytest_args: List[str]) -> Dict:
+    """Run the micro-benchmarks and return pytest-benchmark's JSON report"""
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "results.json")
+        command = [sys.executable, "-m", "pytest", "-c", os.path.join(HERE, "pytest.ini"), HERE, "-q",
+                   f"--benchmark-json={output}", *pytest_args]
+        proc = subprocess.run(command, cwd=ROOT)
+        if proc.returncode != 0 or not os.path.exists(output):
+            sys.exit(f"benchmark run failed (exit {proc.returncode})")
+        with open(output, encoding="utf-8") as f:
+            return json.load(f)
+
+
+def summarize(results: Dict) -> Dict:
+    """Trim a pytest-benchmark report to what the baseline needs: per-benchmark stats in seconds"""
+    machine = results.get("machine_info", {})
+    return {
+        "created_at": results.get("datetime") or time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": (results.get("commit_info") or {}).get("id", "")[:12] or None,
+        "machine": {
+            "cpu": (machine.get("cpu") or {}).get("brand_raw"),
+            "python": machine.get("python_version") or platform.python_version(),
+            "system": machine.get("system"),
+        },
+        "benchmarks": {
+            # bench_file.py::bench_name[param], independent of where pytest was run from
+            b["fullname"].rsplit("/", 1)[-1]: {stat: b["stats"][stat] for stat in STATS}
+            for b in results["benchmarks"]
+        },
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float, metric: str = "min",
+            noise_floor: float = 0.0) -> List[str]:
+    """
+    Print a side-by-side table; return the names slower than the baseline by more
+    than threshold (a fraction) and by more than noise_floor seconds.
+    """
+    regressions = []
+    print(f"{'benchmark':<70}{'baseline':>12}{'current':>12}{'change':>9}")
+    for name, stats in sorted(current["benchmarks"].items()):
+        base = baseline["benchmarks"].get(name)
+        if base is None:
+            print(f"{name:<70}{'-':>12}{_fmt(stats[metric]):>12}{'new':>9}")
+            continue
+        change = stats[metric] / base[metric] - 1
+        flag = ""
+        if change > threshold and stats[metric] - base[metric] > noise_floor:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<70}{_fmt(base[metric]):>12}{_fmt(stats[metric]):>12}{change:>+9.0%}{flag}")
+    for name in sorted(set(baseline["benchmarks"]) - set(current["benchmarks"])):
+        print(f"{name:<70}{_fmt(baseline['benchmarks'][name][metric]):>12}{'-':>12}{'gone':>9}")
+    return regressions
+
+
+def _fmt(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    pytest_args = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, pytest_args = argv[:split], argv[split + 1:]
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("results", nargs="?", help="pytest-benchmark JSON (default: run the suite now)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.3,
+                        help="allowed slowdown, as a fraction (default 0.3)")
+    parser.add_argument("--metric", choices=("min", "median", "mean"), default="min")
+    parser.add_argument("--noise-floor", type=float, default=1e-6,
+                        help="ignore slowdowns smaller than this many seconds (default 1 µs)")
+    parser.add_argument("--update", action="store_true", help="store the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    if args.results:
+        with open(args.results, encoding="utf-8") as f:
+            results = json.load(f)
+    else:
+        results = run_suite(pytest_args)
+    current = summarize(results)
+
+    if args.update:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline with {len(current['benchmarks'])} benchmarks written to {args.baseline}")
+        return
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline["machine"] != current["machine"]:
+        print(f"warning: baseline is from {baseline['machine']}, this run is on {current['machine']}\n")
+    regressions = compare(current, baseline, args.threshold, args.metric, args.noise_floor)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) slower than the baseline by more than {args.threshold:.0%}")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
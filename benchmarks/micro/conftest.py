@@ -0,0 +1,38 @@
+# benchmarks/micro/conftest.py
+"""
+Shared fixtures for the micro-benchmarks: the load test's seeded leaf images
+and audio clips, and multilingual text samples.
+"""
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(os.path.dirname(HERE))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks", "loadtest")]
+
+from fixtures import IMAGE_SIZES, audio_clip, leaf_image, load_queries  # noqa: E402
+
+CLIP_SECONDS = (2, 10)
+
+
+@pytest.fixture(scope="session")
+def leaf_images():
+    """{size in px: JPEG bytes}"""
+    return {size: leaf_image(size, seed=i) for i, size in enumerate(IMAGE_SIZES)}
+
+
+@pytest.fixture(scope="session")
+def audio_clips():
+    """{seconds: 16 kHz mono WAV bytes}"""
+    return {seconds: audio_clip(seconds, seed=i) for i, seconds in enumerate(CLIP_SECONDS)}
+
+
+@pytest.fixture(scope="session")
+def texts():
+    """Sample text per language, plus a long English answer (the worst case for script scans)"""
+    queries = load_queries()
+    samples = {lang: next(q["query"] for q in queries if q["language"] == lang) for lang in ("en", "hi", "te")}
+    samples["en_long"] = " ".join(q["english"] for q in queries) * 4
+    return samples
@@ -0,0 +1,235 @@
+# data/district_index.py
+"""
+Offline index of Indian districts, towns and villages with their agro-climatic
+inputs (state, zone, dominant soil, normal seasonal rainfall and temperature).
+
+data/districts.csv is the source table; it is compiled into a SQLite file
+(data/district_index.sqlite) on first use or with:
+
+    python -m data.district_index build
+
+Seed values are approximate district normals; extend the CSV with IMD/ICAR
+normals for full coverage. Villages and towns inherit climate from their
+parent district.
+"""
+import bisect
+import csv
+import difflib
+import os
+import re
+import sqlite3
+import sys
+import threading
+import unicodedata
+from datetime import date
+from typing import Dict, List, Optional
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+DISTRICTS_CSV = os.path.join(DATA_DIR, "districts.csv")
+DISTRICT_DB = os.getenv("DISTRICT_INDEX_DB", os.path.join(DATA_DIR, "district_index.sqlite"))
+
+CLIMATE_FIELDS = ("zone", "soil", "kharif_rainfall", "kharif_temp", "rabi_rainfall", "rabi_temp")
+
+# Preferred match when several places share a name
+KIND_PRIORITY = {"district": 0, "town": 1, "village": 2}
+
+_PUNCTUATION = re.compile(r"[!-/:-@\[-`{-~।॥]+")
+
+# Words that should never be matched as a place on their own
+_STOPWORDS = {
+    "for", "in", "at", "the", "my", "our", "crop", "crops", "advice", "near", "district",
+    "village", "town", "city", "what", "which", "grow", "best", "here", "season", "soil",
+}
+
+
+def normalize_place(text: str) -> str:
+    """Lowercase, NFC-normalize and strip punctuation (keeps Indic combining marks)"""
+    text = unicodedata.normalize("NFC", text).lower()
+    return " ".join(_PUNCTUATION.sub(" ", text).split())
+
+
+def build_index(csv_path: str = DISTRICTS_CSV, db_path: str = DISTRICT_DB) -> int:
+    """Compile the CSV into the SQLite index. Returns the number of places."""
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+
+    by_name = {row["name"]: row for row in rows if row["kind"] == "district"}
+    tmp_path = db_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.unlink(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript("""
+            CREATE TABLE places (
+                id INTEGER PRIMARY KEY, name TEXT, kind TEXT, district TEXT, state TEXT,
+                zone TEXT, soil TEXT, kharif_rainfall REAL, kharif_temp REAL,
+                rabi_rainfall REAL, rabi_temp REAL
+            );
+            CREATE TABLE names (key TEXT NOT NULL, place_id INTEGER NOT NULL);
+        """)
+        for place_id, row in enumerate(rows):
+            # Villages and towns take their climate from the parent district
+            climate_row = by_name.get(row["parent"], row) if row["parent"] else row
+            conn.execute(
+                "INSERT INTO places VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (place_id, row["name"], row["kind"], row["parent"] or row["name"], row["state"],
+                 climate_row["zone"], climate_row["soil"],
+                 float(climate_row["kharif_rainfall"]), float(climate_row["kharif_temp"]),
+                 float(climate_row["rabi_rainfall"]), float(climate_row["rabi_temp"]))
+            )
+            keys = {normalize_place(row["name"])}
+            keys.update(normalize_place(alias) for alias in row["aliases"].split("|") if alias.strip())
+            conn.executemany("INSERT INTO names VALUES (?, ?)", [(key, place_id) for key in keys if key])
+
+        conn.execute("CREATE INDEX names_key ON names (key)")
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, db_path)
+    return len(rows)
+
+
+class DistrictIndex:
+    """
+    In-memory lookup over the compiled index: a sorted key array for exact
+    and prefix search (bisect) with a difflib fallback for misspellings.
+    """
+
+    def __init__(self, db_path: str = DISTRICT_DB):
+        conn = sqlite3.connect(db_path)
+        try:
+            conn.row_factory = sqlite3.Row
+            self.places = {row["id"]: dict(row) for row in conn.execute("SELECT * FROM places")}
+            pairs = conn.execute("SELECT key, place_id FROM names ORDER BY key").fetchall()
+        finally:
+            conn.close()
+
+        # Collapse duplicate keys to the best-ranked place
+        best = {}
+        for key, place_id in pairs:
+            current = best.get(key)
+            if current is None or self._rank(place_id) < self._rank(current):
+                best[key] = place_id
+        self.keys = sorted(best)
+        self.place_ids = [best[key] for key in self.keys]
+
+        # Candidate keys per first character, to keep fuzzy matching cheap
+        self._by_initial = {}
+        for key in self.keys:
+            self._by_initial.setdefault(key[0], []).append(key)
+
+    def _rank(self, place_id: int) -> int:
+        return KIND_PRIORITY.get(self.places[place_id]["kind"], 9)
+
+    def lookup(self, name: str) -> Optional[Dict]:
+        """Exact lookup by name, alias or transliteration"""
+        key = normalize_place(name)
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return self.places[self.place_ids[i]]
+        return None
+
+    def prefix(self, text: str, limit: int = 10) -> List[Dict]:
+        """Places whose name or alias starts with text (for autocomplete)"""
+        key = normalize_place(text)
+        if not key:
+            return []
+        start = bisect.bisect_left(self.keys, key)
+        end = bisect.bisect_left(self.keys, key + "￿")
+        seen, results = set(), []
+        for i in range(start, end):
+            place_id = self.place_ids[i]
+            if place_id not in seen:
+                seen.add(place_id)
+                results.append(self.places[place_id])
+                if len(results) >= limit:
+                    break
+        return results
+
+    def fuzzy(self, name: str, cutoff: float = 0.82) -> Optional[Dict]:
+        """Closest match for a misspelt name"""
+        key = normalize_place(name)
+        if not key:
+            return None
+        candidates = self._by_initial.get(key[0], [])
+        match = difflib.get_close_matches(key, candidates, n=1, cutoff=cutoff)
+        return self.lookup(match[0]) if match else None
+
+    def resolve(self, name: str) -> Optional[Dict]:
+        """Exact, then unique-prefix, then fuzzy resolution of a single place name"""
+        place = self.lookup(name)
+        if place:
+            return place
+        matches = self.prefix(name, limit=2)
+        if len(matches) == 1 and len(normalize_place(name)) >= 4:
+            return matches[0]
+        return self.fuzzy(name)
+
+    def find_in_text(self, text: str, max_words: int = 3) -> Optional[Dict]:
+        """Find the first (longest) place mentioned anywhere in free text"""
+        words = normalize_place(text).split()
+        for n in range(max_words, 0, -1):
+            for i in range(len(words) - n + 1):
+                phrase = words[i:i + n]
+                if n == 1 and (phrase[0] in _STOPWORDS or len(phrase[0]) < 3):
+                    continue
+                place = self.lookup(" ".join(phrase))
+                if place:
+                    return place
+
+        # Tolerate a misspelt single-word place name
+        for word in words:
+            if len(word) >= 5 and word not in _STOPWORDS:
+                place = self.fuzzy(word, cutoff=0.85)
+                if place:
+                    return place
+        return None
+
+
+def current_season(today: Optional[date] = None) -> str:
+    """Cropping season for a date: kharif (Jun-Oct), rabi (Nov-Feb) or zaid (Mar-May)"""
+    month = (today or date.today()).month
+    if 6 <= month <= 10:
+        return "kharif"
+    if month >= 11 or month <= 2:
+        return "rabi"
+    return "zaid"
+
+
+def seasonal_conditions(place: Dict, season: str) -> Dict:
+    """Soil, rainfall and temperature inputs for the crop engine"""
+    # Zaid crops are irrigated; use rabi rainfall with the kharif temperature as a proxy
+    rain_key = "kharif_rainfall" if season == "kharif" else "rabi_rainfall"
+    temp_key = "rabi_temp" if season == "rabi" else "kharif_temp"
+    return {
+        "soil_type": place["soil"],
+        "rainfall": place[rain_key],
+        "temperature": place[temp_key],
+        "season": season,
+    }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_district_index() -> DistrictIndex:
+    """Shared index; (re)builds the SQLite file when the CSV is newer"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                if not os.path.exists(DISTRICT_DB) or \
+                        os.path.getmtime(DISTRICTS_CSV) > os.path.getmtime(DISTRICT_DB):
+                    build_index()
+                _index = DistrictIndex()
+    return _index
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        print(f"Indexed {build_index()} places into {DISTRICT_DB}")
+    else:
+        print("Usage: python -m data.district_index build")
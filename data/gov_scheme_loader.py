@@ -1,10 +1,295 @@
 # data/gov_scheme_loader.py
 import json
-from typing import List, Dict
+import math
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
 
-def load_government_schemes() -> List[Dict]:
+SCHEMES_PATH = os.getenv(
+    "SCHEMES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "schemes.json")
+)
+
+# Seconds between checks of the catalogue file for changes
+SCHEME_WATCH_INTERVAL = float(os.getenv("SCHEME_WATCH_INTERVAL", 5))
+
+# How much a query term counts when it appears in each field
+FIELD_WEIGHTS = {
+    "name": 4.0,
+    "aliases": 3.0,
+    "category": 2.0,
+    "crops": 2.0,
+    "states": 2.0,
+    "eligibility": 1.0,
+    "benefit": 0.5,
+}
+
+_STOPWORDS = {
+    "a", "an", "the", "for", "of", "in", "on", "to", "and", "or", "is", "are", "what", "which",
+    "how", "can", "i", "me", "my", "we", "our", "about", "scheme", "schemes", "yojana", "get",
+    "apply", "tell", "any", "there", "do", "does", "with", "from", "by", "all", "up",
+    "farmer", "farmers", "farming", "government", "govt", "india", "indian", "why", "did", "when",
+    "where", "who", "will", "should", "much", "many", "need", "want", "it", "this", "that", "be",
+}
+
+# Results scoring below this are noise from incidental words
+MIN_SCORE = 2.0
+
+INDIAN_STATES = [
+    "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhattisgarh", "Goa", "Gujarat",
+    "Haryana", "Himachal Pradesh", "Jharkhand", "Karnataka", "Kerala", "Madhya Pradesh",
+    "Maharashtra", "Manipur", "Meghalaya", "Mizoram", "Nagaland", "Odisha", "Punjab", "Rajasthan",
+    "Sikkim", "Tamil Nadu", "Telangana", "Tripura", "Uttar Pradesh", "Uttarakhand", "West Bengal",
+    "Delhi", "Jammu and Kashmir", "Ladakh", "Puducherry",
+]
+
+FALLBACK_SCHEMES = [{"name": "PM-KISAN", "benefit": "Income support to all landholding farmers"}]
+
+
+def _name_words(text: str) -> Tuple[str, ...]:
+    """Words of a scheme name or alias, for whole-phrase matching (stopwords kept)"""
+    return tuple(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+# State names by their words, so "goat" does not read as Goa
+_STATE_NAMES = {_name_words(state): state for state in INDIAN_STATES}
+_MAX_STATE_WORDS = max(len(words) for words in _STATE_NAMES)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords removed and a light plural strip"""
+    tokens = []
+    for token in re.findall(r"[a-z0-9]+", text.lower()):
+        if token in _STOPWORDS:
+            continue
+        if len(token) > 4 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _field_text(scheme: Dict, field: str) -> str:
+    value = scheme.get(field, "")
+    return " ".join(value) if isinstance(value, list) else str(value)
+
+
+def _scheme_id(scheme: Dict) -> str:
+    return scheme.get("id") or scheme["name"].lower()
+
+
+class SchemeCatalogue:
+    """
+    Scheme catalogue loaded once and kept in memory with an inverted index
+    (term -> {scheme id: field-weighted count}). A watcher thread polls the
+    file's mtime and re-indexes only schemes that were added, changed or removed.
+    """
+
+    def __init__(self, path: str = SCHEMES_PATH):
+        self.path = path
+        self.schemes: Dict[str, Dict] = {}
+        self._fingerprints: Dict[str, str] = {}
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._terms: Dict[str, Set[str]] = {}
+        # Name/alias word tuple -> scheme ids, so mentions are found by n-gram lookup
+        self._names: Dict[Tuple[str, ...], Set[str]] = {}
+        self._name_keys: Dict[str, Set[Tuple[str, ...]]] = {}
+        self._max_name_words = 0
+        self._mtime = None
+        self._lock = threading.RLock()
+        self._watcher = None
+        self.reload()
+
+    # ---------- loading ----------
+
+    def reload(self) -> Tuple[int, int, int]:
+        """Re-read the file and apply changes. Returns (added, updated, removed)."""
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            mtime, entries = None, FALLBACK_SCHEMES
+        except (OSError, ValueError) as e:
+            # Keep serving the last good catalogue if the file is mid-write or invalid
+            print(f"Scheme catalogue reload failed: {e}")
+            return 0, 0, 0
+
+        incoming = {_scheme_id(s): s for s in entries}
+        added = updated = 0
+        with self._lock:
+            stale = set(self.schemes) - set(incoming)
+            for scheme_id in stale:
+                self._unindex(scheme_id)
+                del self.schemes[scheme_id]
+                del self._fingerprints[scheme_id]
+
+            for scheme_id, scheme in incoming.items():
+                fingerprint = json.dumps(scheme, sort_keys=True, ensure_ascii=False)
+                if self._fingerprints.get(scheme_id) == fingerprint:
+                    continue
+                if scheme_id in self.schemes:
+                    self._unindex(scheme_id)
+                    updated += 1
+                else:
+                    added += 1
+                self.schemes[scheme_id] = scheme
+                self._fingerprints[scheme_id] = fingerprint
+                self._index(scheme_id, scheme)
+
+            self._mtime = mtime
+
+        return added, updated, len(stale)
+
+    def _index(self, scheme_id: str, scheme: Dict):
+        terms = set()
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(_field_text(scheme, field)):
+                postings = self._postings.setdefault(token, {})
+                postings[scheme_id] = postings.get(scheme_id, 0.0) + weight
+                terms.add(token)
+        self._terms[scheme_id] = terms
+
+        keys = {_name_words(n) for n in [scheme["name"]] + scheme.get("aliases", [])} - {()}
+        for key in keys:
+            self._names.setdefault(key, set()).add(scheme_id)
+            self._max_name_words = max(self._max_name_words, len(key))
+        self._name_keys[scheme_id] = keys
+
+    def _unindex(self, scheme_id: str):
+        for key in self._name_keys.pop(scheme_id, ()):
+            ids = self._names.get(key)
+            if ids:
+                ids.discard(scheme_id)
+                if not ids:
+                    del self._names[key]
+        for token in self._terms.pop(scheme_id, ()):
+            postings = self._postings.get(token)
+            if postings:
+                postings.pop(scheme_id, None)
+                if not postings:
+                    del self._postings[token]
+
+    def start_watching(self, interval: float = SCHEME_WATCH_INTERVAL):
+        """Poll the catalogue file in a daemon thread and reload when it changes"""
+        if self._watcher and self._watcher.is_alive():
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    mtime = os.path.getmtime(self.path)
+                except OSError:
+                    continue
+                if mtime != self._mtime:
+                    added, updated, removed = self.reload()
+                    print(f"Scheme catalogue reloaded: {added} added, {updated} updated, {removed} removed")
+
+        self._watcher = threading.Thread(target=watch, name="scheme-watcher", daemon=True)
+        self._watcher.start()
+
+    # ---------- search ----------
+
+    def applies_to_state(self, scheme: Dict, state: Optional[str]) -> bool:
+        states = scheme.get("states", ["all"])
+        return not state or "all" in states or any(s.lower() == state.lower() for s in states)
+
+    def applies_to_crop(self, scheme: Dict, crop: Optional[str]) -> bool:
+        crops = [c.lower() for c in scheme.get("crops", ["all"])]
+        return not crop or not crops or "all" in crops or crop.lower() in crops
+
+    def search(self, query: str, state: Optional[str] = None, crop: Optional[str] = None,
+               limit: int = 5) -> List[Tuple[float, Dict]]:
+        """
+        Rank schemes for a free-text query. Term weights are field-weighted
+        and scaled by IDF; an exact name/alias mention gets a strong boost.
+        Schemes for other states, or limited to other crops, are excluded.
+        """
+        words = _name_words(query)
+        scores: Dict[str, float] = {}
+
+        with self._lock:
+            total = max(len(self.schemes), 1)
+            for token in set(tokenize(query)):
+                postings = self._postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + total / len(postings))
+                for scheme_id, weight in postings.items():
+                    scores[scheme_id] = scores.get(scheme_id, 0.0) + weight * idf
+
+            mentioned = set()
+            for n in range(1, min(self._max_name_words, len(words)) + 1):
+                for i in range(len(words) - n + 1):
+                    mentioned |= self._names.get(words[i:i + n], set())
+            for scheme_id in mentioned:
+                scores[scheme_id] = scores.get(scheme_id, 0.0) + 20.0
+
+            ranked = [
+                (score, self.schemes[scheme_id])
+                for scheme_id, score in scores.items()
+                if score >= MIN_SCORE
+                and self.applies_to_state(self.schemes[scheme_id], state)
+                and self.applies_to_crop(self.schemes[scheme_id], crop)
+            ]
+
+        # State schemes first when they match as well as a central one
+        ranked.sort(key=lambda item: (item[0] + (1.0 if item[1].get("level") == "state" and state else 0.0)),
+                    reverse=True)
+        return ranked[:limit]
+
+    def for_state(self, state: str) -> List[Dict]:
+        with self._lock:
+            return [s for s in self.schemes.values()
+                    if s.get("level") == "state" and self.applies_to_state(s, state)]
+
+    def all(self) -> List[Dict]:
+        with self._lock:
+            return list(self.schemes.values())
+
+
+def find_state(text: str) -> Optional[str]:
+    """State named in the text, or the state of a district/village mentioned in it"""
+    words = _name_words(text)
+    for i in range(len(words)):
+        for n in range(min(_MAX_STATE_WORDS, len(words) - i), 0, -1):
+            state = _STATE_NAMES.get(words[i:i + n])
+            if state:
+                return state
     try:
-        with open("backend/data/schemes.json", "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return [{"name": "PM-KISAN", "benefit": "Income support to all landholding farmers"}]
+        from data.district_index import get_district_index
+        place = get_district_index().find_in_text(text)
+        return place["state"] if place else None
+    except Exception:
+        return None
+
+
+_catalogue = None
+_catalogue_lock = threading.Lock()
+
+
+def get_scheme_catalogue() -> SchemeCatalogue:
+    """Shared catalogue, loaded once and watched for changes"""
+    global _catalogue
+    if _catalogue is None:
+        with _catalogue_lock:
+            if _catalogue is None:
+                _catalogue = SchemeCatalogue()
+                _catalogue.start_watching()
+    return _catalogue
+
+
+def _after_fork_in_child():
+    # The parent's watcher thread does not exist in a forked worker
+    global _catalogue_lock
+    _catalogue_lock = threading.Lock()
+    if _catalogue is not None:
+        _catalogue.start_watching()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def load_government_schemes() -> List[Dict]:
+    return get_scheme_catalogue().all()
@@ -1,11 +1,455 @@
 # data/mandi_prices.py
-from typing import Dict
+"""
+Array-backed mandi (wholesale market) price store.
+
+Agmarknet-style CSV dumps are loaded into NumPy columns sorted by
+(commodity, market, date), with categorical codes for commodity, market
+and state. A commodity is a contiguous slice found by binary search and
+markets are sorted runs within it. Queries without a market are served
+from indexes built with the store: the last row of every market run (the
+latest price per market) and per-day aggregates for each commodity and each
+(commodity, state), with the modal prices copied in the same day order so
+the rows of any date window are one contiguous slice for the median. A
+window or trend query therefore reads one aggregate per day, not every row
+of the commodity.
+
+Names are matched case-insensitively: spellings that differ only in case or
+spacing share one code and are shown with one of those spellings.
+
+    python -m data.mandi_prices load dump1.csv dump2.csv ...
+
+writes the columns as .npy files under MANDI_STORE_DIR, which are
+memory-mapped on startup.
+"""
+import json
+import os
+import sys
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+MANDI_STORE_DIR = os.getenv(
+    "MANDI_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "mandi_store")
+)
+
+EPOCH = date(1970, 1, 1)
+
+NUMERIC_COLUMNS = ("min_price", "max_price", "modal_price")
+CODE_COLUMNS = ("commodity", "state", "market")
+# Per-day aggregates, grouped by commodity ("daily_") and by commodity and state ("state_daily_")
+DAILY_FIELDS = ("day", "offset", "rows", "modal_count", "modal_sum", "min", "max", "modal")
+DAILY_GROUPS = {"daily_": ("commodity",), "state_daily_": ("commodity", "state")}
+# Derived from the columns above; rebuilt on open if a saved store lacks any of them
+INDEX_COLUMNS = ("market_ends", *(
+    prefix + name for prefix, keys in DAILY_GROUPS.items() for name in (*keys, *DAILY_FIELDS)
+))
+
+# Header variants seen in Agmarknet / data.gov.in exports
+HEADER_ALIASES = {
+    "commodity": "commodity",
+    "state": "state",
+    "market": "market",
+    "market_name": "market",
+    "district": "district",
+    "arrival_date": "date",
+    "price_date": "date",
+    "date": "date",
+    "min_price": "min_price",
+    "min_x0020_price": "min_price",
+    "max_price": "max_price",
+    "max_x0020_price": "max_price",
+    "modal_price": "modal_price",
+    "modal_x0020_price": "modal_price",
+}
+
+# Used when no store has been loaded yet (Rs/quintal)
+FALLBACK_PRICES = {
+    "wheat": {"min": 1800, "max": 2000},
+    "rice": {"min": 1500, "max": 1800},
+    "cotton": {"min": 5000, "max": 5500}
+}
+
+
+def _day_number(d: date) -> int:
+    return (d - EPOCH).days
+
+
+def _from_day_number(n: int) -> str:
+    return (EPOCH + timedelta(days=int(n))).isoformat()
+
+
+def _normalize_name(name: str) -> str:
+    return " ".join(str(name).strip().lower().split())
+
+
+class MandiPriceStore:
+    def __init__(self, columns: Dict[str, np.ndarray], names: Dict[str, List[str]]):
+        self.columns = columns
+        self.names = names
+        self.codes = {
+            column: {_normalize_name(n): i for i, n in enumerate(values)}
+            for column, values in names.items()
+        }
+        if any(name not in columns for name in INDEX_COLUMNS):
+            columns.update(self._build_indexes(columns))
+        self._state_latest = {}
+
+    @staticmethod
+    def _build_indexes(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """The last row of each (commodity, market) run, and the per-day aggregates"""
+        commodity, market = columns["commodity"], columns["market"]
+        n = len(commodity)
+        run_ends = np.flatnonzero((commodity[1:] != commodity[:-1]) | (market[1:] != market[:-1]))
+        indexes = {"market_ends": np.append(run_ends, n - 1) if n else np.empty(0, dtype=np.int64)}
+        for prefix, keys in DAILY_GROUPS.items():
+            indexes.update(MandiPriceStore._daily(columns, prefix, keys))
+        return indexes
+
+    @staticmethod
+    def _daily(columns: Dict[str, np.ndarray], prefix: str, keys: Tuple[str, ...]) -> Dict[str, np.ndarray]:
+        """
+        One row per (keys..., day): row count, count and sum of the known modal
+        prices, lowest min_price and highest max_price, and where the day's rows
+        start in <prefix>modal, which holds modal_price in (keys..., day) order.
+        """
+        order = np.lexsort((columns["date"], *(columns[key] for key in reversed(keys))))
+        grouped = [columns[key][order] for key in keys] + [columns["date"][order]]
+        n = len(order)
+        starts = np.flatnonzero(np.logical_or.reduce(
+            [np.concatenate(([True], values[1:] != values[:-1])) for values in grouped]
+        )) if n else np.empty(0, dtype=np.int64)
+
+        modal = columns["modal_price"][order]
+        known = ~np.isnan(modal)
+        daily = {f"{prefix}{name}": values[starts] for name, values in zip((*keys, "day"), grouped)}
+        daily[f"{prefix}offset"] = starts
+        daily[f"{prefix}rows"] = np.diff(np.append(starts, n))
+        daily[f"{prefix}modal"] = modal
+        if n:
+            daily[f"{prefix}modal_count"] = np.add.reduceat(known.astype(np.int64), starts)
+            daily[f"{prefix}modal_sum"] = np.add.reduceat(np.where(known, modal, 0).astype(np.float64), starts)
+            daily[f"{prefix}min"] = np.fmin.reduceat(columns["min_price"][order], starts)
+            daily[f"{prefix}max"] = np.fmax.reduceat(columns["max_price"][order], starts)
+        else:
+            daily.update({f"{prefix}{name}": np.empty(0) for name in ("modal_count", "modal_sum", "min", "max")})
+        return daily
+
+    # ---------- loading ----------
+
+    @classmethod
+    def from_frames(cls, frames: Iterable) -> "MandiPriceStore":
+        """
+        Build from pandas DataFrames already renamed to canonical columns.
+        Each frame is reduced to compact NumPy columns as it arrives, so only
+        one chunk of a large CSV is held as a DataFrame at a time.
+        """
+        import pandas as pd
+
+        # Store-wide normalized name -> code, grown chunk by chunk, and the spelling first seen
+        codes: Dict[str, Dict[str, int]] = {column: {} for column in CODE_COLUMNS}
+        spellings: Dict[str, Dict[str, str]] = {column: {} for column in CODE_COLUMNS}
+        parts: Dict[str, List[np.ndarray]] = {name: [] for name in (*CODE_COLUMNS, "date", *NUMERIC_COLUMNS)}
+
+        for frame in frames:
+            frame = frame.dropna(subset=["commodity", "market", "date", "modal_price"])
+            for column in CODE_COLUMNS:
+                categorical = pd.Categorical(frame[column].astype(str).str.strip())
+                index, spelling = codes[column], spellings[column]
+                remap = []
+                # Chunk-local category codes -> store-wide codes; lookups go through
+                # _normalize_name, so "Onion" and "ONION" must share a code
+                for category in categorical.categories:
+                    key = _normalize_name(category)
+                    spelling.setdefault(key, str(category))
+                    remap.append(index.setdefault(key, len(index)))
+                remap = np.array(remap, dtype=np.int32)
+                parts[column].append(remap[categorical.codes] if len(remap) else np.empty(0, dtype=np.int32))
+
+            dates = pd.to_datetime(frame["date"], dayfirst=True, errors="coerce")
+            parts["date"].append(((dates - pd.Timestamp(EPOCH)).dt.days).fillna(-1).astype(np.int32).to_numpy())
+            for column in NUMERIC_COLUMNS:
+                parts[column].append(pd.to_numeric(frame[column], errors="coerce").astype(np.float32).to_numpy())
+
+        columns = {
+            name: np.concatenate(chunks) if chunks else
+            np.empty(0, dtype=np.float32 if name in NUMERIC_COLUMNS else np.int32)
+            for name, chunks in parts.items()
+        }
+
+        # Renumber so names stay in alphabetical order, as in a single Categorical
+        names = {}
+        for column in CODE_COLUMNS:
+            ordered = sorted(codes[column])
+            rank = np.empty(len(ordered), dtype=np.int32)
+            for new_code, name in enumerate(ordered):
+                rank[codes[column][name]] = new_code
+            names[column] = [spellings[column][name] for name in ordered]
+            columns[column] = rank[columns[column]] if len(rank) else columns[column]
+
+        valid = columns["date"] >= 0
+        order = np.lexsort((columns["date"][valid], columns["market"][valid], columns["commodity"][valid]))
+        columns = {name: values[valid][order] for name, values in columns.items()}
+        return cls(columns, names)
+
+    @classmethod
+    def load_csv(cls, paths: List[str], chunksize: int = 1_000_000) -> "MandiPriceStore":
+        """Bulk-load Agmarknet-style CSV dumps"""
+        import pandas as pd
+
+        def frames():
+            for path in paths:
+                for chunk in pd.read_csv(path, chunksize=chunksize, dtype=str):
+                    chunk.columns = [
+                        HEADER_ALIASES.get(_normalize_name(c).replace(" ", "_"), c) for c in chunk.columns
+                    ]
+                    yield chunk[["commodity", "state", "market", "date", *NUMERIC_COLUMNS]]
+
+        return cls.from_frames(frames())
+
+    def save(self, directory: str = MANDI_STORE_DIR):
+        os.makedirs(directory, exist_ok=True)
+        for name, values in self.columns.items():
+            np.save(os.path.join(directory, f"{name}.npy"), values)
+        with open(os.path.join(directory, "names.json"), "w", encoding="utf-8") as f:
+            json.dump(self.names, f, ensure_ascii=False)
+
+    @classmethod
+    def open(cls, directory: str = MANDI_STORE_DIR) -> "MandiPriceStore":
+        """Open a saved store with memory-mapped columns"""
+        with open(os.path.join(directory, "names.json"), encoding="utf-8") as f:
+            names = json.load(f)
+        columns = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            for name in (*CODE_COLUMNS, "date", *NUMERIC_COLUMNS, *INDEX_COLUMNS)
+            # Stores saved before the indexes existed get them rebuilt in __init__
+            if name not in INDEX_COLUMNS or os.path.exists(os.path.join(directory, f"{name}.npy"))
+        }
+        return cls(columns, names)
+
+    # ---------- lookups ----------
+
+    def code(self, column: str, name: Optional[str]) -> Optional[np.int32]:
+        if not name:
+            return None
+        code = self.codes[column].get(_normalize_name(name))
+        # Keep the column dtype: a Python int key makes searchsorted upcast (copy) the whole column
+        return None if code is None else np.int32(code)
+
+    def _commodity_slice(self, commodity_code: int) -> slice:
+        col = self.columns["commodity"]
+        start = int(np.searchsorted(col, commodity_code, side="left"))
+        end = int(np.searchsorted(col, commodity_code, side="right"))
+        return slice(start, end)
+
+    def _rows(self, commodity: str, market: Optional[str] = None,
+              state: Optional[str] = None) -> Optional[Tuple[np.int32, slice, Optional[np.int32]]]:
+        """
+        (commodity code, rows, state code) for a query: rows is the commodity's
+        slice, or one market's run within it (NumPy views, no copy). A state
+        does not narrow rows to a slice, so its code is returned instead.
+        """
+        commodity_code = self.code("commodity", commodity)
+        if commodity_code is None:
+            return None
+        rows = self._commodity_slice(commodity_code)
+
+        if market:
+            market_code = self.code("market", market)
+            if market_code is None:
+                return None
+            markets = self.columns["market"][rows]
+            start = rows.start + int(np.searchsorted(markets, market_code, side="left"))
+            end = rows.start + int(np.searchsorted(markets, market_code, side="right"))
+            return commodity_code, slice(start, end), None
+
+        if state:
+            state_code = self.code("state", state)
+            if state_code is None:
+                return None
+            return commodity_code, rows, state_code
+
+        return commodity_code, rows, None
+
+    def _latest_rows(self, rows: slice, state_code: Optional[np.int32]) -> np.ndarray:
+        """Last row (the latest price) of each market in a commodity slice, optionally in one state"""
+        if state_code is None:
+            ends = self.columns["market_ends"]
+            lo = int(np.searchsorted(ends, rows.start, side="left"))
+            hi = int(np.searchsorted(ends, rows.stop, side="left"))
+            return ends[lo:hi]
+
+        key = (rows.start, int(state_code))
+        if key not in self._state_latest:
+            # A market name can exist in two states, so runs are cut from the state's own rows.
+            # Cached per (commodity, state); the store is read-only once built
+            in_state = rows.start + np.flatnonzero(self.columns["state"][rows] == state_code)
+            markets = self.columns["market"][in_state]
+            self._state_latest[key] = in_state[np.append(np.flatnonzero(markets[1:] != markets[:-1]),
+                                                          len(in_state) - 1)] if len(in_state) else in_state
+        return self._state_latest[key]
+
+    def _days(self, commodity_code: np.int32, state_code: Optional[np.int32], days: int,
+              end_day: Optional[int] = None) -> Tuple[str, slice, int]:
+        """
+        (prefix, aggregate rows, end_day) for the last `days` days up to end_day
+        (default: the newest day) of a commodity, or of one state's markets.
+        """
+        prefix, keys = ("daily_", (commodity_code,)) if state_code is None else \
+            ("state_daily_", (commodity_code, state_code))
+        lo, hi = 0, len(self.columns[prefix + "day"])
+        for name, value in zip(DAILY_GROUPS[prefix], keys):
+            values = self.columns[prefix + name][lo:hi]
+            lo, hi = lo + int(np.searchsorted(values, value, side="left")), \
+                lo + int(np.searchsorted(values, value, side="right"))
+        if lo == hi:
+            return prefix, slice(lo, lo), 0
+
+        day = self.columns[prefix + "day"][lo:hi]
+        if end_day is None:
+            end_day = int(day[-1])
+        start = lo + int(np.searchsorted(day, end_day - days, side="right"))
+        stop = lo + int(np.searchsorted(day, end_day, side="right"))
+        return prefix, slice(start, stop), end_day
+
+    def _market_window(self, rows: slice, days: int, end_day: Optional[int] = None) -> Tuple[slice, int]:
+        """Rows of one market run in the last `days` days up to end_day (default: its newest day)"""
+        dates = self.columns["date"][rows]
+        if end_day is None:
+            end_day = int(dates[-1])
+        start = rows.start + int(np.searchsorted(dates, end_day - days, side="right"))
+        stop = rows.start + int(np.searchsorted(dates, end_day, side="right"))
+        return slice(start, stop), end_day
+
+    def latest(self, commodity: str, market: Optional[str] = None, state: Optional[str] = None,
+               limit: int = 10) -> List[Dict]:
+        """Most recent price in each market, newest first"""
+        found = self._rows(commodity, market, state)
+        if found is None or found[1].stop == found[1].start:
+            return []
+        _, rows, state_code = found
+
+        if market:
+            return [self._record(rows.stop - 1)][:limit]
+        latest_rows = self._latest_rows(rows, state_code)
+        latest_rows = latest_rows[np.argsort(-self.columns["date"][latest_rows], kind="stable")][:limit]
+        return [self._record(i) for i in latest_rows]
+
+    def window_stats(self, commodity: str, days: int = 7, market: Optional[str] = None,
+                     state: Optional[str] = None, as_of: Optional[date] = None) -> Optional[Dict]:
+        """Min/max/modal statistics over the last `days` days of data"""
+        found = self._rows(commodity, market, state)
+        if found is None or found[1].stop == found[1].start:
+            return None
+        commodity_code, rows, state_code = found
+        as_of_day = _day_number(as_of) if as_of else None
+
+        c = self.columns
+        if market:
+            selected, end_day = self._market_window(rows, days, as_of_day)
+            records = selected.stop - selected.start
+            if records == 0:
+                return None
+            modal = c["modal_price"][selected]
+            min_price, max_price = np.nanmin(c["min_price"][selected]), np.nanmax(c["max_price"][selected])
+            avg_modal = np.nanmean(modal)
+        else:
+            prefix, groups, end_day = self._days(commodity_code, state_code, days, as_of_day)
+            if groups.stop == groups.start:
+                return None
+            counts = c[prefix + "rows"][groups]
+            records = int(counts.sum())
+            start = int(c[prefix + "offset"][groups.start])
+            modal = c[prefix + "modal"][start:start + records]
+            min_price, max_price = np.nanmin(c[prefix + "min"][groups]), np.nanmax(c[prefix + "max"][groups])
+            known = c[prefix + "modal_count"][groups].sum()
+            avg_modal = c[prefix + "modal_sum"][groups].sum() / known if known else np.nan
+
+        return {
+            "commodity": self.names["commodity"][commodity_code],
+            "days": days,
+            "from": _from_day_number(end_day - days + 1),
+            "to": _from_day_number(end_day),
+            "records": int(records),
+            "min_price": float(min_price),
+            "max_price": float(max_price),
+            "modal_price": float(np.nanmedian(modal)),
+            "avg_modal_price": round(float(avg_modal), 2),
+        }
+
+    def trend(self, commodity: str, days: int = 30, market: Optional[str] = None,
+              state: Optional[str] = None) -> Optional[Dict]:
+        """Daily slope of the average modal price over the last `days` days"""
+        found = self._rows(commodity, market, state)
+        if found is None or found[1].stop == found[1].start:
+            return None
+        commodity_code, rows, state_code = found
+
+        c = self.columns
+        if market:
+            selected, _ = self._market_window(rows, days)
+            unique_days, inverse = np.unique(c["date"][selected], return_inverse=True)
+            daily = np.bincount(inverse, weights=c["modal_price"][selected]) / np.bincount(inverse)
+        else:
+            prefix, groups, _ = self._days(commodity_code, state_code, days)
+            known = c[prefix + "modal_count"][groups] > 0
+            unique_days = c[prefix + "day"][groups][known]
+            daily = c[prefix + "modal_sum"][groups][known] / c[prefix + "modal_count"][groups][known]
+        if len(unique_days) < 2:
+            return None
+        slope = float(np.polyfit(unique_days - unique_days[0], daily, 1)[0])
+        change = (daily[-1] - daily[0]) / daily[0] * 100 if daily[0] else 0.0
+
+        direction = "rising" if slope > 0.1 else "falling" if slope < -0.1 else "stable"
+        return {
+            "days": days,
+            "slope_per_day": round(slope, 2),
+            "change_percent": round(float(change), 1),
+            "direction": direction,
+        }
+
+    def _record(self, i: int) -> Dict:
+        c = self.columns
+        return {
+            "commodity": self.names["commodity"][c["commodity"][i]],
+            "market": self.names["market"][c["market"][i]],
+            "state": self.names["state"][c["state"][i]],
+            "date": _from_day_number(c["date"][i]),
+            "min_price": float(c["min_price"][i]),
+            "max_price": float(c["max_price"][i]),
+            "modal_price": float(c["modal_price"][i]),
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_price_store() -> Optional[MandiPriceStore]:
+    """Shared store opened from MANDI_STORE_DIR (None if nothing has been loaded)"""
+    global _store
+    if _store is None and os.path.exists(os.path.join(MANDI_STORE_DIR, "names.json")):
+        with _store_lock:
+            if _store is None:
+                _store = MandiPriceStore.open()
+    return _store
+
 
 def get_mandi_prices(crop: str) -> Dict:
-    prices = {
-        "wheat": {"min": 1800, "max": 2000},
-        "rice": {"min": 1500, "max": 1800},
-        "cotton": {"min": 5000, "max": 5500}
-    }
+    store = get_price_store()
+    stats = store.window_stats(crop, days=30) if store else None
+    if stats:
+        return {"min": stats["min_price"], "max": stats["max_price"], "modal": stats["modal_price"]}
+
+    return FALLBACK_PRICES.get(crop.lower(), {"min": 0, "max": 0})
+
 
-    return prices.get(crop.lower(), {"min": 0, "max": 0})
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "load":
+        started = datetime.now()
+        store = MandiPriceStore.load_csv(sys.argv[2:])
+        store.save()
+        print(f"Loaded {len(store)} rows into {MANDI_STORE_DIR} in {datetime.now() - started}")
+    else:
+        print("Usage: python -m data.mandi_prices load <agmarknet.csv> [...]")
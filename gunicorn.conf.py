@@ -0,0 +1,50 @@
+# gunicorn.conf.py
+"""
+Multi-worker deployment: gunicorn supervising uvicorn workers.
+
+    gunicorn main:app -c gunicorn.conf.py
+
+The app is imported once in the master (preload_app) and the read-only
+assets (intent router, retrieval index, scheme catalogue, district index) are
+loaded there before the workers fork, so they are shared copy-on-write.
+Conversation state and the response cache live in a SQLite store shared by
+all workers (SHARED_STORE_PATH). Each worker publishes its metrics and
+counters there too, so /metrics and the /*/stats endpoints report the whole
+host whichever worker answers (utils/worker_stats.py). Admission limits stay
+per worker: size the ADMISSION_* values for one worker.
+
+    WEB_CONCURRENCY   number of workers (default: one per CPU core)
+    BIND              listen address (default 0.0.0.0:8000)
+"""
+import gc
+import multiprocessing
+import os
+
+# Set before the app is imported, so every module sees the shared store
+os.environ.setdefault(
+    "SHARED_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "shared_store.sqlite"),
+)
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# Voice requests can spend a long time in STT/TTS
+timeout = int(os.getenv("WORKER_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then to bound memory growth (0 disables)
+max_requests = int(os.getenv("MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+
+
+def when_ready(server):
+    """Runs in the master after the app is imported and before any worker is forked"""
+    from utils.warmup import get_warmup_registry
+    get_warmup_registry().preload_shared()
+    # Keep the garbage collector from touching (and so copying) the preloaded objects in each worker
+    gc.freeze()
@@ -1,19 +1,51 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request, Query
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
 from pydantic import BaseModel
-from agent import run_agent_with_memory, create_new_conversation
+from agent import run_agent_with_memory, create_new_conversation, conversation_memory
 from utils.translator import detect_language, translate_to_english, translate_to_local
 from utils.voice_utils_simple import voice_processor, logger
 from fastapi.middleware.cors import CORSMiddleware
-from typing import  Optional
-from tools.disease_detector import detect_plant_disease
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, Optional, List
+from tools.disease_detector import analyze_plant_disease
+from tools.crop_advisory import get_crop_advice_batch
+from data.mandi_prices import get_price_store
+from utils.llm_client import llm_snapshot
+from utils.response_cache import response_cache
+from utils.intent_router import get_intent_router
+from utils.tracing import TracingMiddleware, render_metrics, span
+from utils.warmup import get_warmup_registry
+from utils.worker_stats import start_stats_publisher, stop_stats_publisher
+from utils.admission import AdmissionMiddleware, admission_snapshot
+from utils.upstream_health import get_upstream_health, upstream_available
+from utils.resilience import breaker_snapshot
+from utils.job_queue import get_job_queue, JobFailed
+from utils.rate_limit import identify, bind_client, get_rate_limiter, RateLimited, RATE_LIMIT_ENABLED
+from tools.disease_batch import (
+    iter_batch_results, extract_zip_images, is_zip, BatchTooLarge,
+    MAX_BATCH_IMAGES, MAX_BATCH_ZIP_BYTES
+)
+from utils.uploads import (
+    read_upload, decode_base64_limited, detect_image_format_from_bytes,
+    UploadTooLarge, UnsupportedUploadFormat, MAX_UPLOAD_BYTES, JSONBodyLimitMiddleware
+)
+import asyncio
 import base64
+import json
 import logging
-import speech_recognition as sr
 import tempfile
 import os
 
 app = FastAPI()
 
+UPLOAD_LIMIT_MB = MAX_UPLOAD_BYTES // (1024 * 1024)
+
+# Innermost: refuse oversized JSON bodies before FastAPI buffers and parses them
+app.add_middleware(JSONBodyLimitMiddleware)
+
+# Concurrency caps and load shedding for the expensive routes
+app.add_middleware(AdmissionMiddleware)
+
 # CORS if needed
 app.add_middleware(
     CORSMiddleware,
@@ -21,12 +53,77 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Retry-After"],
 )
+# Outermost, so request latency includes the other middleware
+app.add_middleware(TracingMiddleware)
 
 # Single global conversation memory
 global_conversation = create_new_conversation()
 
 
+@app.on_event("startup")
+async def start_warmup():
+    # In the background, so /health/live answers while components load
+    app.state.warmup_task = asyncio.create_task(get_warmup_registry().run())
+
+
+@app.on_event("startup")
+async def start_job_workers():
+    queue = get_job_queue()
+    queue.register("voice", _voice_job)
+    queue.register("disease", _disease_job)
+    queue.start()
+
+
+@app.on_event("startup")
+async def start_worker_stats():
+    # Each worker's counters go to the shared store, so the stats endpoints report the whole host
+    start_stats_publisher()
+
+
+@app.on_event("shutdown")
+async def stop_worker_stats():
+    stop_stats_publisher()
+
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    # Running jobs go back to the queue for the next start (or another worker process)
+    await get_job_queue().stop()
+
+
+async def _submit_job(kind: str, params: Dict, payload: bytes) -> JSONResponse:
+    """202 with the job id; the client polls GET /jobs/{job_id}"""
+    job_id = await get_job_queue().enqueue(kind, params, payload)
+    return JSONResponse(
+        {"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"},
+        status_code=202,
+        headers={"Location": f"/jobs/{job_id}"},
+    )
+
+
+def _client_of(request: Request, session_id: Optional[str] = None) -> str:
+    return identify(request.headers, request.client.host if request.client else None, session_id)
+
+
+def enforce_quota(request: Request, resources: Dict[str, float], session_id: Optional[str] = None):
+    """Bind the caller for usage charging; 429 if any of its buckets cannot cover the request"""
+    client = _client_of(request, session_id)
+    bind_client(client)
+    if not RATE_LIMIT_ENABLED:
+        return
+    try:
+        for resource, amount in resources.items():
+            get_rate_limiter().require(client, resource, amount)
+    except RateLimited as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+# Upfront checks per endpoint; actual usage is charged as the pipeline runs
+VOICE_QUOTA = {"stt_seconds": 1, "llm_calls": 1, "tts_chars": 1}
+
+
 class QueryInput(BaseModel):
     query: str
 
@@ -41,10 +138,24 @@ class DiseaseInput(BaseModel):
     leaf_description: str
 
 
+class CropPlotInput(BaseModel):
+    soil_type: Optional[str] = None
+    rainfall: float
+    temperature: float
+    season: Optional[str] = None
+    plot_id: Optional[str] = None
+
+
+class CropBatchInput(BaseModel):
+    plots: List[CropPlotInput]
+    top_k: int = 3
+
+
 @app.post("/ask")
-async def query_backend(q: QueryInput):
+async def query_backend(q: QueryInput, request: Request):
     if len(q.query or "") > 4000:
         return {"response": "Input is too long. Please limit to 4000 characters."}
+    enforce_quota(request, {"llm_calls": 1})
 
     # Detect user language
     user_lang = detect_language(q.query)
@@ -53,7 +164,7 @@ async def query_backend(q: QueryInput):
     print(f"[Lang: {user_lang}] Q: {english_input}")
 
     # Run agent with memory
-    english_response, conversation_history = await run_agent_with_memory(
+    english_response, _ = await run_agent_with_memory(
         english_input,
         global_conversation,
         user_lang
@@ -63,40 +174,124 @@ async def query_backend(q: QueryInput):
     translated_response = translate_to_local(english_response, user_lang)
 
     # Return just the response as a simple string
-    return {"response": translated_response}
+    return _with_offline({"response": translated_response})
+
+
+def _with_offline(payload: Dict) -> Dict:
+    """Name the upstreams answered by local fallbacks, so clients can tell the user"""
+    offline = get_upstream_health().down()
+    if offline:
+        payload["offline"] = offline
+    return payload
+
+
+def _disease_response(result, format: str) -> Dict:
+    # Return with 'solution' key to match frontend expectation
+    if format == "sms":
+        return {"solution": result.to_sms()}
+    if format == "json":
+        return {"solution": result.to_markdown(), "result": result.to_dict()}
+    return {"solution": result.to_markdown()}
+
+
+async def _disease_job(params: Dict, payload: bytes) -> Dict:
+    with span("disease.analyze"):
+        result = await run_in_threadpool(analyze_plant_disease, "", payload)
+    return _disease_response(result, params.get("format", "markdown"))
 
 
 @app.post("/detect-disease")
-async def detect_disease(file: UploadFile = File(...)):
-    """Detect plant disease and suggest pesticides based on uploaded image"""
+async def detect_disease(file: UploadFile = File(...), format: str = "markdown",
+                         run_async: bool = Query(False, alias="async")):
+    """
+    Detect plant disease and suggest pesticides based on uploaded image.
+    format: "markdown" (default), "sms" for a compact text form, or "json" to
+    also return the structured result.
+    async=1: answer 202 with a job id at once; fetch the result from GET /jobs/{job_id}.
+    """
 
     try:
         # Validate image file
         if not file.content_type.startswith('image/'):
             return {"solution": "Please upload an image file (JPEG, PNG, etc.)"}
 
-        if file.size > 10 * 1024 * 1024:  # 10MB limit
-            return {"solution": "Image file too large. Please upload an image smaller than 10MB."}
+        # Read image data in chunks, stopping at the size limit
+        try:
+            image_data, image_format = await read_upload(
+                file, sniff=detect_image_format_from_bytes, require_format=True
+            )
+        except UploadTooLarge:
+            return {"solution": f"Image file too large. Please upload an image smaller than {UPLOAD_LIMIT_MB}MB."}
+        except UnsupportedUploadFormat:
+            return {"solution": "Please upload an image file (JPEG, PNG, etc.)"}
 
-        # Read image data
-        image_data = await file.read()
+        print(f"[Disease Detection] Image uploaded: {file.filename} ({len(image_data)} bytes, {image_format})")
 
-        print(f"[Disease Detection] Image uploaded: {file.filename} ({len(image_data)} bytes)")
+        if run_async:
+            return await _submit_job("disease", {"format": format}, image_data)
 
         # Detect disease and get recommendations (no description needed)
-        english_result = detect_plant_disease("", image_data)
+        with span("disease.analyze"):
+            result = await run_in_threadpool(analyze_plant_disease, "", image_data)
 
-        # Return with 'solution' key to match frontend expectation
-        return {"solution": english_result}
+        return _disease_response(result, format)
 
     except Exception as e:
         return {"solution": f"Error processing image: {str(e)}"}
 
 
 @app.post("/detect-disease/")
-async def detect_disease_with_slash(file: UploadFile = File(...)):
+async def detect_disease_with_slash(file: UploadFile = File(...), format: str = "markdown",
+                                    run_async: bool = Query(False, alias="async")):
     """Same endpoint with trailing slash for compatibility"""
-    return await detect_disease(file)
+    return await detect_disease(file, format, run_async)
+
+
+@app.post("/detect-disease/batch")
+async def detect_disease_batch(files: List[UploadFile] = File(...)):
+    """
+    Detect plant disease for many images at once (image files and/or zip archives).
+    Streams newline-delimited JSON: one line per image as it finishes, then a field summary.
+    """
+    images = []
+    try:
+        for upload in files:
+            if upload.content_type and upload.content_type.startswith('image/'):
+                image_data, _ = await read_upload(
+                    upload, sniff=detect_image_format_from_bytes, require_format=True
+                )
+                images.append((upload.filename, image_data))
+            else:
+                archive, _ = await read_upload(upload, max_bytes=MAX_BATCH_ZIP_BYTES)
+                if not is_zip(archive):
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"{upload.filename}: please upload image files or a zip archive of images"
+                    )
+                images.extend(extract_zip_images(
+                    archive, MAX_UPLOAD_BYTES, MAX_BATCH_IMAGES - len(images)
+                ))
+
+            if len(images) > MAX_BATCH_IMAGES:
+                raise BatchTooLarge(f"Batch exceeds {MAX_BATCH_IMAGES} images")
+
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=f"Upload too large: {str(e)}")
+    except UnsupportedUploadFormat:
+        raise HTTPException(status_code=400, detail="Please upload image files (JPEG, PNG, etc.)")
+    except BatchTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    if not images:
+        raise HTTPException(status_code=400, detail="No images found in the upload")
+
+    print(f"[Disease Detection] Batch of {len(images)} images uploaded")
+
+    async def stream_results():
+        async for result in iter_batch_results(images):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
 
 
 @app.post("/detect-disease-text-only")
@@ -107,28 +302,122 @@ async def detect_disease_text_only(d: DiseaseInput):
             return {"response": "Description is too long. Please limit to 2000 characters."}
 
         # Detect user language
-        user_lang = detect_language(d.leaf_description)
-        english_description = translate_to_english(d.leaf_description)
+        user_lang = await run_in_threadpool(detect_language, d.leaf_description)
+        english_description = await run_in_threadpool(translate_to_english, d.leaf_description)
 
         print(f"[Disease Detection] [Lang: {user_lang}] Description: {english_description}")
 
         # Detect disease and get recommendations
-        english_result = detect_plant_disease(english_description)
-
-        # Translate result back to user's language
-        translated_result = translate_to_local(english_result, user_lang)
+        with span("disease.analyze"):
+            result = await run_in_threadpool(analyze_plant_disease, english_description)
 
-        return {"response": translated_result}
+        # Render in the user's language; static blocks come from the translation cache
+        markdown = await run_in_threadpool(result.to_markdown, user_lang)
+        return {"response": markdown}
 
     except Exception as e:
         return {"response": f"Error processing your request: {str(e)}"}
 
 
+@app.post("/crop-advice/batch")
+async def crop_advice_batch(batch: CropBatchInput):
+    """Rank crops for many plots or districts at once (bulk advisory campaigns)"""
+    if len(batch.plots) > 100000:
+        raise HTTPException(status_code=413, detail="Please send at most 100000 plots per request.")
+
+    plots = [plot.model_dump() for plot in batch.plots]
+    ranked = await run_in_threadpool(get_crop_advice_batch, plots, batch.top_k)
+
+    return {
+        "results": [
+            {"plot_id": plot["plot_id"], "recommendations": recommendations}
+            for plot, recommendations in zip(plots, ranked)
+        ]
+    }
+
+
+@app.get("/mandi/prices")
+async def mandi_prices(commodity: str, market: Optional[str] = None, state: Optional[str] = None,
+                       limit: int = 10):
+    """Latest mandi prices with 7/30-day statistics and 30-day trend"""
+    store = get_price_store()
+    if store is None:
+        raise HTTPException(status_code=503, detail="Mandi price data has not been loaded")
+
+    latest = store.latest(commodity, market, state, limit)
+    if not latest:
+        raise HTTPException(status_code=404, detail=f"No prices found for {commodity}")
+
+    return {
+        "latest": latest,
+        "last_7_days": store.window_stats(commodity, 7, market, state),
+        "last_30_days": store.window_stats(commodity, 30, market, state),
+        "trend": store.trend(commodity, 30, market, state)
+    }
+
+
+@app.get("/llm/stats")
+async def llm_stats():
+    """Token usage, latency and coalescing counters for the shared LLM client (all workers)"""
+    return await run_in_threadpool(llm_snapshot)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Request and per-stage latency histograms in the Prometheus text format (all workers)"""
+    return PlainTextResponse(await run_in_threadpool(render_metrics), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/usage")
+async def usage(request: Request, session_id: Optional[str] = None):
+    """The caller's remaining quota and usage so far, per upstream resource"""
+    return get_rate_limiter().usage(_client_of(request, session_id))
+
+
+@app.get("/admission/stats")
+async def admission_stats():
+    """Current concurrency limits, queue depths and shedding counts per route class (all workers)"""
+    return await run_in_threadpool(admission_snapshot)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit rates of the agent response cache (all workers)"""
+    return await run_in_threadpool(response_cache.snapshot)
+
+
+@app.delete("/cache")
+async def clear_cache():
+    """Drop all cached agent responses"""
+    response_cache.clear()
+    return {"message": "Response cache cleared"}
+
+
+@app.get("/router/stats")
+async def router_stats():
+    """Per-intent routing counts, accuracy against the agent and latency saved (all workers)"""
+    return await run_in_threadpool(get_intent_router().snapshot)
+
+
 @app.get("/conversation")
-async def get_conversation_history():
-    """Get conversation history"""
+async def get_conversation_history(offset: int = 0, limit: int = 20, since: Optional[int] = None):
+    """
+    Paginated conversation log. Use offset/limit for pages, or since=<seq>
+    to fetch only turns after a cursor returned earlier.
+    """
+    log = global_conversation["log"]
+    if since is not None:
+        records, next_cursor = log.since(since, limit)
+        total = len(log)
+    else:
+        records, total = log.page(offset, limit)
+        next_cursor = records[-1].seq if records else None
+
     return {
-        "conversation_history": global_conversation.get("conversation_history", []),
+        "conversation_history": [r.to_dict() for r in records],
+        "total": total,
+        "offset": records[0].seq if records else offset,
+        "next_cursor": next_cursor,
         "created_at": global_conversation.get("created_at"),
         "last_activity": global_conversation.get("last_activity")
     }
@@ -138,6 +427,8 @@ async def get_conversation_history():
 async def clear_conversation():
     """Clear the conversation memory"""
     global global_conversation
+    global_conversation["log"].clear()
+    conversation_memory(global_conversation).clear()
     global_conversation = create_new_conversation()
     return {"message": "Conversation memory cleared successfully"}
 
@@ -147,79 +438,120 @@ async def healthcheck():
     return {"status": "up"}
 
 
-@app.post("/voice/ask")
-async def voice_query_backend(vq: VoiceQueryInput):
-    print("/ask")
-    try:
-        import base64
+@app.get("/health/live")
+async def liveness():
+    """The process is serving requests (restart it if this fails)"""
+    return {"status": "alive"}
 
-        # Decode base64 audio data
-        audio_bytes = base64.b64decode(vq.audio_data)
 
-        logger.info(f"Received audio data: {len(audio_bytes)} bytes")
+@app.get("/health/upstreams")
+async def upstream_health():
+    """Reachability of each upstream, which ones use local fallbacks, and circuit breaker states"""
+    return {**get_upstream_health().snapshot(), "breakers": breaker_snapshot()}
 
-        # Validate audio format with better error handling
-        if not voice_processor.validate_audio_format(audio_bytes):
-            supported_formats = voice_processor.get_supported_audio_formats()
-            logger.error(f"Invalid audio format. Data length: {len(audio_bytes)} bytes")
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid audio format. Supported formats: {', '.join(supported_formats)}. Received {len(audio_bytes)} bytes."
-            )
 
-        logger.info("Audio format validation passed")
+@app.get("/health/ready")
+async def readiness():
+    """200 once warm-up has finished, 503 with per-component status until then"""
+    report = get_warmup_registry().snapshot()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
 
-        # Try online recognition with Indian language priority
-        transcribed_text, detected_language = voice_processor.speech_to_text(
-            audio_bytes,
-            vq.language
-        )
 
-        # If online recognition fails, try offline
-        if not transcribed_text:
-            logger.info("Online recognition failed, trying offline recognition...")
-            transcribed_text, detected_language = voice_processor.speech_to_text_offline(audio_bytes)
-
-        logger.info(f"Speech recognition result: '{transcribed_text}' (lang: {detected_language})")
-
-        if not transcribed_text:
-            return {
-                "error": "Could not understand speech. Please try again.",
-                "transcribed_text": "",
-                "detected_language": detected_language,
-                "response": "",
-                "audio_response": ""
-            }
-
-        # Process the transcribed text through existing agent
-        english_input = translate_to_english(transcribed_text)
-
-        print(f"[Voice] [Lang: {detected_language}] Transcribed: {transcribed_text}")
-        print(f"[Voice] English: {english_input}")
-
-        # Run agent with memory
-        english_response, conversation_history = await run_agent_with_memory(
-            english_input,
-            global_conversation,
-            detected_language
+async def _process_voice_query(
+        audio_bytes: bytes,
+        language: Optional[str],
+        session_id: Optional[str],
+        audio_format: Optional[str] = None
+):
+    """
+    Shared pipeline for /voice/ask, /voice/ask-file and voice jobs: STT -> agent -> TTS.
+    The audio and translation stages block, so they run on the threadpool.
+    """
+    logger.info(f"Received audio data: {len(audio_bytes)} bytes")
+
+    # Validate audio format with better error handling
+    if not await run_in_threadpool(voice_processor.validate_audio_format, audio_bytes, audio_format):
+        supported_formats = voice_processor.get_supported_audio_formats()
+        logger.error(f"Invalid audio format. Data length: {len(audio_bytes)} bytes")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid audio format. Supported formats: {', '.join(supported_formats)}. Received {len(audio_bytes)} bytes."
         )
 
-        # Translate response back to user's language
-        translated_response = translate_to_local(english_response, detected_language)
+    logger.info("Audio format validation passed")
 
-        # Convert response to speech in the detected language
-        audio_response = voice_processor.text_to_speech(translated_response, detected_language)
-        audio_response_b64 = base64.b64encode(audio_response).decode('utf-8')
+    # Try online recognition with Indian language priority
+    transcribed_text, detected_language = await run_in_threadpool(
+        voice_processor.speech_to_text,
+        audio_bytes,
+        language,
+        audio_format
+    )
+
+    # If online recognition fails, try offline (speech_to_text already did while Google STT is down)
+    if not transcribed_text and upstream_available("stt"):
+        logger.info("Online recognition failed, trying offline recognition...")
+        transcribed_text, detected_language = await run_in_threadpool(
+            voice_processor.speech_to_text_local, audio_bytes, audio_format
+        )
+
+    logger.info(f"Speech recognition result: '{transcribed_text}' (lang: {detected_language})")
 
+    if not transcribed_text:
         return {
-            "transcribed_text": transcribed_text,
+            "error": "Could not understand speech. Please try again.",
+            "transcribed_text": "",
             "detected_language": detected_language,
-            "response": translated_response,
-            "audio_response": audio_response_b64,
-            "session_id": vq.session_id,
-            "conversation_history": conversation_history
+            "response": "",
+            "audio_response": ""
         }
 
+    # Process the transcribed text through existing agent
+    english_input = await run_in_threadpool(translate_to_english, transcribed_text)
+
+    print(f"[Voice] [Lang: {detected_language}] Transcribed: {transcribed_text}")
+    print(f"[Voice] English: {english_input}")
+
+    # Run agent with memory
+    english_response, record = await run_agent_with_memory(
+        english_input,
+        global_conversation,
+        detected_language
+    )
+
+    # Translate response back to user's language
+    translated_response = await run_in_threadpool(translate_to_local, english_response, detected_language)
+
+    # Convert response to speech in the detected language
+    audio_response = await run_in_threadpool(voice_processor.text_to_speech, translated_response, detected_language)
+    audio_response_b64 = base64.b64encode(audio_response).decode('utf-8')
+
+    return _with_offline({
+        "transcribed_text": transcribed_text,
+        "detected_language": detected_language,
+        "response": translated_response,
+        "audio_response": audio_response_b64,
+        "session_id": session_id,
+        # Fetch earlier turns with GET /conversation?since=<cursor>
+        "conversation_cursor": record.seq
+    })
+
+
+@app.post("/voice/ask")
+async def voice_query_backend(vq: VoiceQueryInput, request: Request):
+    print("/ask")
+    enforce_quota(request, VOICE_QUOTA, vq.session_id)
+    try:
+        # Decode base64 audio data, rejecting oversized payloads before decoding
+        try:
+            audio_bytes = decode_base64_limited(vq.audio_data)
+        except UploadTooLarge:
+            raise HTTPException(status_code=400, detail=f"Audio file too large. Please upload a file smaller than {UPLOAD_LIMIT_MB}MB.")
+
+        return await _process_voice_query(audio_bytes, vq.language, vq.session_id)
+
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Voice processing error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Voice processing error: {str(e)}")
@@ -227,14 +559,18 @@ async def voice_query_backend(vq: VoiceQueryInput):
 
 @app.post("/voice/ask-file")
 async def voice_query_file(
+        request: Request,
         audio_file: UploadFile = File(...),
         language: str = Form("auto"),
-        session_id: Optional[str] = Form(None)
+        session_id: Optional[str] = Form(None),
+        run_async: bool = Query(False, alias="async")
 ):
     """
-    Voice query endpoint that accepts audio file upload
+    Voice query endpoint that accepts audio file upload.
+    async=1: answer 202 with a job id at once; fetch the result from GET /jobs/{job_id}.
     """
     print("/ask-file")
+    enforce_quota(request, VOICE_QUOTA, session_id)
     try:
         # Validate file type more broadly
         if not audio_file.content_type.startswith(('audio/', 'video/')):
@@ -244,29 +580,57 @@ async def voice_query_file(
                 detail=f"Please upload an audio file. Supported formats: {', '.join(supported_formats)}"
             )
 
-        if audio_file.size > 10 * 1024 * 1024:  # 10MB limit
-            raise HTTPException(status_code=400, detail="Audio file too large. Please upload a file smaller than 10MB.")
-
-        # Read audio data
-        audio_data = await audio_file.read()
-
-        # Convert to base64 for processing
-        audio_b64 = base64.b64encode(audio_data).decode('utf-8')
+        # Read audio data in chunks, stopping at the size limit
+        try:
+            audio_data, audio_format = await read_upload(
+                audio_file, sniff=voice_processor.detect_format_from_bytes
+            )
+        except UploadTooLarge:
+            raise HTTPException(status_code=400, detail=f"Audio file too large. Please upload a file smaller than {UPLOAD_LIMIT_MB}MB.")
 
-        # Use the existing voice endpoint
-        voice_input = VoiceQueryInput(
-            audio_data=audio_b64,
-            language=language,
-            session_id=session_id
-        )
+        if run_async:
+            params = {"language": language, "session_id": session_id, "audio_format": audio_format,
+                      "client": _client_of(request, session_id)}
+            return await _submit_job("voice", params, audio_data)
 
-        return await voice_query_backend(voice_input)
+        # Hand the raw bytes and sniffed format straight to the voice pipeline
+        return await _process_voice_query(audio_data, language, session_id, audio_format)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"File processing error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"File processing error: {str(e)}")
 
 
+async def _voice_job(params: Dict, payload: bytes) -> Dict:
+    # Usage is charged to the client that submitted the job
+    bind_client(params["client"])
+    try:
+        return await _process_voice_query(payload, params["language"], params["session_id"], params["audio_format"])
+    except HTTPException as e:
+        # Unreadable audio: retrying will not help
+        raise JobFailed(str(e.detail))
+
+
+@app.get("/jobs/stats")
+async def job_stats():
+    """Jobs per status and worker count of this process"""
+    return await run_in_threadpool(get_job_queue().snapshot)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    """
+    Status of a background job, with its result once done.
+    wait=<seconds>: long-poll until the job finishes or the time is up (capped by JOB_MAX_WAIT).
+    """
+    job = await get_job_queue().wait_for(job_id, wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job id")
+    return job
+
+
 @app.get("/voice/supported-languages")
 async def get_supported_languages():
     """
@@ -276,12 +640,13 @@ async def get_supported_languages():
 
 
 @app.post("/voice/text-to-speech")
-async def text_to_speech_endpoint(text: str, language: str = "en"):
+async def text_to_speech_endpoint(request: Request, text: str, language: str = "en"):
     """
     Convert text to speech
     """
+    enforce_quota(request, {"tts_chars": len(text)})
     try:
-        audio_bytes = voice_processor.text_to_speech(text, language)
+        audio_bytes = await run_in_threadpool(voice_processor.text_to_speech, text, language)
         audio_b64 = base64.b64encode(audio_bytes).decode('utf-8')
 
         return {
@@ -295,27 +660,33 @@ async def text_to_speech_endpoint(text: str, language: str = "en"):
 
 @app.post("/voice/speech-to-text")
 async def speech_to_text_endpoint(
+        request: Request,
         audio_file: UploadFile = File(...),
         language: str = Form("auto")
 ):
     """
     Convert speech to text
     """
+    enforce_quota(request, {"stt_seconds": 1})
     try:
         # Validate file type
         if not audio_file.content_type.startswith('audio/'):
             raise HTTPException(status_code=400, detail="Please upload an audio file")
 
-        # Read audio data
-        audio_data = await audio_file.read()
-
-        # Convert to WAV if needed
-        audio_data = voice_processor.convert_audio_format(audio_data, "wav")
+        # Read audio data in chunks, stopping at the size limit
+        try:
+            audio_data, audio_format = await read_upload(
+                audio_file, sniff=voice_processor.detect_format_from_bytes
+            )
+        except UploadTooLarge:
+            raise HTTPException(status_code=400, detail=f"Audio file too large. Please upload a file smaller than {UPLOAD_LIMIT_MB}MB.")
 
-        # Speech to text
-        transcribed_text, detected_language = voice_processor.speech_to_text(
+        # Speech to text (decodes and resamples to 16kHz WAV internally)
+        transcribed_text, detected_language = await run_in_threadpool(
+            voice_processor.speech_to_text,
             audio_data,
-            language
+            language,
+            audio_format
         )
 
         return {
@@ -324,6 +695,8 @@ async def speech_to_text_endpoint(
             "original_language": language
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Speech-to-text error: {str(e)}")
 
@@ -334,23 +707,24 @@ async def test_audio_endpoint(vq: VoiceQueryInput):
     Test endpoint to debug audio processing
     """
     try:
-        import base64
-
         # Decode base64 audio data
-        audio_bytes = base64.b64decode(vq.audio_data)
+        try:
+            audio_bytes = decode_base64_limited(vq.audio_data)
+        except UploadTooLarge:
+            raise HTTPException(status_code=400, detail=f"Audio file too large. Please upload a file smaller than {UPLOAD_LIMIT_MB}MB.")
 
         logger.info(f"Test: Received audio data: {len(audio_bytes)} bytes")
 
         # Validate audio format
-        if not voice_processor.validate_audio_format(audio_bytes):
+        if not await run_in_threadpool(voice_processor.validate_audio_format, audio_bytes):
             return {"error": "Invalid audio format"}
 
         # Convert to audio segment
-        audio_segment = voice_processor._convert_audio_to_segment(audio_bytes)
+        audio_segment = await run_in_threadpool(voice_processor._convert_audio_to_segment, audio_bytes)
         
         # Save debug file
         debug_file = "test_audio.wav"
-        audio_segment.export(debug_file, format='wav')
+        await run_in_threadpool(audio_segment.export, debug_file, format='wav')
         
         # Analyze audio properties
         audio_info = {
@@ -373,6 +747,8 @@ async def test_audio_endpoint(vq: VoiceQueryInput):
             "message": "Audio saved for inspection"
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Test audio error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Test audio error: {str(e)}")
@@ -1,98 +1,149 @@
-from typing import Dict
+from typing import Dict, List, Optional
+import re
 import requests
 from datetime import datetime
 
+from data.district_index import get_district_index, current_season, seasonal_conditions
+from tools.crop_engine import get_crop_engine, normalize_season, SEASONS, SEASON_ALIASES
 
-# Original function
-def get_crop_advice_logic(soil_type: str, rainfall: float, temperature: float) -> Dict:
-    if soil_type.lower() in ['loamy', 'sandy'] and 20 <= temperature <= 30:
-        if rainfall >= 300:
-            crop = "Rice"
+# Keys accepted in structured input, mapped to canonical names
+CONDITION_KEYS = {
+    "soil_type": "soil_type",
+    "soil": "soil_type",
+    "rainfall": "rainfall",
+    "rain": "rainfall",
+    "temperature": "temperature",
+    "temp": "temperature",
+    "season": "season",
+    "location": "location",
+    "district": "location",
+    "village": "location",
+    "place": "location",
+}
+
+
+def parse_conditions(input_str: str) -> Dict:
+    """
+    Parse "soil_type=loamy, rainfall=250, temperature=28" style input.
+    Tolerates ';' separators, ':' instead of '=', units like "250mm" and
+    malformed pairs (which are skipped rather than raising).
+    """
+    conditions = {}
+    for part in re.split(r"[,;\n]", input_str):
+        if "=" in part:
+            key, _, value = part.partition("=")
+        elif ":" in part:
+            key, _, value = part.partition(":")
         else:
-            crop = "Millets"
-    elif soil_type.lower() in ['clay', 'black']:
-        crop = "Cotton"
-    else:
-        crop = "Pulses"
+            continue
+
+        key = CONDITION_KEYS.get(key.strip().lower().replace(" ", "_"))
+        value = value.strip().strip("'\"")
+        if not key or not value:
+            continue
+
+        if key in ("rainfall", "temperature"):
+            number = re.search(r"-?\d+(?:\.\d+)?", value)
+            if number:
+                conditions[key] = float(number.group())
+        else:
+            conditions[key] = value
+
+    return conditions
+
+
+def _season_in_text(text: str) -> Optional[str]:
+    for word in re.findall(r"[a-z]+", text):
+        season = SEASON_ALIASES.get(word, word)
+        if season in SEASONS:
+            return season
+    return None
+
+
+def get_crop_advice_logic(soil_type: str, rainfall: float, temperature: float,
+                          season: Optional[str] = None) -> Dict:
+    ranked = get_crop_engine().recommend(soil_type, rainfall, temperature, season)
+    if not ranked:
+        return {
+            "recommended_crop": "Mixed Cropping (Pulses + Cereals)",
+            "reason": "No crop in the table is a strong match for these conditions, so a mixed crop spreads the risk",
+            "alternatives": []
+        }
 
     return {
-        "recommended_crop": crop,
-        "reason": f"Based on soil ({soil_type}), rainfall ({rainfall}mm), and temperature ({temperature}°C)"
+        "recommended_crop": ranked[0]["crop"],
+        "reason": f"{ranked[0]['reason']} (based on soil ({soil_type}), rainfall ({rainfall}mm), and temperature ({temperature}°C))",
+        "alternatives": ranked[1:]
     }
 
 
+def get_crop_advice_batch(plots: List[Dict], top_k: int = 3) -> List[List[Dict]]:
+    """
+    Rank crops for many plots or districts in one vectorized pass.
+    Each plot is a dict with soil_type, rainfall, temperature and optional season.
+    """
+    engine = get_crop_engine()
+    ranked = engine.recommend_batch(
+        [plot.get("soil_type") for plot in plots],
+        [float(plot.get("rainfall", 0)) for plot in plots],
+        [float(plot.get("temperature", 25)) for plot in plots],
+        [plot.get("season") for plot in plots],
+        top_k
+    )
+    return [[{"crop": crop, "score": score} for crop, score in row] for row in ranked]
+
+
 # LangChain-compatible wrapper
 def get_crop_advice(input_str: str) -> str:
     """
     Get crop advice based on location and conditions.
     Can handle queries like:
     - "what crop is suitable here to harvest"
-    - "crop advice for Mumbai"
+    - "crop advice for Mumbai" / "rabi crops for Guntur" / "గుంటూరు"
     - "soil_type=loamy, rainfall=250, temperature=28"
     """
     input_lower = input_str.lower().strip()
 
+    conditions = parse_conditions(input_str) if ("=" in input_str or ":" in input_str) else {}
+
+    # Resolve any district, town or village mentioned to its agro-climatic normals
+    index = get_district_index()
+    place = index.resolve(conditions["location"]) if conditions.get("location") else None
+    if place is None:
+        place = index.find_in_text(input_str)
+
+    if place:
+        try:
+            season = normalize_season(conditions.get("season")) or _season_in_text(input_lower) or current_season()
+            inputs = seasonal_conditions(place, season)
+            # Anything the user stated explicitly overrides the district normals
+            inputs.update({k: v for k, v in conditions.items() if k in ("soil_type", "rainfall", "temperature")})
+
+            advice = get_crop_advice_logic(inputs["soil_type"], inputs["rainfall"], inputs["temperature"], season)
+            location = place["name"] if place["kind"] == "district" else f"{place['name']} ({place['district']} district)"
+            return f"📍 **Location:** {location}, {place['state']}\n" \
+                   f"🗺️ **Agro-climatic zone:** {place['zone']}\n" \
+                   f"📅 **Season:** {season.title()}\n\n" + \
+                   format_crop_advice(advice, inputs["soil_type"], inputs["rainfall"], inputs["temperature"])
+
+        except Exception as e:
+            return f"❌ Error processing crop advice: {str(e)}"
+
     # Check if it's a general question without specific data
     if any(keyword in input_lower for keyword in ["what crop", "suitable crop", "harvest", "plant"]):
         if "here" in input_lower or "location" not in input_lower:
             return "🌱 To provide crop advice, I need to know your location (city, village, or district). Please tell me where you are located so I can check the weather and soil conditions for that area."
 
-    # Check if location is provided
-    if any(keyword in input_lower for keyword in
-           ["mumbai", "delhi", "bangalore", "chennai", "kolkata", "pune", "hyderabad", "ahmedabad"]):
-        # For now, provide general advice based on common conditions
-        return f"🌾 Based on typical conditions in {input_str}, here are some crop recommendations:\n\n" \
-               f"**Kharif Season (June-October):**\n" \
-               f"- Rice, Maize, Cotton, Sugarcane\n\n" \
-               f"**Rabi Season (November-March):**\n" \
-               f"- Wheat, Barley, Mustard, Peas\n\n" \
-               f"**Summer Season (March-June):**\n" \
-               f"- Vegetables, Pulses, Oilseeds\n\n" \
-               f"💡 For more specific advice, please provide:\n" \
-               f"- Current soil type\n" \
-               f"- Expected rainfall\n" \
-               f"- Temperature range\n" \
-               f"- Season you want to plant in"
-
     # Handle structured input (soil_type=loamy, rainfall=250, temperature=28)
-    if "=" in input_str:
+    if any(key in conditions for key in ("soil_type", "rainfall", "temperature")):
         try:
-            parts = dict(
-                part.strip().split("=")
-                for part in input_str.split(",")
-            )
-            soil = parts.get("soil_type", "unknown")
-            rain = float(parts.get("rainfall", 0))
-            temp = float(parts.get("temperature", 25))
-
-            # Enhanced crop recommendation logic
-            if soil.lower() in ['loamy', 'sandy'] and 20 <= temp <= 30:
-                if rain >= 300:
-                    crop = "Rice"
-                    reason = "High rainfall and moderate temperature are ideal for rice cultivation"
-                else:
-                    crop = "Millets"
-                    reason = "Moderate rainfall and temperature suitable for drought-resistant millets"
-            elif soil.lower() in ['clay', 'black']:
-                crop = "Cotton"
-                reason = "Clay soil retains moisture well, suitable for cotton"
-            elif temp > 30:
-                crop = "Pulses and Oilseeds"
-                reason = "High temperature conditions favor pulses and oilseeds"
-            else:
-                crop = "Mixed Cropping (Pulses + Cereals)"
-                reason = "Versatile conditions allow for mixed cropping"
-
-            return f"🌾 **Recommended Crop:** {crop}\n\n" \
-                   f"📊 **Analysis:**\n" \
-                   f"- Soil Type: {soil}\n" \
-                   f"- Rainfall: {rain}mm\n" \
-                   f"- Temperature: {temp}°C\n\n" \
-                   f"💡 **Reason:** {reason}\n\n" \
-                   f"🔍 **Additional Tips:**\n" \
-                   f"- Check local market prices before finalizing\n" \
-                   f"- Consider crop rotation for soil health\n" \
-                   f"- Consult local agricultural extension office"
+            soil = conditions.get("soil_type", "unknown")
+            rain = conditions.get("rainfall", 0.0)
+            temp = conditions.get("temperature", 25.0)
+            season = conditions.get("season")
+
+            advice = get_crop_advice_logic(soil, rain, temp, season)
+            return format_crop_advice(advice, soil, rain, temp)
 
         except Exception as e:
             return f"❌ Error processing crop advice: {str(e)}\n\nPlease provide information in format: soil_type=type, rainfall=amount, temperature=value"
@@ -104,3 +155,25 @@ def get_crop_advice(input_str: str) -> str:
            "3. **Soil type** (if known)\n" \
            "4. **Water availability**\n\n" \
            "Or ask me about weather for your location first!"
+
+
+def format_crop_advice(advice: Dict, soil: str, rain: float, temp: float) -> str:
+    """Markdown answer for a crop recommendation"""
+    response = f"🌾 **Recommended Crop:** {advice['recommended_crop']}\n\n" \
+               f"📊 **Analysis:**\n" \
+               f"- Soil Type: {soil}\n" \
+               f"- Rainfall: {rain}mm\n" \
+               f"- Temperature: {temp}°C\n\n" \
+               f"💡 **Reason:** {advice['reason']}\n\n"
+
+    if advice.get("alternatives"):
+        response += "🌱 **Other Suitable Crops:**\n"
+        for alternative in advice["alternatives"]:
+            response += f"- {alternative['crop']} (suitability {alternative['score']:.0%})\n"
+        response += "\n"
+
+    response += "🔍 **Additional Tips:**\n" \
+                "- Check local market prices before finalizing\n" \
+                "- Consider crop rotation for soil health\n" \
+                "- Consult local agricultural extension office"
+    return response
@@ -0,0 +1,181 @@
+# tools/crop_engine.py
+import csv
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+CROP_TABLE_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "crop_requirements.csv")
+
+SOIL_TYPES = ["alluvial", "black", "red", "laterite", "loamy", "sandy", "clay"]
+
+# Common names farmers and the agent use for the soil classes above
+SOIL_ALIASES = {
+    "black cotton": "black",
+    "regur": "black",
+    "sandy loam": "loamy",
+    "silt loam": "loamy",
+    "clay loam": "clay",
+    "clayey": "clay",
+    "sand": "sandy",
+    "loam": "loamy",
+    "red loam": "red",
+    "lateritic": "laterite",
+    "riverine": "alluvial",
+    "delta": "alluvial",
+}
+
+SEASONS = ["kharif", "rabi", "zaid"]
+SEASON_ALIASES = {
+    "monsoon": "kharif",
+    "rainy": "kharif",
+    "winter": "rabi",
+    "summer": "zaid",
+}
+
+# Soil factor when a crop is not suited to the soil, or the soil is unknown
+SOIL_MISMATCH_FACTOR = 0.25
+SOIL_UNKNOWN_FACTOR = 0.6
+
+# How much being off-centre within the optimal range lowers a score
+CENTRALITY_WEIGHT = 0.15
+
+
+def normalize_soil(soil: Optional[str]) -> Optional[str]:
+    """Map a free-text soil description to one of SOIL_TYPES (None if unknown)"""
+    if not soil:
+        return None
+    soil = soil.strip().lower().replace("_", " ")
+    soil = soil[:-5].strip() if soil.endswith(" soil") else soil
+    if soil in SOIL_TYPES:
+        return soil
+    if soil in SOIL_ALIASES:
+        return SOIL_ALIASES[soil]
+    for soil_type in SOIL_TYPES:
+        if soil_type in soil:
+            return soil_type
+    return None
+
+
+def normalize_season(season: Optional[str]) -> Optional[str]:
+    if not season:
+        return None
+    season = season.strip().lower()
+    season = SEASON_ALIASES.get(season, season)
+    return season if season in SEASONS else None
+
+
+def _trapezoid(values: np.ndarray, lo: np.ndarray, opt_lo: np.ndarray,
+               opt_hi: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """
+    Trapezoidal suitability: 1 inside the optimal range, falling linearly
+    to 0 at the absolute limits. values is (N, 1); ranges are (M,).
+    """
+    rising = (values - lo) / np.maximum(opt_lo - lo, 1e-6)
+    falling = (hi - values) / np.maximum(hi - opt_hi, 1e-6)
+    membership = np.clip(np.minimum(rising, falling), 0.0, 1.0)
+
+    # Slight preference for the centre of the optimal range, so crops that
+    # are all "in range" are still ranked by how comfortably they fit
+    centre = (opt_lo + opt_hi) / 2
+    offset = np.abs(values - centre) / np.maximum(hi - lo, 1e-6)
+    return membership * (1.0 - CENTRALITY_WEIGHT * np.minimum(offset * 2, 1.0))
+
+
+class CropSuitabilityEngine:
+    """
+    Ranks crops against soil, seasonal rainfall (mm) and mean temperature (°C).
+    Requirement ranges are loaded once from the crop table into NumPy arrays,
+    so every crop is scored for every plot in a single vectorized pass.
+    """
+
+    def __init__(self, table_path: str = CROP_TABLE_PATH):
+        with open(table_path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+
+        self.crops = [row["crop"] for row in rows]
+        self.reasons = [row["reason"] for row in rows]
+
+        def column(name: str) -> np.ndarray:
+            return np.array([float(row[name]) for row in rows], dtype=np.float32)
+
+        self.rain = tuple(column(c) for c in ("rain_min", "rain_opt_low", "rain_opt_high", "rain_max"))
+        self.temp = tuple(column(c) for c in ("temp_min", "temp_opt_low", "temp_opt_high", "temp_max"))
+
+        # Soil factor lookup: one row per soil type, plus a last row for unknown soil
+        self.soil_factors = np.full((len(SOIL_TYPES) + 1, len(rows)), SOIL_MISMATCH_FACTOR, dtype=np.float32)
+        self.soil_factors[-1, :] = SOIL_UNKNOWN_FACTOR
+        # Season mask: one row per season, plus a last row for "any season"
+        self.season_mask = np.zeros((len(SEASONS) + 1, len(rows)), dtype=bool)
+        self.season_mask[-1, :] = True
+
+        for j, row in enumerate(rows):
+            for soil in row["soils"].split("|"):
+                self.soil_factors[SOIL_TYPES.index(soil.strip()), j] = 1.0
+            for season in row["seasons"].split("|"):
+                season = season.strip()
+                if season in SEASONS:
+                    self.season_mask[SEASONS.index(season), j] = True
+                else:
+                    # annual/perennial crops are not tied to one season
+                    self.season_mask[:, j] = True
+
+    @staticmethod
+    def _category_index(values: Sequence[Optional[str]], normalize, categories: List[str]) -> np.ndarray:
+        """Row index per value; unknown values map to the extra last row"""
+        # Campaign batches repeat a handful of values, so normalize each distinct one once
+        lookup = {}
+        for value in set(values):
+            normalized = normalize(value)
+            lookup[value] = categories.index(normalized) if normalized in categories else len(categories)
+        return np.fromiter((lookup[v] for v in values), dtype=np.intp, count=len(values))
+
+    def score_batch(self, soils: Sequence[Optional[str]], rainfall: Sequence[float],
+                    temperature: Sequence[float], seasons: Optional[Sequence[Optional[str]]] = None) -> np.ndarray:
+        """
+        Score every crop for every plot.
+        Returns an (N plots, M crops) array of suitability scores in [0, 1].
+        """
+        rain = np.asarray(rainfall, dtype=np.float32).reshape(-1, 1)
+        temp = np.asarray(temperature, dtype=np.float32).reshape(-1, 1)
+
+        soil_idx = self._category_index(soils, normalize_soil, SOIL_TYPES)
+
+        scores = np.sqrt(_trapezoid(rain, *self.rain) * _trapezoid(temp, *self.temp))
+        scores *= self.soil_factors[soil_idx]
+
+        if seasons is not None:
+            season_idx = self._category_index(seasons, normalize_season, SEASONS)
+            scores *= self.season_mask[season_idx]
+
+        return scores
+
+    def recommend_batch(self, soils: Sequence[Optional[str]], rainfall: Sequence[float],
+                        temperature: Sequence[float], seasons: Optional[Sequence[Optional[str]]] = None,
+                        top_k: int = 3) -> List[List[Tuple[str, float]]]:
+        """Top-k (crop, score) pairs for every plot, best first"""
+        scores = self.score_batch(soils, rainfall, temperature, seasons)
+        top_k = min(top_k, scores.shape[1])
+        top = np.argsort(-scores, axis=1, kind="stable")[:, :top_k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        return [
+            [(self.crops[j], round(float(s), 3)) for j, s in zip(row_idx, row_scores) if s > 0]
+            for row_idx, row_scores in zip(top, top_scores)
+        ]
+
+    def recommend(self, soil: Optional[str], rainfall: float, temperature: float,
+                  season: Optional[str] = None, top_k: int = 3) -> List[Dict]:
+        """Ranked recommendations for a single plot, with reasons"""
+        ranked = self.recommend_batch([soil], [rainfall], [temperature],
+                                      [season] if season else None, top_k)[0]
+        return [
+            {"crop": crop, "score": score, "reason": self.reasons[self.crops.index(crop)]}
+            for crop, score in ranked
+        ]
+
+
+@lru_cache(maxsize=1)
+def get_crop_engine() -> CropSuitabilityEngine:
+    """Shared engine, loaded on first use"""
+    return CropSuitabilityEngine()
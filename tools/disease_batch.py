@@ -0,0 +1,135 @@
+# tools/disease_batch.py
+import asyncio
+import io
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Tuple
+
+from tools.disease_detector import DISEASES, analyze_plant_disease
+
+# Maximum images accepted in one batch (multipart files plus zip members)
+MAX_BATCH_IMAGES = int(os.getenv("MAX_BATCH_IMAGES", 50))
+
+# Size limit for a zip archive of images
+MAX_BATCH_ZIP_BYTES = int(os.getenv("MAX_BATCH_ZIP_BYTES", 50 * 1024 * 1024))
+
+# Worker threads used for image analysis (PIL/NumPy release the GIL for most of the work)
+BATCH_WORKERS = int(os.getenv("DISEASE_BATCH_WORKERS", min(8, os.cpu_count() or 2)))
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif", ".tif", ".tiff")
+
+_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="disease-batch")
+
+
+class BatchTooLarge(Exception):
+    """Raised when a batch has more images than MAX_BATCH_IMAGES."""
+
+
+def is_zip(data: bytes) -> bool:
+    return data[:4] == b"PK\x03\x04"
+
+
+def extract_zip_images(data: bytes, max_image_bytes: int, max_images: int = MAX_BATCH_IMAGES) -> List[Tuple[str, bytes]]:
+    """
+    Extract image members from a zip archive.
+    Members are checked against the declared size before decompressing and
+    read with a hard cap, so a zip bomb can't exceed max_image_bytes per image.
+    """
+    images = []
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            # Skip macOS resource forks and hidden files
+            base_name = os.path.basename(info.filename)
+            if base_name.startswith(".") or info.filename.startswith("__MACOSX/"):
+                continue
+            if len(images) >= max_images:
+                raise BatchTooLarge(f"Batch exceeds {max_images} images")
+            if info.file_size > max_image_bytes:
+                images.append((info.filename, b""))
+                continue
+            with archive.open(info) as member:
+                content = member.read(max_image_bytes + 1)
+            images.append((info.filename, content if len(content) <= max_image_bytes else b""))
+    return images
+
+
+def _analyze_image(index: int, filename: str, image_data: bytes) -> Dict:
+    """Run a single image through the disease detection engine"""
+    if not image_data:
+        return {
+            "type": "error",
+            "index": index,
+            "filename": filename,
+            "error": "Image is empty or exceeds the size limit"
+        }
+
+    result = analyze_plant_disease("", image_data)
+    if result.image_analysis.startswith("Image analysis failed"):
+        return {"type": "error", "index": index, "filename": filename, "error": result.image_analysis}
+
+    return {
+        "type": "result",
+        "index": index,
+        "filename": filename,
+        "image_analysis": result.image_analysis,
+        "diseases": result.disease_keys,
+        "solution": result.to_markdown()
+    }
+
+
+async def iter_batch_results(images: List[Tuple[str, bytes]]) -> AsyncIterator[Dict]:
+    """
+    Analyze images in parallel and yield each result as soon as it finishes,
+    followed by a field-level summary.
+    """
+    loop = asyncio.get_running_loop()
+    tasks = [
+        loop.run_in_executor(_executor, _analyze_image, index, filename, data)
+        for index, (filename, data) in enumerate(images)
+    ]
+
+    results = []
+    for next_done in asyncio.as_completed(tasks):
+        try:
+            result = await next_done
+        except Exception as e:
+            result = {"type": "error", "error": f"Error processing image: {str(e)}"}
+        results.append(result)
+        yield result
+
+    yield summarize_field(results, len(images))
+
+
+def summarize_field(results: List[Dict], total: int) -> Dict:
+    """Aggregate per-image results into disease prevalence counts"""
+    analyzed = [r for r in results if r.get("type") == "result"]
+    prevalence = {}
+    healthy = 0
+
+    for result in analyzed:
+        if not result["diseases"]:
+            healthy += 1
+        for disease_name in result["diseases"]:
+            prevalence[disease_name] = prevalence.get(disease_name, 0) + 1
+
+    ranked = sorted(prevalence.items(), key=lambda item: item[1], reverse=True)
+    return {
+        "type": "summary",
+        "total_images": total,
+        "analyzed": len(analyzed),
+        "failed": total - len(analyzed),
+        "no_disease_detected": healthy,
+        "prevalence": [
+            {
+                "disease": disease_name,
+                "display_name": disease_name.replace('_', ' ').title(),
+                "count": count,
+                "percent": round(100.0 * count / len(analyzed), 1) if analyzed else 0.0,
+                "pesticides": DISEASES[disease_name]["pesticides"]
+            }
+            for disease_name, count in ranked
+        ]
+    }
@@ -0,0 +1,202 @@
+# tools/disease_result.py
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from utils.translator import translate_cached, translate_to_local, pretranslate
+
+SAFETY_PRECAUTIONS = (
+    "Wear protective clothing and mask",
+    "Apply pesticides in calm weather",
+    "Keep children and pets away",
+    "Follow label instructions strictly",
+    "Store pesticides safely",
+)
+
+PREVENTION_TIPS = (
+    "Use disease-resistant varieties",
+    "Practice crop rotation",
+    "Maintain proper plant nutrition",
+    "Regular monitoring and early detection",
+)
+
+MORE_DETAILS_NEEDED = (
+    "Leaf color changes",
+    "Spots or marks on leaves",
+    "Any visible insects",
+    "Leaf texture changes",
+    "Plant wilting or drooping",
+)
+
+GENERAL_CARE_TIPS = (
+    "Ensure proper spacing between plants",
+    "Avoid overhead watering",
+    "Remove infected leaves",
+    "Maintain good air circulation",
+)
+
+# Section labels used by the renderers
+LABELS = (
+    "Disease Detection Results",
+    "Image Analysis",
+    "No specific disease detected.",
+    "Please provide more details about",
+    "General care tips",
+    "Detected Disease",
+    "Description",
+    "Recommended Pesticides",
+    "Application Method",
+    "Safety Precautions",
+    "Prevention Tips",
+    "For expert advice",
+    "Contact your local agricultural extension office",
+)
+
+
+@dataclass(frozen=True, slots=True)
+class DiseaseBlock:
+    key: str
+    name: str
+    description: str
+
+
+@dataclass(frozen=True, slots=True)
+class PesticideBlock:
+    products: Tuple[str, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class ApplicationBlock:
+    method: str
+
+
+@dataclass(frozen=True, slots=True)
+class SafetyBlock:
+    precautions: Tuple[str, ...] = SAFETY_PRECAUTIONS
+    prevention: Tuple[str, ...] = PREVENTION_TIPS
+
+
+@dataclass(frozen=True, slots=True)
+class DiseaseFinding:
+    disease: DiseaseBlock
+    pesticides: PesticideBlock
+    application: ApplicationBlock
+
+
+@dataclass(slots=True)
+class DiseaseResult:
+    """
+    Structured outcome of a disease detection.
+    Rendering is lazy: nothing is formatted or translated until a renderer is called.
+    Static blocks go through the per-language translation cache; only the
+    image analysis sentence is translated live.
+    """
+    image_analysis: str
+    has_image: bool
+    findings: Tuple[DiseaseFinding, ...]
+    safety: SafetyBlock = field(default_factory=SafetyBlock)
+
+    @property
+    def disease_keys(self) -> List[str]:
+        return [f.disease.key for f in self.findings]
+
+    def _image_analysis(self, lang: str) -> str:
+        return translate_to_local(self.image_analysis, lang) if lang != 'en' else self.image_analysis
+
+    def to_markdown(self, lang: str = "en") -> str:
+        t = lambda text: translate_cached(text, lang)
+        parts = []
+
+        if not self.findings:
+            parts.append(f"🔍 **{t('Disease Detection Results')}:**\n\n")
+            if self.has_image:
+                parts.append(f"📸 **{t('Image Analysis')}:** {self._image_analysis(lang)}\n\n")
+            parts.append(f"❌ **{t('No specific disease detected.')}**\n\n")
+            parts.append(f"💡 **{t('Please provide more details about')}:**\n")
+            parts.append("".join(f"- {t(item)}\n" for item in MORE_DETAILS_NEEDED))
+            parts.append(f"\n🌱 **{t('General care tips')}:**\n")
+            parts.append("\n".join(f"- {t(item)}" for item in GENERAL_CARE_TIPS))
+            return "".join(parts)
+
+        parts.append(f"🔬 **{t('Disease Detection Results')}:**\n\n")
+        if self.has_image:
+            parts.append(f"📸 **{t('Image Analysis')}:** {self._image_analysis(lang)}\n\n")
+
+        for finding in self.findings:
+            parts.append(f" **{t('Detected Disease')}:** {t(finding.disease.name)}\n")
+            parts.append(f" **{t('Description')}:** {t(finding.disease.description)}\n\n")
+            parts.append(f"💊 **{t('Recommended Pesticides')}:**\n")
+            # Product names and doses are kept as printed on the label
+            parts.append("".join(f"{i}. {p}\n" for i, p in enumerate(finding.pesticides.products, 1)))
+            parts.append(f"\n📋 **{t('Application Method')}:** {t(finding.application.method)}\n\n")
+
+        parts.append(f"⚠️ **{t('Safety Precautions')}:**\n")
+        parts.append("".join(f"- {t(item)}\n" for item in self.safety.precautions))
+        parts.append(f"\n🌿 **{t('Prevention Tips')}:**\n")
+        parts.append("".join(f"- {t(item)}\n" for item in self.safety.prevention))
+        parts.append(f"\n📞 **{t('For expert advice')}:** {t('Contact your local agricultural extension office')}")
+        return "".join(parts)
+
+    def to_dict(self, lang: str = "en") -> Dict:
+        t = lambda text: translate_cached(text, lang)
+        return {
+            "image_analysis": self._image_analysis(lang) if self.has_image else "",
+            "diseases": [
+                {
+                    "key": f.disease.key,
+                    "name": t(f.disease.name),
+                    "description": t(f.disease.description),
+                    "pesticides": list(f.pesticides.products),
+                    "application": t(f.application.method),
+                }
+                for f in self.findings
+            ],
+            "safety_precautions": [t(item) for item in self.safety.precautions] if self.findings else [],
+            "prevention_tips": [t(item) for item in self.safety.prevention] if self.findings else [],
+        }
+
+    def to_sms(self, lang: str = "en", max_length: int = 320) -> str:
+        """Compact plain-text form: disease name, first pesticide and spray interval"""
+        t = lambda text: translate_cached(text, lang)
+        if not self.findings:
+            text = f"{t('No specific disease detected.')} {t('Contact your local agricultural extension office')}"
+        else:
+            lines = [
+                f"{t(f.disease.name)}: {f.pesticides.products[0]}. {t(f.application.method)}"
+                for f in self.findings
+            ]
+            lines.append(t(self.safety.precautions[0]))
+            text = "\n".join(lines)
+
+        if len(text) > max_length:
+            text = text[:max_length - 1].rstrip() + "…"
+        return text
+
+
+def build_disease_result(image_analysis: str, disease_names: List[str], has_image: bool,
+                         diseases: Dict[str, Dict]) -> DiseaseResult:
+    """Assemble a DiseaseResult from detected disease keys and the disease table"""
+    return DiseaseResult(
+        image_analysis=image_analysis,
+        has_image=has_image,
+        findings=tuple(
+            DiseaseFinding(
+                disease=DiseaseBlock(
+                    key=name,
+                    name=name.replace('_', ' ').title(),
+                    description=diseases[name]["description"],
+                ),
+                pesticides=PesticideBlock(tuple(diseases[name]["pesticides"])),
+                application=ApplicationBlock(diseases[name]["application"]),
+            )
+            for name in disease_names
+        ),
+    )
+
+
+def pretranslate_static_blocks(lang: str, diseases: Dict[str, Dict]) -> int:
+    """Warm the translation cache with every static block for one language"""
+    texts = list(LABELS) + list(SAFETY_PRECAUTIONS) + list(PREVENTION_TIPS) \
+        + list(MORE_DETAILS_NEEDED) + list(GENERAL_CARE_TIPS)
+    for name, info in diseases.items():
+        texts.extend([name.replace('_', ' ').title(), info["description"], info["application"]])
+    return pretranslate(texts, lang)
@@ -1,54 +1,52 @@
 # tools/finance_info.py
-import asyncio
+from tools.policy_finder import format_scheme, format_faq
+from utils.retrieval import get_retrieval_index, answer_from_passages, MIN_CONFIDENCE
 
-import requests
-from langchain.tools import tool
+SYSTEM_PROMPT = "You are a helpful AI assistant specializing in Indian agriculture, financial schemes, and " \
+                "government policies. Provide precise, actionable, and up-to-date information. If exact " \
+                "real-time data or application deadlines are not known, advise the user where to find them " \
+                "(e.g., official government portals, local agriculture offices, banks)."
+ANSWER_INSTRUCTION = "Answer briefly with amounts and interest rates where known, and where to apply."
 
-import os
-import json  # To potentially parse structured JSON if Grok supports it
 
-# Configuration for Grok (assuming these are loaded from .env or config)
-GROK_API_KEY = os.getenv("GROQ_API_KEY")
-GROK_API_URL = "https://api.x.ai/v1/chat/completions"  # Confirm with Grok API docs
-GROK_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"  # Use the model suitable for detailed information
+def format_product(product: dict) -> str:
+    """Full details for one loan, subsidy or insurance product"""
+    response = f"🏦 **{product['name']}**\n\n"
+    fields = (("🏛️", "Offered by", "lender"), ("💰", "Amount", "amount"),
+              ("📈", "Interest / cost", "interest"), ("⏳", "Tenure", "tenure"))
+    for icon, label, key in fields:
+        if product.get(key):
+            response += f"{icon} **{label}:** {product[key]}\n"
+    if product.get("eligibility"):
+        response += f"👥 **Eligibility:** {'; '.join(product['eligibility'])}\n"
+    if product.get("documents"):
+        response += "📋 **Documents Required:**\n"
+        response += "".join(f"- {doc}\n" for doc in product["documents"])
+    if product.get("apply_at"):
+        response += f"🌐 **Apply at:** {product['apply_at']}\n"
+    return response.rstrip("\n")
 
 
-async def call_grok_api(prompt: str, temperature: float = 0.5, max_tokens: int = 1000) -> str:
-    print("data", prompt)
-    """Helper function to call the Grok API."""
-    if not GROK_API_KEY:
-        return "Error: Grok API key not configured."
-
-    headers = {
-        "Authorization": f"Bearer {GROK_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": GROK_MODEL,
-        "messages": [
-            {"role": "system",
-             "content": "You are a helpful AI assistant specializing in Indian agriculture, financial schemes, and government policies. Provide precise, actionable, and up-to-date information. If exact real-time data or application deadlines are not known, advise the user where to find them (e.g., official government portals, local agriculture offices, banks)."},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": temperature,
-        "max_tokens": max_tokens
-    }
-
-    try:
-        response = requests.post(GROK_API_URL, headers=headers, json=data)
-        response.raise_for_status()  # Raise an exception for HTTP errors (4xx or 5xx)
-        grok_response = response.json()
-        return grok_response["choices"][0]["message"]["content"]
-    except requests.exceptions.RequestException as e:
-        return f"Error connecting to Grok API: {e}. Please check your internet connection or API setup."
-    except KeyError:
-        return "Error: Could not parse Grok API response. Unexpected format."
-    except Exception as e:
-        return f"An unexpected error occurred while calling Grok: {e}"
+FORMATTERS = {"finance": format_product, "scheme": format_scheme, "faq": format_faq}
 
 
 def get_finance_info(query: str) -> str:
     """Get finance information for farmers"""
+    hits = get_retrieval_index().search(query, k=3, sources=("finance", "faq", "scheme"))
+    if hits and hits[0].confidence >= MIN_CONFIDENCE:
+        best = hits[0]
+        response = FORMATTERS[best.source](best.record)
+        related = [hit for hit in hits[1:] if hit.source != "faq" and hit.score >= best.score * 0.5]
+        if related:
+            response += "\n\n📌 **Also see:**\n"
+            response += "\n".join(f"- **{hit.record['name']}**" for hit in related)
+        return response
+
+    answer = answer_from_passages(query, hits, topic="loan, subsidy and scheme", system=SYSTEM_PROMPT, label="Finance",
+                                  instruction=ANSWER_INSTRUCTION)
+    if answer:
+        return answer
+
     query_lower = query.lower()
 
     if "loan" in query_lower:
@@ -0,0 +1,141 @@
+# tools/mandi_price.py
+import re
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from data.mandi_prices import get_price_store, get_mandi_prices, FALLBACK_PRICES, MandiPriceStore
+
+# Everyday names mapped to words that appear in Agmarknet commodity names
+COMMODITY_ALIASES = {
+    "rice": "paddy",
+    "dhan": "paddy",
+    "chana": "bengal gram",
+    "gram": "bengal gram",
+    "tur": "arhar",
+    "toor": "arhar",
+    "pigeon pea": "arhar",
+    "mirchi": "dry chillies",
+    "chilli": "dry chillies",
+    "chilly": "dry chillies",
+    "pyaz": "onion",
+    "aloo": "potato",
+    "kapas": "cotton",
+    "makka": "maize",
+    "corn": "maize",
+    "groundnut": "groundnut",
+    "moongfali": "groundnut",
+    "soyabean": "soyabean",
+    "soybean": "soyabean",
+}
+
+
+@lru_cache(maxsize=4)
+def _keyword_index(store: MandiPriceStore) -> Dict[str, str]:
+    """Lowercase keyword -> commodity name, from names like 'Paddy(Dhan)(Common)'"""
+    index = {}
+    for name in store.names["commodity"]:
+        for part in re.split(r"[()/,]", name.lower()):
+            part = part.strip()
+            if len(part) >= 3:
+                index.setdefault(part, name)
+    for alias, target in COMMODITY_ALIASES.items():
+        if target in index:
+            index.setdefault(alias, index[target])
+    return index
+
+
+def _words(text: str) -> Tuple[str, ...]:
+    return tuple(re.findall(r"\w+", text.lower()))
+
+
+class PhraseIndex:
+    """Whole-phrase lookup of names in free text via a dict of their word n-grams"""
+
+    def __init__(self, names):
+        self.phrases: Dict[Tuple[str, ...], str] = {}
+        for name in names:
+            if len(name.strip()) >= 3:
+                words = _words(name)
+                if words:
+                    self.phrases.setdefault(words, name)
+        self.max_words = max(map(len, self.phrases), default=0)
+
+    def find(self, words: Tuple[str, ...]) -> Optional[str]:
+        """Longest name whose words appear consecutively in the query"""
+        for n in range(min(self.max_words, len(words)), 0, -1):
+            found = [self.phrases[words[i:i + n]] for i in range(len(words) - n + 1)
+                     if words[i:i + n] in self.phrases]
+            if found:
+                return max(found, key=len)
+        return None
+
+
+@lru_cache(maxsize=4)
+def _phrase_indexes(store: MandiPriceStore) -> Dict[str, PhraseIndex]:
+    """Built once per store; a query then costs one dict lookup per n-gram"""
+    return {
+        "keyword": PhraseIndex(_keyword_index(store)),
+        "market": PhraseIndex(store.names["market"]),
+        "state": PhraseIndex(store.names["state"]),
+    }
+
+
+def parse_price_query(store: MandiPriceStore, query: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """Extract (commodity, market, state) from a free-text question"""
+    words = _words(query)
+    indexes = _phrase_indexes(store)
+    keyword = indexes["keyword"].find(words)
+    commodity = _keyword_index(store)[keyword] if keyword else None
+
+    market = indexes["market"].find(words)
+    state = None if market else indexes["state"].find(words)
+    return commodity, market, state
+
+
+def get_mandi_price_info(query: str) -> str:
+    """Latest mandi prices, 7/30-day ranges and trend for a commodity"""
+    store = get_price_store()
+    if store is None:
+        crop = next((c for c in FALLBACK_PRICES if c in query.lower()), None)
+        if not crop:
+            return "📊 Mandi price data is not loaded yet. Please check agmarknet.gov.in for current prices."
+        prices = get_mandi_prices(crop)
+        return f"📊 **{crop.title()} Mandi Price (indicative):** ₹{prices['min']} - ₹{prices['max']} per quintal\n\n" \
+               f"🌐 **Live prices:** agmarknet.gov.in"
+
+    commodity, market, state = parse_price_query(store, query)
+    if not commodity:
+        return "📊 Please tell me which crop or commodity you want mandi prices for (e.g. wheat, paddy, onion, cotton), " \
+               "and optionally the market or state."
+
+    latest = store.latest(commodity, market, state, limit=5)
+    if not latest:
+        where = market or state
+        return f"❌ No mandi prices found for {commodity}" + (f" in {where}." if where else ".")
+
+    where = f" in {market or state}" if (market or state) else ""
+    response = f"📊 **{commodity} Mandi Prices{where}** (₹/quintal)\n\n"
+
+    response += "🏪 **Latest:**\n"
+    for row in latest:
+        response += f"- {row['market']}, {row['state']} ({row['date']}): " \
+                    f"Modal ₹{row['modal_price']:.0f} (₹{row['min_price']:.0f} - ₹{row['max_price']:.0f})\n"
+
+    for days in (7, 30):
+        stats = store.window_stats(commodity, days, market, state)
+        if stats:
+            response += f"\n📅 **Last {days} days:** ₹{stats['min_price']:.0f} - ₹{stats['max_price']:.0f}, " \
+                        f"typical (modal) ₹{stats['modal_price']:.0f}"
+
+    trend = store.trend(commodity, 30, market, state)
+    if trend:
+        arrow = {"rising": "📈", "falling": "📉"}.get(trend["direction"], "➡️")
+        response += f"\n\n{arrow} **30-day trend:** {trend['direction']} ({trend['change_percent']:+.1f}%)"
+
+    response += "\n\n💡 Compare nearby mandis and transport cost before selling."
+    return response
+
+
+def get_mandi_price_tool(query: str) -> str:
+    """Tool wrapper for mandi prices"""
+    return get_mandi_price_info(query)
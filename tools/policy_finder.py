@@ -1,90 +1,87 @@
 # tools/policy_finder.py
-import os
-import requests
-from langchain.utilities import asyncio
-from langchain_core.tools import tool
+from data.gov_scheme_loader import get_scheme_catalogue, find_state
+from utils.retrieval import get_retrieval_index, answer_from_passages, MIN_CONFIDENCE
 
-# Groq Configuration
-GROK_API_KEY = os.getenv("GROQ_API_KEY")  # Replace default for testing
-GROK_API_URL = "https://api.x.ai/v1/chat/completions"
-GROK_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+SYSTEM_PROMPT = "You are an expert in Indian agricultural policies and government schemes. " \
+                "Answer in a helpful, direct, and updated manner. Be region-aware."
+ANSWER_INSTRUCTION = "Answer briefly and tell the farmer where to apply or verify."
 
 
-async def call_grok_api(prompt: str, temperature: float = 0.5, max_tokens: int = 1000) -> str:
-    """Helper to call Groq API."""
-    if not GROK_API_KEY:
-        return "Error: Groq API key not configured."
+def format_scheme(scheme: dict) -> str:
+    """Full details for one scheme"""
+    response = f"🌾 **{scheme['name']}**"
+    if scheme.get("aliases") and scheme["aliases"][0].lower() not in scheme["name"].lower():
+        response += f" ({scheme['aliases'][0]})"
+    response += "\n\n"
+    if scheme.get("benefit"):
+        response += f"💰 **Benefits:** {scheme['benefit']}\n"
+    if scheme.get("eligibility"):
+        response += f"👥 **Eligibility:** {'; '.join(scheme['eligibility'])}\n"
+    if scheme.get("level") == "state":
+        response += f"📍 **State:** {', '.join(scheme.get('states', []))}\n"
+    if scheme.get("documents"):
+        response += "📋 **Documents Required:**\n"
+        response += "".join(f"- {doc}\n" for doc in scheme["documents"])
+    if scheme.get("apply_at"):
+        response += f"🌐 **Apply at:** {scheme['apply_at']}\n"
+    if scheme.get("helpline"):
+        response += f"📞 **Helpline:** {scheme['helpline']}\n"
+    return response.rstrip("\n")
 
-    headers = {
-        "Authorization": f"Bearer {GROK_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": GROK_MODEL,
-        "messages": [
-            {"role": "system",
-             "content": "You are an expert in Indian agricultural policies and government schemes. Answer in a helpful, direct, and updated manner. Be region-aware."},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": temperature,
-        "max_tokens": max_tokens
-    }
 
-    try:
-        response = requests.post(GROK_API_URL, headers=headers, json=data)
-        response.raise_for_status()
-        grok_response = response.json()
-        return grok_response["choices"][0]["message"]["content"]
-    except requests.exceptions.RequestException as e:
-        return f"Error connecting to Grok API: {e}"
-    except KeyError:
-        return "Error: Grok API returned an unexpected response."
-    except Exception as e:
-        return f"Unexpected error: {e}"
+def format_faq(faq: dict) -> str:
+    return f"❓ **{faq['question']}**\n\n{faq['answer']}"
 
 
 def get_policy(query: str) -> str:
     """Get government policy information for farmers"""
-    query_lower = query.lower()
+    hits = get_retrieval_index().search(query, k=3, sources=("faq", "scheme"))
+    confident = bool(hits) and hits[0].confidence >= MIN_CONFIDENCE
+    if confident and hits[0].source == "faq":
+        return format_faq(hits[0].record)
 
-    if "pm-kisan" in query_lower or "kisan" in query_lower:
-        return "🌾 **PM-KISAN Scheme:**\n\n" \
-               "💰 **Benefits:** ₹6,000 per year in 3 installments\n" \
-               "👥 **Eligibility:** Small and marginal farmers\n" \
-               "📋 **Documents Required:**\n" \
-               "- Aadhaar card\n" \
-               "- Land records\n" \
-               "- Bank account details\n" \
-               "🌐 **Apply at:** pmkisan.gov.in\n" \
-               "📞 **Helpline:** 155261"
+    catalogue = get_scheme_catalogue()
+    state = find_state(query)
+    results = catalogue.search(query, state=state, limit=4)
 
-    elif "insurance" in query_lower or "fasal bima" in query_lower:
-        return "️ **PM Fasal Bima Yojana:**\n\n" \
-               "📊 **Coverage:** Natural calamities, pests, diseases\n" \
-               " **Premium:** 1.5-5% of sum insured\n" \
-               " **Crops Covered:** Food grains, oilseeds, commercial crops\n" \
-               "📋 **Apply at:** pmfby.gov.in or nearest bank\n" \
-               "📅 **Deadline:** Varies by crop and season"
+    # Only weak matches: let the LLM answer from the retrieved passages
+    if not confident:
+        answer = answer_from_passages(query, hits, topic="scheme", system=SYSTEM_PROMPT, label="Policy",
+                                      instruction=ANSWER_INSTRUCTION)
+        if answer:
+            return answer
 
-    elif "organic" in query_lower:
-        return "🌱 **Organic Farming Schemes:**\n\n" \
-               "💰 **PMKSY:** 25% subsidy on organic inputs\n" \
-               " **PKVY:** Paramparagat Krishi Vikas Yojana\n" \
-               "📋 **Apply at:** State agricultural department\n" \
-               "🌐 **More info:** organic.gov.in"
+    if results:
+        best_score, best = results[0]
+        response = format_scheme(best)
+        # Only list other schemes that are reasonably close to the best match
+        others = [scheme for score, scheme in results[1:] if score >= best_score * 0.3]
+        if others:
+            response += "\n\n📌 **Related schemes:**\n"
+            for scheme in others:
+                response += f"- **{scheme['name']}:** {scheme.get('benefit', '')}\n"
+        return response.rstrip("\n")
 
-    else:
-        return "🏛️ **Government Agricultural Schemes:**\n\n" \
-               "1. **PM-KISAN:** Direct income support\n" \
-               "2. **PM Fasal Bima Yojana:** Crop insurance\n" \
-               "3. **PMKSY:** Irrigation and water management\n" \
-               "4. **PKVY:** Organic farming promotion\n" \
-               "5. **State-specific schemes:** Check your state's agricultural portal\n\n" \
-               "💡 **Ask me about specific schemes:**\n" \
-               "- PM-KISAN\n" \
-               "- Crop insurance\n" \
-               "- Organic farming\n" \
-               "- Irrigation schemes"
+    if state:
+        state_schemes = catalogue.for_state(state)
+        if state_schemes:
+            response = f"🏛️ **{state} Agricultural Schemes:**\n\n"
+            for i, scheme in enumerate(state_schemes, 1):
+                response += f"{i}. **{scheme['name']}:** {scheme.get('benefit', '')}\n"
+            response += "\n💡 Also check central schemes like PM-KISAN and PM Fasal Bima Yojana."
+            return response
+
+    return "🏛️ **Government Agricultural Schemes:**\n\n" \
+           "1. **PM-KISAN:** Direct income support\n" \
+           "2. **PM Fasal Bima Yojana:** Crop insurance\n" \
+           "3. **PMKSY:** Irrigation and water management\n" \
+           "4. **PKVY:** Organic farming promotion\n" \
+           "5. **State-specific schemes:** Check your state's agricultural portal\n\n" \
+           "💡 **Ask me about specific schemes:**\n" \
+           "- PM-KISAN\n" \
+           "- Crop insurance\n" \
+           "- Organic farming\n" \
+           "- Irrigation schemes"
 
 
 def get_policy_info_tool(query: str) -> str:
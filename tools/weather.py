@@ -1,8 +1,112 @@
 # app/agents/tools/weather.py
 import os
+import threading
+import time
 
 import requests
 from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from utils.shared_store import get_shared_store
+from utils.upstream_health import upstream_available
+from utils.resilience import get_upstream, UpstreamUnavailable
+
+WEATHER_API_URL = os.getenv("WEATHER_API_URL", "https://api.weatherapi.com/v1/forecast.json")
+WEATHER_TIMEOUT = float(os.getenv("WEATHER_TIMEOUT", 8))
+# Forecasts older than this are not served when the API is unreachable (3-day forecasts)
+WEATHER_CACHE_MAX_AGE = float(os.getenv("WEATHER_CACHE_MAX_AGE", 72 * 3600))
+
+# Last good forecast per location: (fetched at, forecastday list)
+_forecast_cache: Dict[str, Tuple[float, List[Dict]]] = {}
+_forecast_cache_lock = threading.Lock()
+
+
+def _cache_key(location: str) -> str:
+    return " ".join(location.lower().split())
+
+
+def _remember_forecast(location: str, forecast_days: List[Dict]):
+    entry = (time.time(), forecast_days)
+    with _forecast_cache_lock:
+        _forecast_cache[_cache_key(location)] = entry
+    store = get_shared_store()
+    if store is not None:
+        store.set(f"weather:{_cache_key(location)}", list(entry), ttl=WEATHER_CACHE_MAX_AGE)
+
+
+def _cached_forecast(location: str) -> Optional[Tuple[float, List[Dict]]]:
+    key = _cache_key(location)
+    entry = _forecast_cache.get(key)
+    store = get_shared_store()
+    if entry is None and store is not None:
+        stored = store.get(f"weather:{key}")
+        entry = tuple(stored) if stored else None
+    if entry is None or time.time() - entry[0] > WEATHER_CACHE_MAX_AGE:
+        return None
+    return entry
+
+
+def _format_forecast(location: str, forecast_days: List[Dict]) -> str:
+    result = f"🌦️ Weather Forecast for {location}:\n"
+    for day in forecast_days:
+        date = day["date"]
+        condition = day["day"]["condition"]["text"]
+        min_temp = day["day"]["mintemp_c"]
+        max_temp = day["day"]["maxtemp_c"]
+        rain_chance = day["day"]["daily_chance_of_rain"]
+
+        result += (
+            f"\n📅 {date}:\n"
+            f" - Condition: {condition}\n"
+            f" - Temp: {min_temp}°C to {max_temp}°C\n"
+            f" - 🌧️ Rain chance: {rain_chance}%\n"
+        )
+    return result
+
+
+def offline_weather(location: str) -> str:
+    """Weather without the API: the last cached forecast, else the district's seasonal normals"""
+    cached = _cached_forecast(location)
+    if cached:
+        fetched_at, forecast_days = cached
+        today = datetime.now().strftime("%Y-%m-%d")
+        upcoming = [day for day in forecast_days if day["date"] >= today]
+        if upcoming:
+            hours = int((time.time() - fetched_at) // 3600)
+            return _format_forecast(location, upcoming) + \
+                f"\n⚠️ Live weather is unavailable; this forecast was fetched {hours} hour(s) ago."
+
+    try:
+        from data.district_index import get_district_index, current_season, seasonal_conditions
+        place = get_district_index().resolve(location) or get_district_index().find_in_text(location)
+    except Exception:
+        place = None
+    if place:
+        season = current_season()
+        normals = seasonal_conditions(place, season)
+        return f"🌦️ Typical {season.title()} conditions for {place['name']} ({place['state']}):\n" \
+               f" - Seasonal rainfall: about {normals['rainfall']:.0f} mm\n" \
+               f" - Average temperature: about {normals['temperature']:.0f}°C\n" \
+               "\n⚠️ Live weather is unavailable right now, so these are long-term averages, not a forecast."
+    return f"⚠️ Live weather for {location} is unavailable right now. Please try again later."
+
+
+def _fetch_forecast(location: str) -> Dict:
+    # Public API (you may replace with OpenWeatherMap or IMD APIs)
+    response = requests.get(
+        WEATHER_API_URL,
+        params={
+            "key": os.getenv("WEATHER_API_KEY"),
+            "q": location,
+            "days": 3,
+            "aqi": "no",
+            "alerts": "no"
+        },
+        timeout=WEATHER_TIMEOUT
+    )
+    if response.status_code >= 500:
+        raise requests.HTTPError(f"HTTP {response.status_code}", response=response)
+    return response.json()
 
 
 def get_weather_forecast(location: str) -> str:
@@ -10,43 +114,22 @@ def get_weather_forecast(location: str) -> str:
     if not location or location.strip() == "":
         return "❌ Please provide a location (city, village, or district) to get weather information."
 
+    if not upstream_available("weather"):
+        return offline_weather(location)
+
     try:
-        # Public API (you may replace with OpenWeatherMap or IMD APIs)
-        WEATHER_API_URL = "https://api.weatherapi.com/v1/forecast.json"
-        API_KEY = os.getenv("WEATHER_API_KEY")
-
-        response = requests.get(
-            WEATHER_API_URL,
-            params={
-                "key": API_KEY,
-                "q": location,
-                "days": 3,
-                "aqi": "no",
-                "alerts": "no"
-            }
-        )
-        data = response.json()
+        # A forecast GET is safe to repeat, so slow calls are hedged
+        data = get_upstream("weather").call(_fetch_forecast, location, hedge=True,
+                                            failures=(requests.RequestException,))
         if "error" in data:
             return f"❌ Weather API Error: {data['error']['message']}. Please check the location name."
 
         forecast_data = data["forecast"]["forecastday"]
-        result = f"🌦️ Weather Forecast for {location}:\n"
-
-        for day in forecast_data:
-            date = day["date"]
-            condition = day["day"]["condition"]["text"]
-            min_temp = day["day"]["mintemp_c"]
-            max_temp = day["day"]["maxtemp_c"]
-            rain_chance = day["day"]["daily_chance_of_rain"]
-
-            result += (
-                f"\n📅 {date}:\n"
-                f" - Condition: {condition}\n"
-                f" - Temp: {min_temp}°C to {max_temp}°C\n"
-                f" - 🌧️ Rain chance: {rain_chance}%\n"
-            )
-
-        return result
+        _remember_forecast(location, forecast_data)
+        return _format_forecast(location, forecast_data)
 
+    except (requests.RequestException, UpstreamUnavailable):
+        # Open circuit, timeout or network error: answer from the cache at once
+        return offline_weather(location)
     except Exception as e:
         return f"❌ Failed to get weather for {location}: {str(e)}"
@@ -0,0 +1,256 @@
+# utils/admission.py
+"""
+Admission control for the expensive endpoints.
+
+Each class of expensive route (voice, image, disease batch, agent) has its own concurrency
+limit and a short FIFO wait queue. Requests beyond both are refused at once
+with 429 and a Retry-After estimate instead of piling onto the threadpool and
+ffmpeg. Routes not listed here (health, stats, prices) are never queued, so
+they stay fast while the expensive classes are saturated.
+
+Limits adapt to observed latency (AIMD): while the latency EWMA of a class is
+under its target the limit creeps up towards its maximum; when it goes over,
+the limit is cut by a fraction. When latency is far over target, new arrivals
+that would have to queue are shed with 503.
+
+Limits and queues are per worker process: with WEB_CONCURRENCY workers a class
+admits up to that many times its ADMISSION_*_CONCURRENCY on the host, so size
+the per-class values for one worker. GET /admission/stats reports host totals.
+"""
+import asyncio
+import json
+import math
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from utils.tracing import counter
+from utils.worker_stats import register_stats, collect_stats
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") != "0"
+
+
+@dataclass(slots=True)
+class RouteClass:
+    name: str
+    prefixes: Tuple[str, ...]
+    max_concurrency: int
+    max_queue: int
+    # Latency the class should stay under; drives the adaptive limit and queue timeout
+    target_seconds: float
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+ROUTE_CLASSES = [
+    RouteClass("voice", ("/voice/ask", "/voice/speech-to-text", "/voice/text-to-speech", "/voice/test-audio"),
+               _env_int("ADMISSION_VOICE_CONCURRENCY", 4), _env_int("ADMISSION_VOICE_QUEUE", 8), 10.0),
+    # Before "image": a batch runs up to MAX_BATCH_IMAGES analyses on its own worker pool, so its
+    # latency would drag the single-image limit down (and single images would starve batches)
+    RouteClass("disease_batch", ("/detect-disease/batch",),
+               _env_int("ADMISSION_BATCH_CONCURRENCY", 2), _env_int("ADMISSION_BATCH_QUEUE", 4), 60.0),
+    RouteClass("image", ("/detect-disease",),
+               _env_int("ADMISSION_IMAGE_CONCURRENCY", 4), _env_int("ADMISSION_IMAGE_QUEUE", 8), 5.0),
+    RouteClass("agent", ("/ask", "/crop-advice/batch"),
+               _env_int("ADMISSION_AGENT_CONCURRENCY", 16), _env_int("ADMISSION_AGENT_QUEUE", 32), 8.0),
+]
+
+# Multiplicative decrease applied when latency is over target, at most once per this many seconds
+DECREASE_FACTOR = 0.75
+DECREASE_INTERVAL = 2.0
+EWMA_ALPHA = 0.2
+# Shed instead of queueing when latency is this many times the target
+SHED_FACTOR = 2.0
+
+ADMISSIONS = counter("agri_admission_total", "Admission decisions by route class", ("route_class", "outcome"))
+
+
+class Rejected(Exception):
+    def __init__(self, status: int, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.status, self.retry_after, self.reason = status, retry_after, reason
+
+
+class AdaptiveLimiter:
+    """Concurrency limit with a bounded FIFO queue; only used from the event loop"""
+
+    def __init__(self, route_class: RouteClass):
+        self.route_class = route_class
+        self.limit = float(route_class.max_concurrency)
+        self.in_flight = 0
+        self.latency_ewma: Optional[float] = None
+        self._waiters: deque = deque()
+        self._last_decrease = 0.0
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0, "timed_out": 0, "shed": 0}
+
+    def _count(self, outcome: str):
+        self.stats[outcome] += 1
+        ADMISSIONS.inc(self.route_class.name, outcome)
+
+    def retry_after(self) -> int:
+        """Rough seconds until a slot frees up for a new arrival"""
+        latency = self.latency_ewma or self.route_class.target_seconds
+        return max(1, math.ceil(latency * (len(self._waiters) + 1) / max(self.limit, 1.0)))
+
+    def _has_slot(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    async def acquire(self):
+        if self._has_slot() and not self._waiters:
+            self.in_flight += 1
+            self._count("admitted")
+            return
+
+        target = self.route_class.target_seconds
+        if self.latency_ewma is not None and self.latency_ewma > SHED_FACTOR * target:
+            self._count("shed")
+            raise Rejected(503, self.retry_after(), "Service overloaded, please retry shortly")
+        if len(self._waiters) >= self.route_class.max_queue:
+            self._count("rejected")
+            raise Rejected(429, self.retry_after(), "Too many requests in progress, please retry shortly")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._count("queued")
+        try:
+            # Waiting longer than the target would make the response late anyway
+            await asyncio.wait_for(asyncio.shield(waiter), target)
+        except BaseException as e:
+            # Timed out, or the client went away
+            if waiter.done() and not waiter.cancelled():
+                # Granted a slot just as the wait ended; hand it on
+                self._release_slot()
+            else:
+                waiter.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                self._count("timed_out")
+                raise Rejected(503, self.retry_after(), "Service busy, please retry shortly") from None
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        self._count("admitted")
+
+    def _release_slot(self):
+        self.in_flight -= 1
+        while self._waiters and self._has_slot():
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def release(self, latency: float):
+        self._observe(latency)
+        self._release_slot()
+
+    def _observe(self, latency: float):
+        self.latency_ewma = latency if self.latency_ewma is None else \
+            EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.latency_ewma
+        now = time.monotonic()
+        if self.latency_ewma > self.route_class.target_seconds:
+            if now - self._last_decrease >= DECREASE_INTERVAL:
+                self.limit = max(1.0, self.limit * DECREASE_FACTOR)
+                self._last_decrease = now
+        else:
+            self.limit = min(float(self.route_class.max_concurrency), self.limit + 1.0 / self.limit)
+
+    def snapshot(self) -> Dict:
+        return {
+            "limit": int(self.limit),
+            "max_concurrency": self.route_class.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "max_queue": self.route_class.max_queue,
+            "latency_ewma_seconds": round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            "target_seconds": self.route_class.target_seconds,
+            **self.stats,
+        }
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying the per-class limiters by path prefix"""
+
+    def __init__(self, app, limiters: Optional[Dict[str, "AdaptiveLimiter"]] = None):
+        self.app = app
+        self.limiters = LIMITERS if limiters is None else limiters
+
+    def _limiter_for(self, path: str) -> Optional[AdaptiveLimiter]:
+        # First match wins, so more specific prefixes are listed first
+        for limiter in self.limiters.values():
+            if path.startswith(limiter.route_class.prefixes):
+                return limiter
+        return None
+
+    async def __call__(self, scope, receive, send):
+        limiter = self._limiter_for(scope["path"]) if scope["type"] == "http" and ADMISSION_ENABLED else None
+        if limiter is None or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await limiter.acquire()
+        except Rejected as e:
+            await _reject(send, e)
+            return
+
+        # Time the handler from the end of the request body: a slow mobile upload is not load on
+        # the server and must not push the latency EWMA up. Bodyless requests are timed from here.
+        started = [time.perf_counter()]
+
+        async def receive_and_time():
+            message = await receive()
+            if message["type"] == "http.request" and not message.get("more_body", False):
+                started[0] = time.perf_counter()
+            return message
+
+        try:
+            await self.app(scope, receive_and_time, send)
+        finally:
+            limiter.release(time.perf_counter() - started[0])
+
+
+async def _reject(send, rejection: Rejected):
+    body = json.dumps({"detail": rejection.reason, "retry_after": rejection.retry_after}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": rejection.status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"retry-after", str(rejection.retry_after).encode("latin-1")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+LIMITERS: Dict[str, AdaptiveLimiter] = {rc.name: AdaptiveLimiter(rc) for rc in ROUTE_CLASSES}
+
+
+def _admission_state() -> Dict:
+    return {name: limiter.snapshot() for name, limiter in LIMITERS.items()}
+
+
+register_stats("admission", _admission_state)
+
+
+def admission_snapshot() -> Dict:
+    """
+    Per class: limits, queue lengths and counts summed over the live workers (each
+    worker admits up to its own limit), and the highest latency EWMA of any worker.
+    """
+    states = list(collect_stats("admission").values())
+    classes = {}
+    for name, limiter in LIMITERS.items():
+        per_worker = [state[name] for state in states if name in state]
+        summed = ("limit", "max_concurrency", "in_flight", "waiting", "max_queue", *limiter.stats)
+        ewmas = [s["latency_ewma_seconds"] for s in per_worker if s["latency_ewma_seconds"] is not None]
+        classes[name] = {
+            **{field: sum(s[field] for s in per_worker) for field in summed},
+            "latency_ewma_seconds": max(ewmas) if ewmas else None,
+            "target_seconds": limiter.route_class.target_seconds,
+        }
+    return {"enabled": ADMISSION_ENABLED, "workers": len(states), "classes": classes}
@@ -0,0 +1,248 @@
+# utils/conversation_log.py
+"""
+Append-only conversation log.
+
+Each turn is one compact record (sequence number, float timestamp, interned
+language code, English query and response) appended as a JSON array line to
+the current segment file under CONVERSATION_LOG_DIR. Segments roll over at
+CONVERSATION_SEGMENT_BYTES. Only the byte offset of each record and a short
+tail of recent records are kept in memory; older pages are read from disk.
+
+In multi-worker mode (a shared store is configured) the log is a table in the
+shared SQLite database instead, so all workers append to one sequence.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from array import array
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+from utils.shared_store import get_shared_store, SharedStore
+
+CONVERSATION_LOG_DIR = os.getenv(
+    "CONVERSATION_LOG_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "conversation_log"),
+)
+CONVERSATION_SEGMENT_BYTES = int(os.getenv("CONVERSATION_SEGMENT_BYTES", 8 * 1024 * 1024))
+# Recent records kept in memory for the common "latest page" reads
+CONVERSATION_TAIL = int(os.getenv("CONVERSATION_TAIL", 200))
+
+MAX_PAGE_SIZE = 200
+
+
+@dataclass(slots=True)
+class ConversationRecord:
+    seq: int
+    ts: float
+    lang: str
+    query: str
+    response: str
+    answered_by: str = "agent"
+    error: Optional[str] = None
+
+    def to_line(self) -> str:
+        return json.dumps([self.seq, self.ts, self.lang, self.query, self.response, self.answered_by, self.error],
+                          ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def from_line(cls, line: str) -> "ConversationRecord":
+        seq, ts, lang, query, response, answered_by, error = json.loads(line)
+        return cls(seq, ts, sys.intern(lang), query, response, sys.intern(answered_by), error)
+
+    def to_dict(self) -> Dict:
+        record = {
+            "seq": self.seq,
+            "timestamp": self.ts,
+            "language": self.lang,
+            "query": self.query,
+            "response": self.response,
+            "answered_by": self.answered_by,
+        }
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+class ConversationLog:
+    def __init__(self, directory: str = CONVERSATION_LOG_DIR, segment_bytes: int = CONVERSATION_SEGMENT_BYTES):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self._lock = threading.Lock()
+        # Per record: index into self._segments and byte offset within that segment
+        self._segment_of = array("I")
+        self._offsets = array("Q")
+        self._segments: List[str] = []
+        self._tail: deque = deque(maxlen=CONVERSATION_TAIL)
+        self._file = None
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        """
+        Rebuild the offset index from existing segment files. A crash mid-write
+        can leave a partial last line; it is cut off so the next append starts on
+        a fresh line, and lines that do not parse are skipped. A record's seq is its
+        position among the readable records, so skipping a line renumbers the ones after it.
+        """
+        names = sorted(n for n in os.listdir(self.directory) if n.startswith("segment-") and n.endswith(".jsonl"))
+        for name in names:
+            path = os.path.join(self.directory, name)
+            segment = len(self._segments)
+            self._segments.append(path)
+            with open(path, "rb") as f:
+                offset = 0
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        record = ConversationRecord.from_line(line.decode("utf-8"))
+                    except (ValueError, TypeError):
+                        print(f"Skipping corrupt conversation log line at {path}:{offset}")
+                    else:
+                        record.seq = len(self._offsets)
+                        self._segment_of.append(segment)
+                        self._offsets.append(offset)
+                        self._tail.append(record)
+                    offset += len(line)
+            if offset < os.path.getsize(path):
+                print(f"Truncating partial conversation log line at {path}:{offset}")
+                os.truncate(path, offset)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def _writer(self):
+        if self._file is not None and self._file.tell() < self.segment_bytes:
+            return self._file
+        if self._file is not None:
+            self._file.close()
+        if not self._segments or os.path.getsize(self._segments[-1]) >= self.segment_bytes:
+            self._segments.append(os.path.join(self.directory, f"segment-{len(self):012d}.jsonl"))
+        self._file = open(self._segments[-1], "ab")
+        return self._file
+
+    def append(self, query: str, response: str, lang: str = "en", answered_by: str = "agent",
+               error: Optional[str] = None) -> ConversationRecord:
+        with self._lock:
+            record = ConversationRecord(len(self), time.time(), sys.intern(lang or "en"), query, response,
+                                        sys.intern(answered_by), error)
+            f = self._writer()
+            self._segment_of.append(len(self._segments) - 1)
+            self._offsets.append(f.tell())
+            f.write(record.to_line().encode("utf-8") + b"\n")
+            f.flush()
+            self._tail.append(record)
+            return record
+
+    def _read(self, start: int, stop: int) -> List[ConversationRecord]:
+        """Records with seq in [start, stop), from the in-memory tail or the segment files"""
+        tail_start = len(self) - len(self._tail)
+        if start >= tail_start:
+            return list(self._tail)[start - tail_start:stop - tail_start]
+
+        records, handles = [], {}
+        try:
+            for seq in range(start, stop):
+                segment = self._segment_of[seq]
+                if segment not in handles:
+                    handles[segment] = open(self._segments[segment], "rb")
+                f = handles[segment]
+                f.seek(self._offsets[seq])
+                record = ConversationRecord.from_line(f.readline().decode("utf-8"))
+                # The stored seq is stale if an earlier corrupt line was skipped on load
+                record.seq = seq
+                records.append(record)
+        finally:
+            for f in handles.values():
+                f.close()
+        return records
+
+    def page(self, offset: int = 0, limit: int = 20) -> Tuple[List[ConversationRecord], int]:
+        """Records [offset, offset + limit) in order, and the total count"""
+        limit = max(0, min(limit, MAX_PAGE_SIZE))
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            total = len(self)
+            start = max(0, min(offset, total))
+            return self._read(start, min(start + limit, total)), total
+
+    def since(self, cursor: int = -1, limit: int = 20) -> Tuple[List[ConversationRecord], int]:
+        """Records after the cursor (a seq) and the cursor to pass next time"""
+        records, _ = self.page(cursor + 1, limit)
+        return records, records[-1].seq if records else cursor
+
+    def clear(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            for path in self._segments:
+                os.unlink(path)
+            self._segments.clear()
+            self._segment_of = array("I")
+            self._offsets = array("Q")
+            self._tail.clear()
+
+
+class SharedConversationLog:
+    """The same interface over a table in the shared store, for multi-worker mode"""
+
+    def __init__(self, store: SharedStore):
+        self.store = store
+        store.connection().execute(
+            "CREATE TABLE IF NOT EXISTS conversation_log (seq INTEGER PRIMARY KEY, ts REAL, lang TEXT, "
+            "query TEXT, response TEXT, answered_by TEXT, error TEXT)"
+        )
+
+    def __len__(self) -> int:
+        return self.store.connection().execute("SELECT COUNT(*) FROM conversation_log").fetchone()[0]
+
+    def append(self, query: str, response: str, lang: str = "en", answered_by: str = "agent",
+               error: Optional[str] = None) -> ConversationRecord:
+        ts = time.time()
+        # One statement, so concurrent workers cannot take the same seq
+        cursor = self.store.connection().execute(
+            "INSERT INTO conversation_log SELECT COALESCE(MAX(seq) + 1, 0), ?, ?, ?, ?, ?, ? FROM conversation_log",
+            (ts, lang or "en", query, response, answered_by, error),
+        )
+        return ConversationRecord(cursor.lastrowid, ts, sys.intern(lang or "en"), query, response,
+                                  sys.intern(answered_by), error)
+
+    def _select(self, where: str, args: Tuple, limit: int) -> List[ConversationRecord]:
+        rows = self.store.connection().execute(
+            f"SELECT seq, ts, lang, query, response, answered_by, error FROM conversation_log "
+            f"WHERE {where} ORDER BY seq LIMIT ?", (*args, limit)
+        ).fetchall()
+        return [ConversationRecord(*row) for row in rows]
+
+    def page(self, offset: int = 0, limit: int = 20) -> Tuple[List[ConversationRecord], int]:
+        limit = max(0, min(limit, MAX_PAGE_SIZE))
+        total = len(self)
+        # seq is dense from 0, so the offset is a seq
+        return self._select("seq >= ?", (max(0, offset),), limit), total
+
+    def since(self, cursor: int = -1, limit: int = 20) -> Tuple[List[ConversationRecord], int]:
+        records = self._select("seq > ?", (cursor,), max(0, min(limit, MAX_PAGE_SIZE)))
+        return records, records[-1].seq if records else cursor
+
+    def clear(self):
+        self.store.connection().execute("DELETE FROM conversation_log")
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_conversation_log() -> Union[ConversationLog, SharedConversationLog]:
+    global _log
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                store = get_shared_store()
+                _log = SharedConversationLog(store) if store else ConversationLog()
+    return _log
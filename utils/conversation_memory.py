@@ -0,0 +1,198 @@
+# utils/conversation_memory.py
+"""
+Token-budgeted conversation memory for the agent.
+
+Recent exchanges are kept verbatim (with tool-output decoration stripped) as
+long as they fit the budget. Older exchanges are folded into a rolling summary:
+immediately with a cheap extractive summary, so prompts never exceed the
+budget, and then rewritten by the LLM on a background thread, off the
+request path.
+
+With a store_key and a shared store (multi-worker mode) the state is read from
+the store before each use and each change is a read-modify-write inside one
+store transaction, so every worker continues the same conversation and no
+worker's turn overwrites another's.
+"""
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, List, Optional
+
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain_core.messages import BaseMessage, SystemMessage, get_buffer_string, messages_from_dict, \
+    messages_to_dict
+from pydantic import PrivateAttr
+
+from utils.llm_client import get_llm_client, LLMError
+from utils.shared_store import get_shared_store
+
+MEMORY_TOKEN_LIMIT = int(os.getenv("MEMORY_TOKEN_LIMIT", 1200))
+SUMMARY_TOKEN_LIMIT = int(os.getenv("MEMORY_SUMMARY_TOKENS", 250))
+# Longest a single stored message may be; tool outputs are often much longer
+MESSAGE_TOKEN_LIMIT = int(os.getenv("MEMORY_MESSAGE_TOKENS", 200))
+
+_summarizer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-summarizer")
+
+
+def _new_summarizer():
+    # Executor threads are not copied into forked workers
+    global _summarizer
+    _summarizer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-summarizer")
+
+
+os.register_at_fork(after_in_child=_new_summarizer)
+
+_EMOJI = re.compile("[\U0001F300-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF\uFE0F\u200D]")
+_MARKUP = re.compile(r"\*\*|__|`")
+# Footer lines that tools append to every answer
+_FOOTER_PREFIXES = ("💡", "🌐", "📞", "⚠️", "🛡️")
+
+SUMMARY_PROMPT = """Update the running summary of a conversation between a farmer and an agricultural advisor.
+Keep facts needed later: the farmer's location, crops, soil, season, problems, and what was already advised.
+Use at most {words} words.
+
+Current summary:
+{summary}
+
+New lines of conversation:
+{lines}
+
+Updated summary:"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English text)"""
+    return len(text) // 4 + 1
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * 4
+    return text if len(text) <= max_chars else text[:max_chars].rsplit(" ", 1)[0] + " …"
+
+
+def strip_boilerplate(text: str, max_tokens: int = MESSAGE_TOKEN_LIMIT) -> str:
+    """Drop emoji, markdown emphasis and standard tool footers, then cap the length"""
+    lines = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith(_FOOTER_PREFIXES):
+            continue
+        lines.append(" ".join(_MARKUP.sub("", _EMOJI.sub("", stripped)).split()))
+    return _truncate("\n".join(line for line in lines if line), max_tokens)
+
+
+def extractive_summary(summary: str, messages: List[BaseMessage], max_tokens: int = SUMMARY_TOKEN_LIMIT) -> str:
+    """First sentence of each message appended to the summary, keeping the newest text"""
+    parts = [summary] if summary else []
+    for message in messages:
+        first = re.split(r"(?<=[.?!])\s|\n", message.content.strip(), maxsplit=1)[0]
+        parts.append(f"{'Farmer' if message.type == 'human' else 'Advisor'}: {first}")
+    text = " ".join(parts)
+    max_chars = max_tokens * 4
+    return text if len(text) <= max_chars else "… " + text[-max_chars:].split(" ", 1)[-1]
+
+
+class TokenBudgetMemory(BaseChatMemory):
+    """Recent messages plus a rolling summary, together kept under max_token_limit"""
+
+    memory_key: str = "chat_history"
+    max_token_limit: int = MEMORY_TOKEN_LIMIT
+    summary: str = ""
+    # Key of this conversation's state in the shared store, if any
+    store_key: Optional[str] = None
+
+    _lock: threading.RLock = PrivateAttr(default_factory=threading.RLock)
+    _generation: int = PrivateAttr(default=0)
+
+    def _pull(self):
+        """Adopt the shared state (another worker may have moved the conversation on)"""
+        store = get_shared_store() if self.store_key else None
+        state = store.get(self.store_key) if store else None
+        if state is not None:
+            self.chat_memory.messages = messages_from_dict(state["messages"])
+            self.summary = state["summary"]
+            self._generation = state["generation"]
+
+    def _push(self):
+        store = get_shared_store() if self.store_key else None
+        if store:
+            store.set(self.store_key, {
+                "messages": messages_to_dict(self.chat_memory.messages),
+                "summary": self.summary,
+                "generation": self._generation,
+            })
+
+    @contextmanager
+    def _update(self):
+        """Pull, let the block change the state, push; atomic across workers sharing the store"""
+        store = get_shared_store() if self.store_key else None
+        with self._lock, (store.transaction() if store else nullcontext()):
+            self._pull()
+            yield
+            self._push()
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self._pull()
+            messages = list(self.chat_memory.messages)
+            if self.summary:
+                messages.insert(0, SystemMessage(content=f"Summary of the earlier conversation: {self.summary}"))
+        if self.return_messages:
+            return {self.memory_key: messages}
+        return {self.memory_key: get_buffer_string(messages)}
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        input_str, output_str = self._get_input_output(inputs, outputs)
+        with self._update():
+            self.chat_memory.add_user_message(_truncate(input_str, MESSAGE_TOKEN_LIMIT))
+            self.chat_memory.add_ai_message(strip_boilerplate(output_str))
+            self._enforce_budget()
+
+    def _enforce_budget(self):
+        """Move the oldest exchanges into the summary until the buffer fits"""
+        budget = self.max_token_limit - SUMMARY_TOKEN_LIMIT
+        messages = self.chat_memory.messages
+        evicted = []
+        # Always keep the latest exchange verbatim
+        while len(messages) > 2 and sum(estimate_tokens(m.content) for m in messages) > budget:
+            evicted.extend(messages[:2])
+            del messages[:2]
+        if not evicted:
+            return
+
+        previous_summary = self.summary
+        self.summary = extractive_summary(previous_summary, evicted)
+        self._generation += 1
+        _summarizer.submit(self._summarize, previous_summary, evicted, self._generation)
+
+    def _summarize(self, previous_summary: str, evicted: List[BaseMessage], generation: int):
+        """Background: replace the extractive summary with an LLM-written one"""
+        client = get_llm_client()
+        if not client.configured:
+            return
+        prompt = SUMMARY_PROMPT.format(
+            words=SUMMARY_TOKEN_LIMIT * 3 // 4,
+            summary=previous_summary or "(empty)",
+            lines=get_buffer_string(evicted, human_prefix="Farmer", ai_prefix="Advisor"),
+        )
+        try:
+            summary = client.complete(prompt, temperature=0, max_tokens=SUMMARY_TOKEN_LIMIT)
+        except LLMError as e:
+            print(f"Conversation summary failed, keeping extractive summary: {e}")
+            return
+        with self._update():
+            # A later eviction already folded this summary into a newer one
+            if generation == self._generation:
+                self.summary = _truncate(summary.strip(), SUMMARY_TOKEN_LIMIT)
+
+    def clear(self) -> None:
+        with self._update():
+            super().clear()
+            self.summary = ""
+            self._generation += 1
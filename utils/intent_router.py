@@ -0,0 +1,281 @@
+# utils/intent_router.py
+"""
+Fast-path intent router in front of the agent.
+
+A keyword trie (longest phrase match) and a small softmax-regression model
+trained on data/intent_seeds.json classify the English query. When both agree
+on a single tool intent with high confidence, the tool is called directly and
+the ReAct agent (several LLM round trips) is skipped. A sample of routable
+queries is still sent to the agent so router accuracy can be measured against
+the tool the agent actually chose.
+"""
+import json
+import os
+import random
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from utils.worker_stats import register_stats, collect_stats
+
+SEEDS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "intent_seeds.json")
+
+ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "1") != "0"
+ROUTER_MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", 0.7))
+# Share of routable queries still answered by the agent, to measure accuracy
+ROUTER_SHADOW_RATE = float(os.getenv("ROUTER_SHADOW_RATE", 0.05))
+
+# Longer queries usually ask several things at once; leave them to the agent
+MAX_ROUTED_WORDS = 25
+
+OTHER = "other"
+
+KEYWORDS = {
+    "weather": ["weather", "rain", "raining", "rainfall forecast", "forecast", "temperature today", "humidity",
+                "monsoon", "wind", "hot", "cold wave"],
+    "crop": ["crop", "crops", "which crop", "what crop", "sow", "grow", "cultivate", "soil_type", "what to plant",
+             "kharif crops", "rabi crops"],
+    "finance": ["loan", "loans", "credit", "kisan credit card", "kcc", "subsidy", "interest rate", "bank",
+                "crop loan", "finance", "repay", "collateral"],
+    "policy": ["scheme", "schemes", "yojana", "pm kisan", "pm-kisan", "pmkisan", "crop insurance", "insurance",
+               "fasal bima", "pmfby", "pension", "soil health card", "e-nam", "enam", "rythu bharosa", "kalia",
+               "pmksy", "government"],
+    "price": ["price", "prices", "mandi", "market rate", "market price", "rate of", "bhav", "selling price",
+              "sell"],
+}
+
+# Follow-ups that depend on the conversation so far
+_CONTEXT_WORDS = {"that", "those", "same", "above", "previous", "again", "earlier", "it's", "also"}
+
+# Agent tool names mapped to intents, for labelling agent runs
+TOOL_INTENTS = {
+    "WeatherTool": "weather",
+    "CropAdvisoryTool": "crop",
+    "FinanceTool": "finance",
+    "PolicyTool": "policy",
+    "MandiPriceTool": "price",
+}
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9_'-]+", text.lower())
+
+
+def _features(words: List[str]) -> List[str]:
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class KeywordTrie:
+    def __init__(self, keywords: Dict[str, List[str]]):
+        self.root: Dict = {}
+        for intent, phrases in keywords.items():
+            for phrase in phrases:
+                node = self.root
+                for word in _words(phrase):
+                    node = node.setdefault(word, {})
+                node["$"] = intent
+
+    def match(self, words: List[str]) -> Set[str]:
+        """Intents of the longest phrases found, scanning left to right"""
+        intents, i = set(), 0
+        while i < len(words):
+            node, j, found = self.root, i, None
+            while j < len(words) and words[j] in node:
+                node = node[words[j]]
+                j += 1
+                if "$" in node:
+                    found = (node["$"], j)
+            if found:
+                intents.add(found[0])
+                i = found[1]
+            else:
+                i += 1
+        return intents
+
+
+class SoftmaxClassifier:
+    """Multinomial logistic regression over word and bigram counts"""
+
+    def __init__(self, examples: Dict[str, List[str]], epochs: int = 400, lr: float = 0.5, l2: float = 1e-3):
+        self.labels = sorted(examples)
+        self.vocab: Dict[str, int] = {}
+        rows, targets = [], []
+        for label, phrases in examples.items():
+            for phrase in phrases:
+                features = _features(_words(phrase))
+                for feature in features:
+                    self.vocab.setdefault(feature, len(self.vocab))
+                rows.append(features)
+                targets.append(self.labels.index(label))
+
+        x = np.stack([self._vectorize(features) for features in rows])
+        y = np.eye(len(self.labels), dtype=np.float32)[targets]
+        self.weights = np.zeros((len(self.vocab), len(self.labels)), dtype=np.float32)
+        self.bias = np.zeros(len(self.labels), dtype=np.float32)
+        for _ in range(epochs):
+            probs = self._softmax(x @ self.weights + self.bias)
+            grad = (probs - y) / len(x)
+            self.weights -= lr * (x.T @ grad + l2 * self.weights)
+            self.bias -= lr * grad.sum(axis=0)
+
+    def _vectorize(self, features: List[str]) -> np.ndarray:
+        vector = np.zeros(len(self.vocab), dtype=np.float32)
+        for feature in features:
+            index = self.vocab.get(feature)
+            if index is not None:
+                vector[index] += 1.0
+        return vector
+
+    @staticmethod
+    def _softmax(z: np.ndarray) -> np.ndarray:
+        z = z - z.max(axis=-1, keepdims=True)
+        e = np.exp(z)
+        return e / e.sum(axis=-1, keepdims=True)
+
+    def predict(self, words: List[str]) -> Tuple[str, float]:
+        probs = self._softmax(self._vectorize(_features(words)) @ self.weights + self.bias)
+        best = int(np.argmax(probs))
+        return self.labels[best], float(probs[best])
+
+
+def extract_location(query: str) -> Optional[str]:
+    """Place named in the query, from the district index or a trailing 'in <place>'"""
+    try:
+        from data.district_index import get_district_index
+        place = get_district_index().find_in_text(query)
+        if place:
+            return place["name"]
+    except Exception:
+        pass
+    match = re.search(r"\b(?:in|at|for|of)\s+([A-Za-z][A-Za-z .'-]{2,40}?)"
+                      r"(?:\s+(?:today|tomorrow|this week|now|district|village))?\s*[?.!]*$", query, re.IGNORECASE)
+    return match.group(1).strip() if match else None
+
+
+# Tool argument for each routed intent (None means the agent must ask for more)
+ARGUMENT_EXTRACTORS = {"weather": extract_location}
+
+
+@dataclass(slots=True)
+class RouteDecision:
+    intent: str
+    confidence: float
+    keyword_intents: Set[str]
+    argument: Optional[str] = None
+    routed: bool = False
+    shadow: bool = False
+
+
+class IntentRouter:
+    def __init__(self, seeds_path: str = SEEDS_PATH):
+        with open(seeds_path, encoding="utf-8") as f:
+            seeds = json.load(f)
+        self.trie = KeywordTrie(KEYWORDS)
+        self.model = SoftmaxClassifier(seeds)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def decide(self, query: str) -> RouteDecision:
+        words = _words(query)
+        intent, confidence = self.model.predict(words)
+        keyword_intents = self.trie.match(words)
+        decision = RouteDecision(intent, confidence, keyword_intents)
+
+        if intent == OTHER or confidence < ROUTER_MIN_CONFIDENCE or keyword_intents != {intent}:
+            return decision
+        if len(words) > MAX_ROUTED_WORDS or set(words) & _CONTEXT_WORDS:
+            return decision
+
+        extractor = ARGUMENT_EXTRACTORS.get(intent)
+        decision.argument = extractor(query) if extractor else query
+        if decision.argument is None:
+            return decision
+
+        decision.routed = True
+        if random.random() < ROUTER_SHADOW_RATE:
+            decision.routed, decision.shadow = False, True
+        return decision
+
+    # ---------- metrics ----------
+
+    def _intent_stats(self, intent: str) -> Dict[str, float]:
+        return self._stats.setdefault(intent, {
+            "routed": 0, "tool_seconds": 0.0, "agent_runs": 0, "agent_seconds": 0.0,
+            "labelled": 0, "correct": 0, "shadow": 0, "shadow_correct": 0,
+        })
+
+    def record_routed(self, decision: RouteDecision, seconds: float):
+        with self._lock:
+            stats = self._intent_stats(decision.intent)
+            stats["routed"] += 1
+            stats["tool_seconds"] += seconds
+
+    def record_agent(self, decision: RouteDecision, tools_used: List[str], seconds: float):
+        """Label an agent run with the intent of the tool it used and score the router's prediction"""
+        used = {TOOL_INTENTS.get(name, OTHER) for name in tools_used}
+        actual = used.pop() if len(used) == 1 else OTHER
+        correct = int(actual == decision.intent)
+        with self._lock:
+            stats = self._intent_stats(actual)
+            stats["agent_runs"] += 1
+            stats["agent_seconds"] += seconds
+            predicted = self._intent_stats(decision.intent)
+            predicted["labelled"] += 1
+            predicted["correct"] += correct
+            if decision.shadow:
+                predicted["shadow"] += 1
+                predicted["shadow_correct"] += correct
+
+    def state(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {intent: dict(stats) for intent, stats in self._stats.items()}
+
+    def snapshot(self) -> Dict:
+        """Per-intent report from the counts of all live workers"""
+        totals: Dict[str, Dict[str, float]] = {}
+        states = collect_stats("intent_router")
+        for state in states.values():
+            for intent, stats in state.items():
+                total = totals.setdefault(intent, dict.fromkeys(stats, 0))
+                for name, value in stats.items():
+                    total[name] += value
+
+        report = {}
+        for intent, stats in totals.items():
+            tool_avg = stats["tool_seconds"] / stats["routed"] if stats["routed"] else None
+            agent_avg = stats["agent_seconds"] / stats["agent_runs"] if stats["agent_runs"] else None
+            saved = None
+            if tool_avg is not None and agent_avg is not None:
+                saved = round(max(agent_avg - tool_avg, 0.0) * stats["routed"], 2)
+            report[intent] = {
+                "routed": int(stats["routed"]),
+                "agent_runs": int(stats["agent_runs"]),
+                "avg_tool_ms": round(tool_avg * 1000, 1) if tool_avg is not None else None,
+                "avg_agent_ms": round(agent_avg * 1000, 1) if agent_avg is not None else None,
+                "latency_saved_seconds": saved,
+                "accuracy": round(stats["correct"] / stats["labelled"], 3) if stats["labelled"] else None,
+                "shadow_accuracy": round(stats["shadow_correct"] / stats["shadow"], 3) if stats["shadow"] else None,
+            }
+        return {"enabled": ROUTER_ENABLED, "min_confidence": ROUTER_MIN_CONFIDENCE, "workers": len(states),
+                "intents": report}
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_intent_router() -> IntentRouter:
+    """Shared router, trained on first use"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = IntentRouter()
+    return _router
+
+
+# Nothing to report until the router has been trained
+register_stats("intent_router", lambda: _router.state() if _router is not None else None)
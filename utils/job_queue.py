@@ -0,0 +1,324 @@
+# utils/job_queue.py
+"""
+Persistent background jobs for the slow upload endpoints.
+
+POST /voice/ask-file?async=1 and POST /detect-disease?async=1 store the
+upload as a job and answer 202 with its id at once; GET /jobs/{id}?wait=N
+polls (or long-polls) for the result. Jobs live in a SQLite file (WAL mode),
+so they survive client disconnects and server restarts, and every worker
+process of a multi-worker deployment can claim them.
+
+A pool of asyncio workers per process claims jobs with a lease that it
+renews while the job runs. A job whose lease runs out (its process died) is
+claimed again by another worker. Failed jobs are retried with exponential
+backoff up to JOB_MAX_ATTEMPTS; raise JobFailed for errors a retry cannot fix.
+Finished jobs, and their results, are deleted after JOB_RESULT_TTL.
+
+    JOB_QUEUE_PATH       SQLite file (default data/jobs.sqlite)
+    JOB_WORKERS          concurrent jobs per process (default 2)
+    JOB_MAX_ATTEMPTS     runs before a job is marked failed (default 3)
+    JOB_LEASE_SECONDS    lease length; renewed every third of it (default 60)
+    JOB_RETRY_BACKOFF    delay before the first retry, doubled per attempt (default 2)
+    JOB_RESULT_TTL       seconds finished jobs are kept (default 3600)
+    JOB_MAX_WAIT         longest accepted ?wait= in seconds (default 60)
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from utils.tracing import counter, histogram
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join(DATA_DIR, "jobs.sqlite"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 60))
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", 2))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", 3600))
+JOB_MAX_WAIT = float(os.getenv("JOB_MAX_WAIT", 60))
+# Idle workers and long-polls check the table this often (other processes cannot wake them)
+JOB_POLL_INTERVAL = 0.5
+PURGE_INTERVAL = 60
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+FINISHED = (DONE, FAILED)
+
+JOBS = counter("agri_jobs_total", "Background job events (submitted, done, retried, failed, recovered)",
+               ("kind", "event"))
+JOB_DURATION = histogram("agri_job_duration_seconds", "Background job run time", ("kind",))
+JOB_QUEUE_WAIT = histogram("agri_job_queue_wait_seconds", "Time from submission to a worker starting the job",
+                           ("kind",))
+
+Handler = Callable[[Dict, bytes], Awaitable[Dict]]
+
+
+class JobFailed(Exception):
+    """A job error that retrying cannot fix (e.g. an unreadable upload)"""
+
+
+class JobQueue:
+    def __init__(self, path: str = JOB_QUEUE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._inherited = []
+        self._handlers: Dict[str, Handler] = {}
+        self._workers: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._last_purge = 0.0
+        conn = self.connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, params TEXT NOT NULL, payload BLOB,"
+            " attempts INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, updated_at REAL NOT NULL,"
+            " run_after REAL NOT NULL, lease_until REAL, result TEXT, error TEXT, expires_at REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_after)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_expires ON jobs (expires_at)")
+
+    def connection(self) -> sqlite3.Connection:
+        """Connection for this thread in this process (SQLite handles must not cross a fork)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            if conn is not None:
+                # Never close a handle inherited from the parent: closing it would drop
+                # this process's POSIX locks on the database file
+                self._inherited.append(conn)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    # ---------- storage (blocking; called from threads) ----------
+
+    def submit(self, kind: str, params: Dict, payload: bytes = b"") -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self.connection().execute(
+            "INSERT INTO jobs (id, kind, status, params, payload, created_at, updated_at, run_after)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, QUEUED, json.dumps(params, ensure_ascii=False), payload, now, now, now),
+        )
+        JOBS.inc(kind, "submitted")
+        return job_id
+
+    def claim(self) -> Optional[Dict]:
+        """
+        Lease the oldest runnable job: queued and due, or running with an expired
+        lease (its worker died). Jobs out of attempts are marked failed instead.
+        """
+        conn = self.connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            while True:
+                row = conn.execute(
+                    "SELECT id, kind, status, params, payload, attempts, created_at FROM jobs"
+                    " WHERE (status = ? AND run_after <= ?) OR (status = ? AND lease_until < ?)"
+                    " ORDER BY run_after LIMIT 1",
+                    (QUEUED, now, RUNNING, now),
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                job_id, kind, status, params, payload, attempts, created_at = row
+                if status == RUNNING:
+                    JOBS.inc(kind, "recovered")
+                    if attempts >= JOB_MAX_ATTEMPTS:
+                        self._finish(conn, job_id, FAILED, error="worker lost while running the job")
+                        JOBS.inc(kind, "failed")
+                        continue
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ?, updated_at = ?"
+                    " WHERE id = ?",
+                    (RUNNING, now + JOB_LEASE_SECONDS, now, job_id),
+                )
+                conn.execute("COMMIT")
+                return {"id": job_id, "kind": kind, "params": json.loads(params), "payload": payload or b"",
+                        "attempt": attempts + 1, "created_at": created_at}
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def renew(self, job_id: str):
+        now = time.time()
+        self.connection().execute(
+            "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (now + JOB_LEASE_SECONDS, now, job_id, RUNNING),
+        )
+
+    def _finish(self, conn: sqlite3.Connection, job_id: str, status: str, result: Any = None,
+                error: Optional[str] = None):
+        now = time.time()
+        # The upload is no longer needed once the job is finished
+        conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, payload = NULL, lease_until = NULL,"
+            " updated_at = ?, expires_at = ? WHERE id = ?",
+            (status, json.dumps(result, ensure_ascii=False) if result is not None else None, error,
+             now, now + JOB_RESULT_TTL, job_id),
+        )
+
+    def complete(self, job_id: str, result: Dict):
+        self._finish(self.connection(), job_id, DONE, result=result)
+
+    def fail(self, job_id: str, attempt: int, error: str, retry: bool = True) -> bool:
+        """Schedule a retry with backoff, or mark the job failed; True if it will be retried"""
+        if retry and attempt < JOB_MAX_ATTEMPTS:
+            now = time.time()
+            self.connection().execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_until = NULL, updated_at = ?, run_after = ?"
+                " WHERE id = ?",
+                (QUEUED, error, now, now + JOB_RETRY_BACKOFF * 2 ** (attempt - 1), job_id),
+            )
+            return True
+        self._finish(self.connection(), job_id, FAILED, error=error)
+        return False
+
+    def release(self, job_id: str):
+        """Put a job interrupted by shutdown back in the queue without using up an attempt"""
+        now = time.time()
+        self.connection().execute(
+            "UPDATE jobs SET status = ?, attempts = attempts - 1, lease_until = NULL, updated_at = ?,"
+            " run_after = ? WHERE id = ? AND status = ?",
+            (QUEUED, now, now, job_id, RUNNING),
+        )
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self.connection().execute(
+            "SELECT kind, status, attempts, created_at, updated_at, result, error, expires_at FROM jobs"
+            " WHERE id = ?", (job_id,),
+        ).fetchone()
+        if row is None or (row[7] is not None and row[7] <= time.time()):
+            return None
+        kind, status, attempts, created_at, updated_at, result, error, expires_at = row
+        job = {"job_id": job_id, "kind": kind, "status": status, "attempts": attempts,
+               "created_at": created_at, "updated_at": updated_at}
+        if result is not None:
+            job["result"] = json.loads(result)
+        if error is not None:
+            job["error"] = error
+        if expires_at is not None:
+            job["expires_at"] = expires_at
+        return job
+
+    def purge(self) -> int:
+        cursor = self.connection().execute(
+            "DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+        )
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        rows = self.connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    # ---------- workers (event loop) ----------
+
+    def register(self, kind: str, handler: Handler):
+        """handler(params, payload) -> JSON-serialisable result"""
+        self._handlers[kind] = handler
+
+    async def enqueue(self, kind: str, params: Dict, payload: bytes = b"") -> str:
+        job_id = await run_in_threadpool(self.submit, kind, params, payload)
+        if self._wake is not None:
+            self._wake.set()
+        return job_id
+
+    async def wait_for(self, job_id: str, wait: float = 0) -> Optional[Dict]:
+        """The job's state, after waiting up to `wait` seconds for it to finish"""
+        deadline = time.monotonic() + min(max(wait, 0.0), JOB_MAX_WAIT)
+        while True:
+            job = await run_in_threadpool(self.get, job_id)
+            if job is None or job["status"] in FINISHED or time.monotonic() >= deadline:
+                return job
+            await asyncio.sleep(min(JOB_POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+
+    def start(self, workers: int = JOB_WORKERS):
+        """Start the worker tasks on the running event loop"""
+        if self._workers:
+            return
+        self._wake = asyncio.Event()
+        self._workers = [asyncio.create_task(self._work(), name=f"job-worker-{i}") for i in range(workers)]
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _work(self):
+        while True:
+            try:
+                if time.time() - self._last_purge > PURGE_INTERVAL:
+                    self._last_purge = time.time()
+                    await run_in_threadpool(self.purge)
+                job = await run_in_threadpool(self.claim)
+            except sqlite3.Error as e:
+                print(f"Job queue error: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), JOB_POLL_INTERVAL)
+                    self._wake.clear()
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: Dict):
+        job_id, kind, attempt = job["id"], job["kind"], job["attempt"]
+        handler = self._handlers.get(kind)
+        if handler is None:
+            await run_in_threadpool(self.fail, job_id, attempt, f"no handler for job kind {kind!r}", False)
+            JOBS.inc(kind, "failed")
+            return
+
+        JOB_QUEUE_WAIT.observe(max(0.0, time.time() - job["created_at"]), kind)
+        started = time.perf_counter()
+        task = asyncio.create_task(handler(job["params"], job["payload"]))
+        try:
+            # Renew the lease while the handler runs, so no other worker takes the job over
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=JOB_LEASE_SECONDS / 3)
+                if done:
+                    break
+                await run_in_threadpool(self.renew, job_id)
+            result = task.result()
+        except asyncio.CancelledError:
+            task.cancel()
+            await run_in_threadpool(self.release, job_id)
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}" if not isinstance(e, JobFailed) else str(e)
+            retried = await run_in_threadpool(self.fail, job_id, attempt, error, not isinstance(e, JobFailed))
+            JOBS.inc(kind, "retried" if retried else "failed")
+            print(f"Job {job_id} ({kind}) attempt {attempt} failed: {error}")
+            return
+        finally:
+            JOB_DURATION.observe(time.perf_counter() - started, kind)
+
+        await run_in_threadpool(self.complete, job_id, result)
+        JOBS.inc(kind, "done")
+
+    def snapshot(self) -> Dict:
+        return {"path": self.path, "workers": len(self._workers), "jobs": self.counts(),
+                "max_attempts": JOB_MAX_ATTEMPTS, "result_ttl": JOB_RESULT_TTL}
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue()
+    return _queue
@@ -0,0 +1,256 @@
+# utils/llm_client.py
+"""
+Shared async client for Groq chat completions.
+
+All tools go through one httpx.AsyncClient (pooled keep-alive connections)
+running on a background event loop, so synchronous callers such as LangChain
+tools can use it from worker threads without blocking the server's loop.
+Each model has a concurrency semaphore, identical in-flight requests are
+coalesced into one upstream call, and token usage and latency are recorded.
+"""
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+import httpx
+
+from utils.rate_limit import charge_current
+from utils.tracing import span
+from utils.upstream_health import upstream_available, report_success, report_failure
+from utils.worker_stats import register_stats, collect_stats
+
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+DEFAULT_MODEL = os.getenv("GROQ_MODEL", "meta-llama/llama-4-scout-17b-16e-instruct")
+
+# Concurrent upstream requests allowed per model
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 4))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 30))
+
+
+class LLMError(Exception):
+    """The completion could not be obtained (not configured, HTTP error or bad response)"""
+
+
+class LLMMetrics:
+    def __init__(self, window: int = 500):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._latencies = deque(maxlen=window)
+
+    def record(self, latency: float, usage: Optional[Dict] = None, error: bool = False):
+        with self._lock:
+            self.requests += 1
+            self.errors += int(error)
+            self._latencies.append(latency)
+            if usage:
+                self.prompt_tokens += usage.get("prompt_tokens", 0)
+                self.completion_tokens += usage.get("completion_tokens", 0)
+
+    def record_coalesced(self):
+        with self._lock:
+            self.coalesced += 1
+
+    def state(self) -> Dict:
+        with self._lock:
+            return {"requests": self.requests, "coalesced": self.coalesced, "errors": self.errors,
+                    "prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens,
+                    "latencies": list(self._latencies)}
+
+    @staticmethod
+    def report(states: List[Dict]) -> Dict:
+        """Counters summed over the workers' states; percentiles over their recent latencies"""
+        latencies = sorted(latency for state in states for latency in state["latencies"])
+
+        def pct(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1) if latencies else None
+
+        totals = {name: sum(state[name] for state in states)
+                  for name in ("requests", "coalesced", "errors", "prompt_tokens", "completion_tokens")}
+        return {
+            "workers": len(states),
+            **totals,
+            "latency_ms": {"p50": pct(0.5), "p95": pct(0.95), "max": pct(1.0)},
+        }
+
+
+class LLMClient:
+    def __init__(self, api_key: Optional[str] = GROQ_API_KEY, base_url: str = GROQ_BASE_URL,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, timeout: float = LLM_TIMEOUT):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.url = f"{self.base_url}/chat/completions"
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.metrics = LLMMetrics()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    # ---------- internals (run on the client's own loop) ----------
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    async def _connect(self):
+        """Cheap authenticated request that leaves a warm connection in the pool"""
+        response = await self._http().get(f"{self.base_url}/models",
+                                          headers={"Authorization": f"Bearer {self.api_key}"})
+        response.raise_for_status()
+
+    async def _post(self, model: str, payload: Dict) -> str:
+        semaphore = self._semaphores.setdefault(model, asyncio.Semaphore(self.max_concurrency))
+
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await self._http().post(
+                    self.url, json=payload, headers={"Authorization": f"Bearer {self.api_key}"}
+                )
+                response.raise_for_status()
+                body = response.json()
+                content = body["choices"][0]["message"]["content"]
+            except httpx.HTTPError as e:
+                self.metrics.record(time.perf_counter() - started, error=True)
+                # Connection failures and server errors mean Groq is unusable, a 4xx does not
+                if not isinstance(e, httpx.HTTPStatusError) or e.response.status_code >= 500:
+                    report_failure("groq", e)
+                raise LLMError(f"Error connecting to Groq API: {e}") from e
+            except (KeyError, IndexError, ValueError) as e:
+                self.metrics.record(time.perf_counter() - started, error=True)
+                raise LLMError("Groq API returned an unexpected response") from e
+
+        self.metrics.record(time.perf_counter() - started, body.get("usage"))
+        report_success("groq")
+        return content
+
+    async def _complete(self, prompt: str, system: Optional[str], model: str,
+                        temperature: float, max_tokens: int) -> str:
+        messages = ([{"role": "system", "content": system}] if system else []) + \
+                   [{"role": "user", "content": prompt}]
+        payload = {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens}
+        key = hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._post(model, payload))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.metrics.record_coalesced()
+        # Shield so one caller being cancelled does not cancel the call for the others
+        return await asyncio.shield(task)
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._loop_lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name="llm-client", daemon=True).start()
+                    self._loop = loop
+        return self._loop
+
+    def _check_usable(self):
+        if not self.configured:
+            raise LLMError("Groq API key not configured")
+        if not upstream_available("groq"):
+            # Fail at once instead of waiting for a timeout; callers use their local fallbacks
+            raise LLMError("Groq API is unreachable (offline mode)")
+
+    def _submit(self, *args) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(self._complete(*args), self._ensure_loop())
+
+    def _reset_after_fork(self):
+        """The loop thread and pooled connections belong to the parent process"""
+        self._client = None
+        self._semaphores = {}
+        self._inflight = {}
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    # ---------- public API ----------
+
+    def warm_up(self):
+        """Start the client loop and open a connection ahead of the first completion"""
+        if not self.configured:
+            raise LLMError("Groq API key not configured")
+        future = asyncio.run_coroutine_threadsafe(self._connect(), self._ensure_loop())
+        try:
+            future.result(timeout=self.timeout)
+        except httpx.HTTPError as e:
+            raise LLMError(f"Error connecting to Groq API: {e}") from e
+
+    async def acomplete(self, prompt: str, system: Optional[str] = None, model: str = DEFAULT_MODEL,
+                        temperature: float = 0.5, max_tokens: int = 1000) -> str:
+        """
+        Chat completion from any event loop. Concurrent identical requests
+        share one upstream call.
+        """
+        self._check_usable()
+        charge_current("llm_calls")
+        with span("llm.complete", model=model):
+            return await asyncio.wrap_future(self._submit(prompt, system, model, temperature, max_tokens))
+
+    def complete(self, prompt: str, system: Optional[str] = None, model: str = DEFAULT_MODEL,
+                 temperature: float = 0.5, max_tokens: int = 1000) -> str:
+        """Blocking chat completion for tools running in worker threads"""
+        self._check_usable()
+        charge_current("llm_calls")
+        with span("llm.complete", model=model):
+            future = self._submit(prompt, system, model, temperature, max_tokens)
+            try:
+                return future.result(timeout=self.timeout * 2)
+            except concurrent.futures.TimeoutError as e:
+                future.cancel()
+                raise LLMError("Groq API request timed out") from e
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """Shared client for the process"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
+
+
+def llm_snapshot() -> Dict:
+    """Usage and latency of the shared client, over all workers in multi-worker mode"""
+    return LLMMetrics.report(list(collect_stats("llm").values()))
+
+
+# Nothing to report until the client exists
+register_stats("llm", lambda: _client.metrics.state() if _client is not None else None)
+
+
+def _after_fork_in_child():
+    global _client_lock
+    _client_lock = threading.Lock()
+    if _client is not None:
+        _client._reset_after_fork()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,277 @@
+# utils/rate_limit.py
+"""
+Per-client rate limiting and usage accounting for the upstream-cost resources.
+
+Each client has one token bucket per resource, keyed on its IP address and,
+within that, on its API key (only keys listed in RATE_LIMIT_API_KEYS; others
+are ignored) or else its session id. Both buckets are checked and charged, so
+the IP bucket, RATE_LIMIT_IP_FACTOR times the per-client quota, caps everything
+sent from one address however many session ids or keys it makes up. A session
+id is only a claim, so its bucket is the IP+session pair: sending someone
+else's X-Session-Id from another address cannot drain their bucket. Only an
+allow-listed API key has one bucket wherever it is used from. Resources:
+
+    llm_calls     completions sent to Groq (planner, synthesis, tools, ReAct steps)
+    stt_seconds   audio seconds sent to Google speech recognition, per attempt
+    tts_chars     characters sent to text-to-speech
+
+Endpoints check the relevant buckets before starting (require) and the
+pipeline debits what it actually used as it goes (charge), so a turn is never
+cut off half way; a client that overdraws waits for the bucket to refill.
+
+Buckets live in memory, or in SQLite when RATE_LIMIT_DB is set (it defaults
+to the shared store in multi-worker mode), which also makes the limits hold
+across worker processes and restarts.
+"""
+import contextvars
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from utils.shared_store import SHARED_STORE_PATH
+from utils.tracing import counter
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") != "0"
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", SHARED_STORE_PATH)
+# Only trust X-Forwarded-For behind a proxy that sets it
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "0") == "1"
+# X-API-Key values that get their own buckets (comma separated)
+API_KEYS = frozenset(key.strip() for key in os.getenv("RATE_LIMIT_API_KEYS", "").split(",") if key.strip())
+# The per-IP bucket is this many times a client's, for several farmers behind one NAT
+IP_QUOTA_FACTOR = float(os.getenv("RATE_LIMIT_IP_FACTOR", 4))
+
+
+@dataclass(slots=True)
+class Quota:
+    burst: float
+    per_hour: float
+
+    @property
+    def rate(self) -> float:
+        return self.per_hour / 3600.0
+
+
+def _quota(resource: str, burst: float, per_hour: float) -> Quota:
+    prefix = f"RATE_LIMIT_{resource.upper()}"
+    return Quota(float(os.getenv(f"{prefix}_BURST", burst)), float(os.getenv(f"{prefix}_PER_HOUR", per_hour)))
+
+
+QUOTAS = {
+    "llm_calls": _quota("llm_calls", 30, 120),
+    "stt_seconds": _quota("stt_seconds", 300, 1800),
+    "tts_chars": _quota("tts_chars", 5000, 30000),
+}
+IP_QUOTAS = {resource: Quota(q.burst * IP_QUOTA_FACTOR, q.per_hour * IP_QUOTA_FACTOR)
+             for resource, q in QUOTAS.items()}
+
+CONSUMED = counter("agri_quota_consumed_total", "Upstream usage charged to clients", ("resource",))
+REJECTED = counter("agri_quota_rejected_total", "Requests refused for an empty bucket", ("resource",))
+
+_client: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("rate_limit_client", default=None)
+
+
+class RateLimited(Exception):
+    def __init__(self, resource: str, retry_after: int):
+        super().__init__(f"Usage limit reached for {resource}, retry in {retry_after}s")
+        self.resource, self.retry_after = resource, retry_after
+
+
+def identify(headers: Dict[str, str], client_host: Optional[str], session_id: Optional[str] = None) -> str:
+    """Client key: "ip:<address>", followed by "|key:<hash>" or "|session:<id>" when known"""
+    forwarded = headers.get("x-forwarded-for") if TRUST_FORWARDED_FOR else None
+    ip = "ip:" + (forwarded.split(",")[0].strip() if forwarded else client_host or "unknown")
+    api_key = headers.get("x-api-key")
+    if api_key and api_key in API_KEYS:
+        # Never keep the key itself in memory, the database or /usage output
+        return f"{ip}|key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    session_id = session_id or headers.get("x-session-id")
+    if session_id:
+        return f"{ip}|session:" + session_id[:64]
+    return ip
+
+
+def buckets_of(client: str) -> Tuple[str, ...]:
+    """
+    The bucket keys a client key is charged to: its IP, then "key:<hash>" for an
+    API key or the whole IP+session client key for a session
+    """
+    ip, _, owner = client.partition("|")
+    if not owner:
+        return (ip,)
+    return ip, owner if owner.startswith("key:") else client
+
+
+def quota_for(bucket: str, resource: str) -> Quota:
+    is_ip = bucket.startswith("ip:") and "|" not in bucket
+    return IP_QUOTAS[resource] if is_ip else QUOTAS[resource]
+
+
+def bind_client(client: str):
+    """Make client the one charged for upstream usage in this request's context"""
+    _client.set(client)
+
+
+# Above this many buckets, idle (full) ones are dropped from the in-memory store
+MAX_MEMORY_BUCKETS = 50000
+
+
+class _MemoryBuckets:
+    def __init__(self):
+        self._rows: Dict[Tuple[str, str], list] = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float):
+        for key, row in list(self._rows.items()):
+            quota = quota_for(*key)
+            if row[0] + (now - row[1]) * quota.rate >= quota.burst:
+                del self._rows[key]
+
+    def update(self, client: str, resource: str, fn):
+        """Apply fn(tokens, consumed, rejected) -> (tokens, consumed, rejected, result) atomically"""
+        quota = quota_for(client, resource)
+        with self._lock:
+            row = self._rows.get((client, resource))
+            if row is None:
+                if len(self._rows) >= MAX_MEMORY_BUCKETS:
+                    self._prune(time.time())
+                row = self._rows[(client, resource)] = [quota.burst, time.time(), 0.0, 0]
+            now = time.time()
+            tokens = min(quota.burst, row[0] + (now - row[1]) * quota.rate)
+            row[0], row[2], row[3], result = fn(tokens, row[2], row[3])
+            row[1] = now
+            return result
+
+    def usage(self, client: str) -> Dict[str, Tuple[float, float, float, int]]:
+        with self._lock:
+            return {resource: tuple(row) for (c, resource), row in self._rows.items() if c == client}
+
+
+class _SqliteBuckets:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        # Handles inherited across fork; closing them would drop this process's file locks
+        self._inherited = []
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets (client TEXT, resource TEXT, tokens REAL, updated_at REAL, "
+            "consumed REAL, rejected INTEGER, PRIMARY KEY (client, resource))"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            if conn is not None:
+                self._inherited.append(conn)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def update(self, client: str, resource: str, fn):
+        quota = quota_for(client, resource)
+        conn = self._conn()
+        # IMMEDIATE takes the write lock up front, so workers cannot interleave read and write
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated_at, consumed, rejected FROM rate_buckets WHERE client = ? AND resource = ?",
+                (client, resource),
+            ).fetchone()
+            now = time.time()
+            tokens, updated_at, consumed, rejected = row or (quota.burst, now, 0.0, 0)
+            tokens = min(quota.burst, tokens + (now - updated_at) * quota.rate)
+            tokens, consumed, rejected, result = fn(tokens, consumed, rejected)
+            conn.execute("INSERT OR REPLACE INTO rate_buckets VALUES (?, ?, ?, ?, ?, ?)",
+                         (client, resource, tokens, now, consumed, rejected))
+            conn.execute("COMMIT")
+            return result
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def usage(self, client: str) -> Dict[str, Tuple[float, float, float, int]]:
+        rows = self._conn().execute(
+            "SELECT resource, tokens, updated_at, consumed, rejected FROM rate_buckets WHERE client = ?", (client,)
+        ).fetchall()
+        return {row[0]: tuple(row[1:]) for row in rows}
+
+
+class RateLimiter:
+    def __init__(self, db_path: Optional[str] = RATE_LIMIT_DB):
+        self.buckets = _SqliteBuckets(db_path) if db_path else _MemoryBuckets()
+
+    def require(self, client: str, resource: str, amount: float = 1.0):
+        """Raise RateLimited unless each of the client's buckets holds amount (capped at its burst size)"""
+        waits = []
+        for bucket in buckets_of(client):
+            quota = quota_for(bucket, resource)
+            needed = min(amount, quota.burst)
+
+            def check(tokens, consumed, rejected, quota=quota, needed=needed):
+                if tokens >= needed:
+                    return tokens, consumed, rejected, None
+                return tokens, consumed, rejected + 1, max(1, int((needed - tokens) / quota.rate) + 1)
+
+            waits.append(self.buckets.update(bucket, resource, check))
+        waits = [wait for wait in waits if wait is not None]
+        if waits:
+            REJECTED.inc(resource)
+            raise RateLimited(resource, max(waits))
+
+    def charge(self, client: str, resource: str, amount: float):
+        """Debit actual usage from each bucket; a balance may go negative (down to minus one burst)"""
+        for bucket in buckets_of(client):
+            quota = quota_for(bucket, resource)
+            self.buckets.update(bucket, resource, lambda tokens, consumed, rejected, quota=quota: (
+                max(-quota.burst, tokens - amount), consumed + amount, rejected, None))
+        CONSUMED.inc(resource, amount=amount)
+
+    def _report(self, bucket: str) -> Dict:
+        now = time.time()
+        rows = self.buckets.usage(bucket)
+        report = {}
+        for resource in QUOTAS:
+            quota = quota_for(bucket, resource)
+            tokens, updated_at, consumed, rejected = rows.get(resource, (quota.burst, now, 0.0, 0))
+            available = min(quota.burst, tokens + (now - updated_at) * quota.rate)
+            report[resource] = {
+                "available": round(available, 2),
+                "burst": quota.burst,
+                "per_hour": quota.per_hour,
+                "consumed": round(consumed, 2),
+                "rejected": int(rejected),
+            }
+        return report
+
+    def usage(self, client: str) -> Dict:
+        """The client's own buckets, plus the shared IP buckets when it has its own"""
+        buckets = buckets_of(client)
+        report = {"client": buckets[-1], "enabled": RATE_LIMIT_ENABLED, "resources": self._report(buckets[-1])}
+        if len(buckets) > 1:
+            report["ip_resources"] = self._report(buckets[0])
+        return report
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter()
+    return _limiter
+
+
+def charge_current(resource: str, amount: float = 1.0):
+    """Charge the client bound to this request, if any (background work is not charged)"""
+    client = _client.get()
+    if RATE_LIMIT_ENABLED and client is not None and amount > 0:
+        get_rate_limiter().charge(client, resource, amount)
@@ -0,0 +1,321 @@
+# utils/resilience.py
+"""
+Circuit breakers and hedged requests for the Google Translate, Google STT and
+weather upstreams.
+
+Every call goes through `get_upstream(name).call(fn, ...)`, which runs it on
+the upstream's own thread pool with a deadline, so one slow upstream cannot
+starve the others' calls. The deadline bounds the caller's wait; the callables
+also set socket timeouts (translator, weather, STT) so an abandoned call frees
+its thread instead of holding it on a hung connection. Consecutive failures
+open the upstream's breaker: calls then fail at once with CircuitOpen and the
+caller uses its fallback, until a single trial call after the cooldown closes
+it again. The trial runs on a thread of its own, so it never queues behind
+calls still stuck in the pool. A call that timed out while still queued
+(its pool was full) is not held against the upstream. Idempotent calls that
+are still running after the upstream's recent p95 latency get one duplicate
+("hedge") unless the pool is full; whichever answers first wins, which trims
+the tail caused by one slow connection.
+
+Outcomes are also reported to utils.upstream_health, which switches whole
+pipelines to their offline stand-ins when an upstream stays down.
+
+    BREAKER_FAILURES     consecutive failures that open a breaker (default 5)
+    BREAKER_COOLDOWN     seconds an open breaker rejects calls before a trial (default 15)
+    HEDGE_ENABLED        duplicate slow idempotent calls (default 1)
+    HEDGE_QUANTILE       latency quantile after which the hedge is sent (default 0.95)
+    HEDGE_MIN_DELAY      lower bound of the hedge delay in seconds (default 0.05)
+    HEDGE_MAX_DELAY      upper bound, also used until enough latencies are seen (default 2)
+    UPSTREAM_WORKERS     threads running calls, per upstream (default 16)
+    TRANSLATE_TIMEOUT / STT_TIMEOUT   per-call deadlines in seconds (default 5 / 10)
+"""
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional, Tuple, Type
+
+from utils.tracing import counter, gauge
+from utils.upstream_health import report_success, report_failure
+
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", 5))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", 15))
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "1") != "0"
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", 0.95))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", 0.05))
+HEDGE_MAX_DELAY = float(os.getenv("HEDGE_MAX_DELAY", 2))
+UPSTREAM_WORKERS = int(os.getenv("UPSTREAM_WORKERS", 16))
+TRANSLATE_TIMEOUT = float(os.getenv("TRANSLATE_TIMEOUT", 5))
+STT_TIMEOUT = float(os.getenv("STT_TIMEOUT", 10))
+# Latencies needed before the hedge delay follows the measured quantile
+MIN_LATENCY_SAMPLES = 20
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+# call(timeout=...) default: the upstream's own deadline
+_OWN_TIMEOUT = object()
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+BREAKER_STATE = gauge("agri_circuit_state", "Circuit breaker state: 0 closed, 1 half-open, 2 open", ("upstream",))
+BREAKER_TRANSITIONS = counter("agri_circuit_transitions_total", "Circuit breaker state changes",
+                              ("upstream", "state"))
+BREAKER_REJECTED = counter("agri_circuit_rejected_total", "Calls failed fast by an open breaker", ("upstream",))
+UPSTREAM_CALLS = counter("agri_upstream_calls_total", "Upstream calls by outcome (ok, error, timeout, saturated)",
+                         ("upstream", "outcome"))
+HEDGES = counter("agri_hedged_requests_total", "Hedged duplicate requests, by which copy answered first",
+                 ("upstream", "winner"))
+HEDGE_DELAY = gauge("agri_hedge_delay_seconds", "Current delay before a call is hedged", ("upstream",))
+
+
+class UpstreamUnavailable(Exception):
+    """The upstream did not answer in time, or its breaker is open"""
+
+
+class CircuitOpen(UpstreamUnavailable):
+    """Failed fast: the upstream's breaker is open"""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+        BREAKER_STATE.set(name, value=0)
+
+    def _move(self, state: str):
+        """Caller holds the lock"""
+        if state == self.state:
+            return
+        self.state = state
+        BREAKER_STATE.set(self.name, value=_STATE_VALUES[state])
+        BREAKER_TRANSITIONS.inc(self.name, state)
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+            print(f"Circuit for {self.name} opened after {self.failures} failures")
+        elif state == CLOSED:
+            print(f"Circuit for {self.name} closed")
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now; half-open lets exactly one trial through"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self._move(HALF_OPEN)
+                self._trial = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial = False
+            self._move(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self._move(OPEN)
+                # A failed trial restarts the cooldown
+                self.opened_at = time.monotonic()
+
+
+class Upstream:
+    def __init__(self, name: str, timeout: Optional[float], window: int = 200, workers: int = UPSTREAM_WORKERS):
+        self.name = name
+        self.timeout = timeout
+        self.workers = workers
+        self.breaker = CircuitBreaker(name)
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Calls submitted to the pool and not finished yet (running or queued)
+        self._busy = 0
+        HEDGE_DELAY.set(name, value=HEDGE_MAX_DELAY)
+
+    def hedge_delay(self) -> float:
+        """The recent HEDGE_QUANTILE latency, clamped to [HEDGE_MIN_DELAY, HEDGE_MAX_DELAY]"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < MIN_LATENCY_SAMPLES:
+            return HEDGE_MAX_DELAY
+        quantile = latencies[min(len(latencies) - 1, int(len(latencies) * HEDGE_QUANTILE))]
+        return min(HEDGE_MAX_DELAY, max(HEDGE_MIN_DELAY, quantile))
+
+    def _record(self, started: float, error: Optional[BaseException]):
+        if error is None:
+            with self._lock:
+                self._latencies.append(time.perf_counter() - started)
+            self.breaker.record_success()
+            report_success(self.name)
+            UPSTREAM_CALLS.inc(self.name, "ok")
+            HEDGE_DELAY.set(self.name, value=self.hedge_delay())
+        else:
+            self.breaker.record_failure()
+            report_failure(self.name, error)
+            UPSTREAM_CALLS.inc(self.name, "timeout" if isinstance(error, UpstreamUnavailable) else "error")
+
+    def call(self, fn: Callable, *args, hedge: bool = False, timeout=_OWN_TIMEOUT,
+             failures: Tuple[Type[BaseException], ...] = (Exception,), **kwargs):
+        """
+        Run fn(*args, **kwargs) against this upstream and return its result.
+
+        Exceptions listed in `failures` count against the breaker; any other
+        exception means the upstream answered (e.g. "speech not recognised")
+        and is re-raised as is. Raises CircuitOpen without calling fn while the
+        breaker is open, and UpstreamUnavailable when the deadline (timeout,
+        default the upstream's own; None for no deadline) passes first.
+        Only pass hedge=True for idempotent calls.
+        """
+        if not self.breaker.allow():
+            BREAKER_REJECTED.inc(self.name)
+            raise CircuitOpen(f"{self.name} circuit is open")
+        trial = self.breaker.state == HALF_OPEN
+        timeout = self.timeout if timeout is _OWN_TIMEOUT else timeout
+        started = time.perf_counter()
+        deadline = None if timeout is None else started + timeout
+
+        def submit():
+            # Each copy runs in the caller's context (request id, spans, rate-limit client)
+            task = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+            return _run_on_own_thread(task, f"{self.name}-trial") if trial else self._submit(task)
+
+        primary = submit()
+        pending = {primary}
+        hedged = None
+        if hedge and HEDGE_ENABLED and self.breaker.state == CLOSED:
+            delay = self.hedge_delay()
+            if deadline is not None:
+                delay = min(delay, max(0.0, deadline - time.perf_counter()))
+            done, _ = wait(pending, timeout=delay)
+            # A hedge into a full pool would only queue behind the calls it is meant to overtake
+            if not done and (deadline is None or time.perf_counter() < deadline) and not self.saturated():
+                hedged = submit()
+                pending.add(hedged)
+
+        error: Optional[BaseException] = None
+        while pending:
+            remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                exc = future.exception()
+                if exc is not None and isinstance(exc, failures):
+                    # Keep waiting for the other copy, if there is one
+                    error = exc
+                    continue
+                if hedged is not None:
+                    HEDGES.inc(self.name, "hedge" if future is hedged else "primary")
+                self._record(started, None)
+                for other in pending:
+                    other.cancel()
+                return future.result()
+
+        if error is None:
+            # cancel() only succeeds for copies that never left the queue
+            never_started = [future.cancel() for future in pending]
+            if never_started and all(never_started):
+                # Our pool was full, the upstream was never asked: not a failure of the upstream
+                UPSTREAM_CALLS.inc(self.name, "saturated")
+                raise UpstreamUnavailable(f"{self.name} calls are queued past the {timeout}s deadline")
+            error = UpstreamUnavailable(f"{self.name} did not answer within {timeout}s")
+        self._record(started, error)
+        raise error
+
+    def _submit(self, task: Callable) -> Future:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix=f"upstream-{self.name}")
+            self._busy += 1
+        future = self._executor.submit(task)
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future: Future):
+        with self._lock:
+            self._busy -= 1
+
+    def saturated(self) -> bool:
+        """No idle thread in this upstream's pool: a new call would wait in its queue"""
+        return self._busy >= self.workers
+
+    def snapshot(self) -> Dict:
+        return {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "hedge_delay": round(self.hedge_delay(), 4),
+            "timeout": self.timeout,
+            "busy_workers": min(self._busy, self.workers),
+            "queued": max(0, self._busy - self.workers),
+        }
+
+
+def _run_on_own_thread(task: Callable, name: str) -> Future:
+    """Run task on a new daemon thread, outside any pool"""
+    future = Future()
+
+    def run():
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(task())
+            except BaseException as e:
+                future.set_exception(e)
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return future
+
+
+_upstreams: Dict[str, Upstream] = {}
+_lock = threading.Lock()
+
+
+def _default_timeout(name: str) -> Optional[float]:
+    if name == "translate":
+        return TRANSLATE_TIMEOUT
+    if name == "stt":
+        return STT_TIMEOUT
+    if name == "weather":
+        from tools.weather import WEATHER_TIMEOUT
+        return WEATHER_TIMEOUT
+    return None
+
+
+def get_upstream(name: str) -> Upstream:
+    upstream = _upstreams.get(name)
+    if upstream is None:
+        with _lock:
+            upstream = _upstreams.get(name)
+            if upstream is None:
+                upstream = _upstreams[name] = Upstream(name, _default_timeout(name))
+    return upstream
+
+
+def breaker_snapshot() -> Dict:
+    return {name: upstream.snapshot() for name, upstream in sorted(_upstreams.items())}
+
+
+def _after_fork_in_child():
+    # Executor threads are not copied into forked workers; breaker state starts fresh per worker
+    global _lock
+    _lock = threading.Lock()
+    for upstream in _upstreams.values():
+        upstream._executor = None
+        upstream._busy = 0
+        upstream._lock = threading.Lock()
+        upstream.breaker._lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
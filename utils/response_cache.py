@@ -0,0 +1,312 @@
+# utils/response_cache.py
+"""
+Response cache in front of the agent, keyed on the translated English query.
+
+Queries are normalized (lowercase, punctuation, articles and filler words
+removed, but question words and negations kept) for exact matches; near-duplicates are found with MinHash signatures over word
+unigrams and bigrams, bucketed by LSH bands and confirmed by estimated
+Jaccard similarity. Entries expire by topic: weather answers go stale in
+minutes, scheme and finance answers last for days.
+
+With a shared store (multi-worker mode) every answer is also written there,
+so an exact repeat is served by whichever worker receives it; near-duplicate
+matching stays per worker. GET /cache/stats sums the counters of all workers.
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from utils.shared_store import get_shared_store
+from utils.worker_stats import register_stats, collect_stats
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") != "0"
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 5000))
+
+# Estimated Jaccard similarity needed to reuse a near-duplicate's answer
+NEAR_DUPLICATE_THRESHOLD = 0.8
+
+# Seconds an answer stays fresh, by topic (first matching topic wins)
+CATEGORY_TTLS = {
+    "weather": 30 * 60,
+    "price": 6 * 3600,
+    "disease": 24 * 3600,
+    "crop": 24 * 3600,
+    "policy": 3 * 24 * 3600,
+    "finance": 3 * 24 * 3600,
+    "general": 6 * 3600,
+}
+
+CATEGORY_KEYWORDS = {
+    "weather": {"weather", "rain", "rainfall", "forecast", "temperature", "humidity", "wind", "today", "tomorrow"},
+    "price": {"price", "mandi", "market", "rate", "sell", "selling"},
+    "disease": {"disease", "pest", "infection", "spot", "blight", "yellow", "wilt", "fungus", "insect"},
+    "crop": {"crop", "grow", "sow", "plant", "cultivate", "soil", "harvest", "seed"},
+    "policy": {"pm", "kisan", "yojana", "bima", "eligibility", "pmfby", "pension", "policy", "card"},
+    "finance": {"loan", "credit", "kcc", "subsidy", "interest", "bank", "insurance", "finance"},
+}
+
+# Answers to queries like these depend on the conversation so far
+_CONTEXT_WORDS = {"that", "there", "those", "same", "above", "previous", "again", "earlier",
+                  "here", "this", "these", "it", "its", "them", "they", "mine"}
+# "my farm" and the like refer to a place or crop the farmer named earlier
+_CONTEXT_PHRASES = re.compile(r"\b(?:my|our)\s+(?:farm|field|fields|land|village|area|district|crop|crops|plot)\b")
+
+_SHARED_PREFIX = "response:"
+_GENERATION_KEY = "response_cache:generation"
+
+# Responses that must never be served again
+_UNCACHEABLE_PREFIXES = ("❌", "Agent stopped", "Error")
+
+NUM_PERM = 64
+BANDS = 16
+_ROWS = NUM_PERM // BANDS
+_PRIME = 4294967311  # smallest prime above 2**32
+_rng = np.random.default_rng(20240611)
+_PERM_A = _rng.integers(1, 2 ** 31, NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, 2 ** 31, NUM_PERM, dtype=np.uint64)
+
+
+# Politeness words and articles that never change the answer
+_FILLER = {"please", "kindly", "sir", "madam", "hi", "hello", "namaste", "thanks", "thank",
+           "a", "an", "the", "me", "tell"}
+
+# Words that change what is being asked; a near-duplicate must agree on all of them
+_NEGATIONS = {"not", "no", "never", "nor", "without", "avoid"}
+_QUESTION_WORDS = {"what", "when", "where", "why", "how", "which", "who", "whom", "whose",
+                   "can", "should", "apply", "safe"}
+
+_CONTRACTIONS = ((r"\bcan't\b", "can not"), (r"\bwon't\b", "will not"), (r"n't\b", " not"))
+
+
+def normalize_query(query: str) -> List[str]:
+    """
+    Cache tokens: lowercase words without punctuation and politeness filler.
+    Unlike the retrieval tokenizer, question words, "apply" and negations are
+    kept, since "when" and "why", or "safe" and "not safe", need different answers.
+    """
+    text = query.lower().replace("\u2019", "'")
+    for pattern, replacement in _CONTRACTIONS:
+        text = re.sub(pattern, replacement, text)
+    tokens = []
+    for token in re.findall(r"[a-z0-9]+", text):
+        if token in _FILLER:
+            continue
+        if len(token) > 4 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _shingles(tokens: List[str]) -> Set[str]:
+    return set(tokens) | {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+
+
+def minhash(shingles: Set[str]) -> np.ndarray:
+    hashes = np.array(
+        [int.from_bytes(blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles],
+        dtype=np.uint64,
+    )
+    return ((_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _PRIME).min(axis=1)
+
+
+def classify_query(tokens: List[str]) -> str:
+    token_set = set(tokens)
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        if token_set & keywords:
+            return category
+    return "general"
+
+
+def _is_entity(token: str) -> bool:
+    """Numbers, place names, negations and question words must match exactly for two queries to share an answer"""
+    if token in _NEGATIONS or token in _QUESTION_WORDS or any(ch.isdigit() for ch in token):
+        return True
+    try:
+        from data.district_index import get_district_index
+        return get_district_index().lookup(token) is not None
+    except Exception:
+        return False
+
+
+class CacheEntry:
+    __slots__ = ("key", "tokens", "response", "category", "expires_at", "signature", "hits")
+
+    def __init__(self, key, tokens, response, category, expires_at, signature):
+        self.key = key
+        self.tokens = tokens
+        self.response = response
+        self.category = category
+        self.expires_at = expires_at
+        self.signature = signature
+        self.hits = 0
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, threshold: float = NEAR_DUPLICATE_THRESHOLD):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, bytes], Set[str]] = {}
+        self._lock = threading.Lock()
+        self.store = get_shared_store()
+        # Bumped in the shared store on clear(), so every worker drops its local entries
+        self._generation = self.store.get(_GENERATION_KEY, 0) if self.store else 0
+        self.stats = {"exact_hits": 0, "near_hits": 0, "shared_hits": 0, "misses": 0, "stores": 0,
+                      "expired": 0, "evictions": 0, "uncacheable": 0}
+        self.category_stats: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def cacheable_query(query: str, tokens: List[str]) -> bool:
+        text = query.lower()
+        words = set(re.findall(r"[a-z]+", text))
+        return len(tokens) >= 1 and not (words & _CONTEXT_WORDS) and not _CONTEXT_PHRASES.search(text)
+
+    def _band_keys(self, signature: np.ndarray):
+        return [(band, signature[band * _ROWS:(band + 1) * _ROWS].tobytes()) for band in range(BANDS)]
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band_key in self._band_keys(entry.signature):
+            bucket = self._buckets.get(band_key)
+            if bucket:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def _sync_generation(self):
+        generation = self.store.get(_GENERATION_KEY, 0)
+        if generation != self._generation:
+            self._entries.clear()
+            self._buckets.clear()
+            self._generation = generation
+
+    def _count(self, category: str, outcome: str):
+        per_category = self.category_stats.setdefault(category, {"hits": 0, "misses": 0})
+        per_category[outcome] += 1
+
+    def get(self, query: str) -> Optional[str]:
+        """Cached English response for the query or a near-duplicate of it"""
+        tokens = normalize_query(query)
+        if not self.cacheable_query(query, tokens):
+            return None
+        key = " ".join(tokens)
+        category = classify_query(tokens)
+        signature = minhash(_shingles(tokens))
+        now = time.time()
+
+        with self._lock:
+            if self.store:
+                self._sync_generation()
+            entry = self._entries.get(key)
+            if entry and entry.expires_at > now:
+                return self._hit(entry, "exact_hits")
+            if entry:
+                self._remove(key)
+                self.stats["expired"] += 1
+
+            candidates = set()
+            for band_key in self._band_keys(signature):
+                candidates |= self._buckets.get(band_key, set())
+
+            best, best_similarity = None, self.threshold
+            for candidate_key in candidates:
+                candidate = self._entries[candidate_key]
+                similarity = float(np.mean(candidate.signature == signature))
+                if similarity >= best_similarity and candidate.expires_at > now:
+                    best, best_similarity = candidate, similarity
+
+            if best is not None and not any(_is_entity(t) for t in set(tokens) ^ set(best.tokens)):
+                return self._hit(best, "near_hits")
+
+            shared = self.store.get(_SHARED_PREFIX + key) if self.store else None
+            if shared is not None:
+                # Another worker answered this; index it locally for near-duplicate matches too
+                entry = CacheEntry(key, tokens, shared["response"], category, shared["expires_at"], signature)
+                self._insert(entry)
+                self.stats["shared_hits"] += 1
+                self._count(category, "hits")
+                return entry.response
+
+            self.stats["misses"] += 1
+            self._count(category, "misses")
+            return None
+
+    def _hit(self, entry: CacheEntry, kind: str) -> str:
+        self._entries.move_to_end(entry.key)
+        entry.hits += 1
+        self.stats[kind] += 1
+        self._count(entry.category, "hits")
+        return entry.response
+
+    def put(self, query: str, response: str):
+        tokens = normalize_query(query)
+        if not self.cacheable_query(query, tokens) or not response or response.startswith(_UNCACHEABLE_PREFIXES):
+            self.stats["uncacheable"] += 1
+            return
+        key = " ".join(tokens)
+        category = classify_query(tokens)
+        signature = minhash(_shingles(tokens))
+        ttl = CATEGORY_TTLS[category]
+        entry = CacheEntry(key, tokens, response, category, time.time() + ttl, signature)
+
+        with self._lock:
+            self._insert(entry)
+            self.stats["stores"] += 1
+        if self.store:
+            self.store.set(_SHARED_PREFIX + key, {"response": response, "expires_at": entry.expires_at}, ttl)
+
+    def _insert(self, entry: CacheEntry):
+        self._remove(entry.key)
+        self._entries[entry.key] = entry
+        for band_key in self._band_keys(entry.signature):
+            self._buckets.setdefault(band_key, set()).add(entry.key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            if self.store:
+                self.store.delete_prefix(_SHARED_PREFIX)
+                self._generation = self.store.get(_GENERATION_KEY, 0) + 1
+                self.store.set(_GENERATION_KEY, self._generation)
+
+    def state(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._entries), "stats": dict(self.stats),
+                    "by_category": {k: dict(v) for k, v in self.category_stats.items()}}
+
+    def snapshot(self) -> Dict:
+        """Counters summed over the live workers (entries are each worker's local index)"""
+        states = list(collect_stats("response_cache").values())
+        stats = {name: sum(state["stats"][name] for state in states) for name in self.stats}
+        by_category: Dict[str, Dict[str, int]] = {}
+        for state in states:
+            for category, counts in state["by_category"].items():
+                total = by_category.setdefault(category, {"hits": 0, "misses": 0})
+                for outcome, n in counts.items():
+                    total[outcome] += n
+        hits = stats["exact_hits"] + stats["near_hits"] + stats["shared_hits"]
+        lookups = hits + stats["misses"]
+        return {
+            "enabled": RESPONSE_CACHE_ENABLED,
+            "workers": len(states),
+            "entries": sum(state["entries"] for state in states),
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            **stats,
+            "by_category": by_category,
+        }
+
+
+response_cache = ResponseCache()
+register_stats("response_cache", response_cache.state)
@@ -0,0 +1,317 @@
+# utils/retrieval.py
+"""
+Local BM25 retrieval over scheme documents, loan products and FAQ text.
+
+The corpus is compiled into postings lists of BM25 weights (for each term,
+the passages containing it and their float32 weights, stored CSR-style as
+indptr/docs/weights .npy files) that are memory-mapped at startup, so a
+query only reads the postings of its own terms:
+
+    python -m utils.retrieval build
+
+Each build is written to its own directory under RETRIEVAL_INDEX_DIR and
+published by atomically repointing the "current" symlink, under a file lock so
+concurrent workers build once and never see half of a build. A watcher thread
+rebuilds when a source file changes (RETRIEVAL_WATCH_INTERVAL seconds between
+checks); requests never stat the sources or build.
+"""
+import fcntl
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from data.gov_scheme_loader import SCHEMES_PATH, tokenize
+from utils.llm_client import get_llm_client, LLMError
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+FINANCE_PATH = os.path.join(DATA_DIR, "finance_products.json")
+FAQ_PATH = os.path.join(DATA_DIR, "faq.json")
+INDEX_DIR = os.getenv("RETRIEVAL_INDEX_DIR", os.path.join(DATA_DIR, "retrieval_index"))
+
+# Below this share of the query covered by the best passage, tools ask the LLM instead
+MIN_CONFIDENCE = float(os.getenv("RETRIEVAL_MIN_CONFIDENCE", 0.5))
+RETRIEVAL_WATCH_INTERVAL = float(os.getenv("RETRIEVAL_WATCH_INTERVAL", 10))
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Record fields that are indexed for each source; the title is counted twice
+SOURCES = {
+    "scheme": (SCHEMES_PATH, "name", ("aliases", "category", "benefit", "eligibility", "states", "crops")),
+    "finance": (FINANCE_PATH, "name", ("category", "lender", "amount", "interest", "eligibility")),
+    "faq": (FAQ_PATH, "question", ("answer", "topic")),
+}
+
+
+@dataclass(frozen=True, slots=True)
+class SearchHit:
+    score: float
+    confidence: float
+    source: str
+    record: Dict
+
+
+def _text(record: Dict, field: str) -> str:
+    value = record.get(field, "")
+    return " ".join(value) if isinstance(value, list) else str(value)
+
+
+def _load_passages() -> List[Dict]:
+    passages = []
+    for source, (path, title_field, fields) in SOURCES.items():
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            for record in json.load(f):
+                text = " ".join([_text(record, title_field)] * 2 + [_text(record, fld) for fld in fields])
+                passages.append({"source": source, "text": text, "record": record})
+    return passages
+
+
+def _source_mtimes() -> Dict[str, Optional[float]]:
+    return {path: os.path.getmtime(path) if os.path.exists(path) else None for path, _, _ in SOURCES.values()}
+
+
+@contextmanager
+def _build_lock(index_dir: str):
+    """Serialise builds across processes (every worker notices a changed source at once)"""
+    os.makedirs(index_dir, exist_ok=True)
+    with open(os.path.join(index_dir, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def build_index(index_dir: str = INDEX_DIR) -> int:
+    """Compile all sources into BM25 postings and publish them. Returns the number of passages."""
+    with _build_lock(index_dir):
+        return _build(index_dir)
+
+
+def ensure_index(index_dir: str = INDEX_DIR) -> bool:
+    """Build the index unless a fresh one exists; True if this call built it"""
+    if not _index_is_stale(index_dir):
+        return False
+    with _build_lock(index_dir):
+        # Another worker may have built it while this one waited for the lock
+        if not _index_is_stale(index_dir):
+            return False
+        _build(index_dir)
+        return True
+
+
+def _build(index_dir: str) -> int:
+    """Caller holds the build lock"""
+    sources = _source_mtimes()
+    passages = _load_passages()
+    vocab: Dict[str, int] = {}
+    terms, docs, counts, lengths = [], [], [], []
+    for j, passage in enumerate(passages):
+        tokens = tokenize(passage["text"])
+        lengths.append(len(tokens))
+        for token, count in Counter(tokens).items():
+            terms.append(vocab.setdefault(token, len(vocab)))
+            docs.append(j)
+            counts.append(count)
+
+    n_docs, n_terms = len(passages), len(vocab)
+    terms = np.array(terms, dtype=np.int64)
+    # Postings grouped by term, passages ascending within each term
+    order = np.lexsort((np.array(docs, dtype=np.int32), terms))
+    terms, docs, tf = terms[order], np.array(docs, dtype=np.int32)[order], np.array(counts, dtype=np.float32)[order]
+
+    doc_freq = np.bincount(terms, minlength=n_terms)
+    indptr = np.concatenate(([0], np.cumsum(doc_freq))).astype(np.int64)
+    idf = np.log(1 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+    lengths = np.array(lengths, dtype=np.float32)
+    avg_len = float(lengths.mean()) if n_docs else 0.0
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(avg_len, 1e-9))
+    weights = (idf[terms] * tf * (BM25_K1 + 1) / (tf + norm[docs])).astype(np.float32)
+
+    # A fresh directory per build: processes that have the old postings mapped keep valid files
+    build_dir = tempfile.mkdtemp(prefix=f"build-{time.time_ns()}-", dir=index_dir)
+    for name, array in (("indptr", indptr), ("docs", docs), ("weights", weights), ("idf", idf)):
+        np.save(os.path.join(build_dir, f"{name}.npy"), array)
+    with open(os.path.join(build_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "vocab": list(vocab),
+            "passages": [{"source": p["source"], "record": p["record"]} for p in passages],
+            "sources": sources,
+        }, f, ensure_ascii=False)
+
+    # Readers resolve "current" once and load every file from that one build
+    current = os.path.join(index_dir, "current")
+    previous = os.path.realpath(current) if os.path.islink(current) else None
+    link = os.path.join(index_dir, f".current-{os.getpid()}")
+    if os.path.lexists(link):
+        os.unlink(link)
+    os.symlink(os.path.basename(build_dir), link)
+    os.replace(link, current)
+
+    # Keep the previous build for readers that resolved the link just before the swap
+    keep = {build_dir, previous}
+    for name in os.listdir(index_dir):
+        path = os.path.join(index_dir, name)
+        if name.startswith("build-") and os.path.realpath(path) not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+    return n_docs
+
+
+class RetrievalIndex:
+    def __init__(self, index_dir: str = INDEX_DIR):
+        self.path = os.path.realpath(os.path.join(index_dir, "current"))
+        with open(os.path.join(self.path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.vocab = {token: i for i, token in enumerate(meta["vocab"])}
+        self.passages = meta["passages"]
+        self.source_mtimes = meta["sources"]
+        self.indptr = np.load(os.path.join(self.path, "indptr.npy"))
+        self.docs = np.load(os.path.join(self.path, "docs.npy"), mmap_mode="r")
+        self.weights = np.load(os.path.join(self.path, "weights.npy"), mmap_mode="r")
+        self.idf = np.load(os.path.join(self.path, "idf.npy"))
+        self.sources = np.array([p["source"] for p in self.passages])
+        self.built_at = os.path.getmtime(os.path.join(self.path, "meta.json"))
+
+    def search(self, query: str, k: int = 3, sources: Optional[Iterable[str]] = None) -> List[SearchHit]:
+        """
+        Top-k passages by BM25. Confidence is the IDF-weighted share of the
+        query's terms that the passage contains (unknown terms count at max IDF).
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        term_ids = [self.vocab[t] for t in tokens if t in self.vocab]
+        if not term_ids or not self.passages:
+            return []
+
+        max_idf = float(self.idf.max())
+        query_weight = sum(float(self.idf[self.vocab[t]]) if t in self.vocab else max_idf for t in tokens)
+
+        spans = [(int(self.indptr[t]), int(self.indptr[t + 1])) for t in term_ids]
+        docs = np.concatenate([self.docs[a:b] for a, b in spans])
+        weights = np.concatenate([self.weights[a:b] for a, b in spans])
+        # Which query term each posting belongs to, for the coverage sum below
+        terms = np.repeat(np.arange(len(term_ids)), [b - a for a, b in spans])
+        scores = np.bincount(docs, weights=weights, minlength=len(self.passages))
+        if sources is not None:
+            scores = np.where(np.isin(self.sources, list(sources)), scores, 0.0)
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        hits = []
+        idf = self.idf[term_ids]
+        for j in top:
+            if scores[j] <= 0:
+                break
+            covered = float(idf[terms[docs == j]].sum())
+            passage = self.passages[j]
+            hits.append(SearchHit(float(scores[j]), covered / query_weight, passage["source"], passage["record"]))
+        return hits
+
+
+def hits_as_context(hits: List[SearchHit]) -> str:
+    """Retrieved records as plain text for an LLM prompt"""
+    blocks = []
+    for hit in hits:
+        lines = [f"{key}: {_text(hit.record, key)}" for key in hit.record if key != "id"]
+        blocks.append(f"[{hit.source}]\n" + "\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+def answer_from_passages(query: str, hits: List[SearchHit], *, topic: str, instruction: str,
+                         system: str, label: str) -> str:
+    """
+    Ask the LLM, grounded on whatever was retrieved; empty string if it is unavailable.
+    `topic` names the retrieved passages in the prompt and `label` the tool in failure logs.
+    """
+    client = get_llm_client()
+    if not client.configured:
+        return ""
+    prompt = f"Farmer's question: {query}\n\n"
+    if hits:
+        prompt += f"Possibly relevant {topic} information:\n{hits_as_context(hits)}\n\n"
+    prompt += instruction
+    try:
+        return client.complete(prompt, system=system, max_tokens=500)
+    except LLMError as e:
+        print(f"{label} LLM fallback failed: {e}")
+        return ""
+
+
+def _index_is_stale(index_dir: str = INDEX_DIR) -> bool:
+    """No published build, or one compiled from source files that have changed since"""
+    meta_path = os.path.join(index_dir, "current", "meta.json")
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            built_from = json.load(f).get("sources")
+    except (OSError, ValueError):
+        return True
+    return built_from != _source_mtimes()
+
+
+_index = None
+_index_lock = threading.Lock()
+_watcher = None
+
+
+def get_retrieval_index() -> RetrievalIndex:
+    """Shared index, built on first use if needed (normally at warm-up) and then watched for changes"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                ensure_index()
+                _index = RetrievalIndex()
+                _start_watching()
+    return _index
+
+
+def _start_watching(interval: float = RETRIEVAL_WATCH_INTERVAL):
+    """Poll the sources in a daemon thread; rebuild (once across workers) and swap in the new index"""
+    global _watcher
+    if _watcher and _watcher.is_alive():
+        return
+
+    def watch():
+        global _index
+        while True:
+            time.sleep(interval)
+            try:
+                if _index.source_mtimes != _source_mtimes():
+                    ensure_index()
+                # Also picks up a build published by another worker
+                if os.path.realpath(os.path.join(INDEX_DIR, "current")) != _index.path:
+                    _index = RetrievalIndex()
+                    print(f"Retrieval index reloaded: {len(_index.passages)} passages")
+            except Exception as e:
+                print(f"Retrieval index rebuild failed, keeping the current one: {e}")
+
+    _watcher = threading.Thread(target=watch, name="retrieval-watcher", daemon=True)
+    _watcher.start()
+
+
+def _after_fork_in_child():
+    # The parent's watcher thread does not exist in a forked worker
+    global _index_lock
+    _index_lock = threading.Lock()
+    if _index is not None:
+        _start_watching()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        print(f"Indexed {build_index()} passages into {INDEX_DIR}")
+    else:
+        print("Usage: python -m utils.retrieval build")
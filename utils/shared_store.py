@@ -0,0 +1,131 @@
+# utils/shared_store.py
+"""
+Key-value store shared by all worker processes on one host.
+
+A SQLite file in WAL mode: readers never block the single writer, and every
+worker sees the others' writes immediately. Values are JSON, with an optional
+expiry. Enabled by setting SHARED_STORE_PATH (gunicorn.conf.py does this for
+the multi-worker mode); without it get_shared_store() returns None and
+callers keep their state in-process.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+SHARED_STORE_PATH = os.getenv("SHARED_STORE_PATH")
+# How often expired rows are deleted, in seconds
+SHARED_STORE_PURGE_INTERVAL = float(os.getenv("SHARED_STORE_PURGE_INTERVAL", 300))
+
+
+def _like_prefix(prefix: str) -> str:
+    """LIKE pattern (with ESCAPE '\\') matching keys that start with the prefix"""
+    return prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+class SharedStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._inherited = []
+        self._last_purge = 0.0
+        conn = self.connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS kv_expires ON kv (expires_at)")
+
+    def connection(self) -> sqlite3.Connection:
+        """Connection for this thread in this process (SQLite handles must not cross a fork)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            if conn is not None:
+                # Never close a handle inherited from the parent: closing it would drop
+                # this process's POSIX locks on the database file
+                self._inherited.append(conn)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """
+        Hold the write lock for a read-modify-write: get/set calls made by this
+        thread inside the block see and commit one consistent state. Nested
+        blocks join the outer transaction.
+        """
+        conn = self.connection()
+        if conn.in_transaction:
+            yield
+            return
+        # IMMEDIATE takes the write lock up front, so other workers wait instead of interleaving
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        row = self.connection().execute(
+            "SELECT value, expires_at FROM kv WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return default
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.time() + ttl if ttl else None
+        self.connection().execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False, separators=(",", ":")), expires_at),
+        )
+        self._maybe_purge()
+
+    def delete(self, key: str):
+        self.connection().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def delete_prefix(self, prefix: str) -> int:
+        cursor = self.connection().execute("DELETE FROM kv WHERE key LIKE ? ESCAPE '\\'", (_like_prefix(prefix),))
+        return cursor.rowcount
+
+    def count_prefix(self, prefix: str) -> int:
+        return self.connection().execute(
+            "SELECT COUNT(*) FROM kv WHERE key LIKE ? ESCAPE '\\' AND (expires_at IS NULL OR expires_at > ?)",
+            (_like_prefix(prefix), time.time()),
+        ).fetchone()[0]
+
+    def items_prefix(self, prefix: str) -> Dict[str, Any]:
+        """Unexpired values whose key starts with the prefix, by key"""
+        rows = self.connection().execute(
+            "SELECT key, value FROM kv WHERE key LIKE ? ESCAPE '\\' AND (expires_at IS NULL OR expires_at > ?)",
+            (_like_prefix(prefix), time.time()),
+        ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def _maybe_purge(self):
+        now = time.time()
+        if now - self._last_purge < SHARED_STORE_PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        self.connection().execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_shared_store() -> Optional[SharedStore]:
+    """The host-wide store, or None when running as a single process"""
+    global _store
+    if _store is None and SHARED_STORE_PATH:
+        with _store_lock:
+            if _store is None:
+                _store = SharedStore(SHARED_STORE_PATH)
+    return _store
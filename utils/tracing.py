@@ -0,0 +1,333 @@
+# utils/tracing.py
+"""
+Request-scoped tracing and Prometheus-style metrics.
+
+TracingMiddleware gives every HTTP request an id (X-Request-ID) held in a
+context variable. `span("stage")` / `@traced("stage")` time a pipeline stage,
+record it in the per-stage latency histogram and, for sampled requests, in the
+request's span list, which is dumped as one JSON line when the request ends.
+GET /metrics renders all histograms and counters in the Prometheus text format,
+combined over all workers in multi-worker mode (see utils/worker_stats.py).
+
+    TRACE_SAMPLE_RATE   share of requests whose spans are dumped (default 0)
+    TRACE_SLOW_SECONDS  always dump requests slower than this (default off)
+    TRACE_DUMP_PATH     JSON-lines file for dumps (default: the log)
+"""
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from utils.worker_stats import register_stats, collect_stats, multi_worker
+
+logger = logging.getLogger("agri.trace")
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0))
+TRACE_SLOW_SECONDS = float(os.getenv("TRACE_SLOW_SECONDS", 0))
+TRACE_DUMP_PATH = os.getenv("TRACE_DUMP_PATH")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+# Span list of the current request when it is being recorded, else None
+_spans: contextvars.ContextVar[Optional[List[Dict]]] = contextvars.ContextVar("spans", default=None)
+_parent: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("parent_span", default=None)
+
+
+def get_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+# ---------- metrics ----------
+
+def _label_text(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    kind = "counter"
+    # Gauges are per-process readings, so across workers each keeps its own series instead of a sum
+    per_worker = False
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def state(self) -> List:
+        with self._lock:
+            return [[list(values), total] for values, total in self._values.items()]
+
+    def render(self, states: Optional[Dict[str, List]] = None) -> List[str]:
+        """This process's series, or those of every worker's state (by pid) combined"""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        names = self.labels
+        if states is None:
+            with self._lock:
+                merged = dict(self._values)
+        elif self.per_worker:
+            names = self.labels + ("worker",)
+            merged = {(*values, pid): total for pid, series in states.items() for values, total in series}
+        else:
+            merged = {}
+            for series in states.values():
+                for values, total in series:
+                    merged[tuple(values)] = merged.get(tuple(values), 0.0) + total
+        for values, total in sorted(merged.items()):
+            lines.append(f"{self.name}{_label_text(names, values)} {total:g}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+    per_worker = True
+
+    def set(self, *label_values: str, value: float):
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help_text, tuple(labels), tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def state(self) -> List:
+        with self._lock:
+            return [[list(values), list(counts), total, count]
+                    for values, (counts, total, count) in self._series.items()]
+
+    def render(self, states: Optional[Dict[str, List]] = None) -> List[str]:
+        """This process's series, or the sum of every worker's state (by pid)"""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        if states is None:
+            with self._lock:
+                merged = {values: (list(counts), total, count)
+                          for values, (counts, total, count) in self._series.items()}
+        else:
+            merged = {}
+            for series in states.values():
+                for values, counts, total, count in series:
+                    summed = merged.get(tuple(values))
+                    if summed is not None:
+                        counts = [a + b for a, b in zip(summed[0], counts)]
+                        total, count = total + summed[1], count + summed[2]
+                    merged[tuple(values)] = (counts, total, count)
+        for values, (counts, total, count) in sorted(merged.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="%g"' % bound
+                lines.append(f"{self.name}_bucket{_label_text(self.labels, values, le)} {cumulative}")
+            inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_label_text(self.labels, values, inf)} {count}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, values)} {total:.6f}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, values)} {count}")
+        return lines
+
+
+_registry: List = []
+
+
+def counter(name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+    metric = Counter(name, help_text, labels)
+    _registry.append(metric)
+    return metric
+
+
+def gauge(name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+    metric = Gauge(name, help_text, labels)
+    _registry.append(metric)
+    return metric
+
+
+def histogram(name: str, help_text: str, labels: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+    metric = Histogram(name, help_text, labels, buckets)
+    _registry.append(metric)
+    return metric
+
+
+def _metrics_state() -> Dict[str, List]:
+    return {metric.name: metric.state() for metric in _registry}
+
+
+register_stats("metrics", _metrics_state)
+
+
+def render_metrics() -> str:
+    """
+    Every metric in the Prometheus text format. In multi-worker mode counters and
+    histograms are summed over the live workers and gauges carry a worker label.
+    """
+    by_worker = collect_stats("metrics") if multi_worker() else None
+    lines = []
+    for metric in _registry:
+        states = None if by_worker is None else {pid: state.get(metric.name, []) for pid, state in by_worker.items()}
+        lines.extend(metric.render(states))
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_LATENCY = histogram("agri_http_request_duration_seconds", "HTTP request latency", ("method", "route"))
+REQUESTS = counter("agri_http_requests_total", "HTTP requests by status", ("method", "route", "status"))
+STAGE_LATENCY = histogram("agri_stage_duration_seconds", "Pipeline stage latency", ("stage",))
+STAGE_ERRORS = counter("agri_stage_errors_total", "Pipeline stages that raised", ("stage",))
+
+
+# ---------- spans ----------
+
+@contextmanager
+def span(stage: str, **attrs):
+    """Time a pipeline stage (also works in worker threads that copied the request context)"""
+    spans = _spans.get()
+    parent = _parent.get()
+    span_id = uuid.uuid4().hex[:8] if spans is not None else None
+    token = _parent.set(span_id) if span_id else None
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        STAGE_ERRORS.inc(stage)
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        STAGE_LATENCY.observe(duration, stage)
+        if token is not None:
+            _parent.reset(token)
+        if spans is not None:
+            spans.append({
+                "id": span_id,
+                "parent": parent,
+                "stage": stage,
+                "start_ms": round((started - spans.started) * 1000, 2),
+                "duration_ms": round(duration * 1000, 2),
+                "thread": threading.current_thread().name,
+                **({"error": error} if error else {}),
+                **attrs,
+            })
+
+
+class _SpanList(list):
+    """Span list that remembers when its request started"""
+
+    def __init__(self, started: float):
+        super().__init__()
+        self.started = started
+
+
+def traced(stage: str):
+    """Decorator form of span() for sync and async functions"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def in_context(func):
+    """Bind func to the current request context, for executors that do not copy it"""
+    context = contextvars.copy_context()
+    return functools.partial(context.run, func)
+
+
+def _dump(record: Dict):
+    line = json.dumps(record, ensure_ascii=False)
+    if TRACE_DUMP_PATH:
+        with open(TRACE_DUMP_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    else:
+        logger.info(line)
+
+
+# ---------- middleware ----------
+
+class TracingMiddleware:
+    """ASGI middleware: request id, request latency/status metrics and sampled span dumps"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")[:64] or uuid.uuid4().hex[:16]
+        sampled = random.random() < TRACE_SAMPLE_RATE
+        started = time.perf_counter()
+        # Slow requests are only known at the end, so with a slow threshold every request records spans
+        spans = _SpanList(started) if sampled or TRACE_SLOW_SECONDS > 0 else None
+
+        id_token = _request_id.set(request_id)
+        spans_token = _spans.set(spans)
+        status = {"code": 500}
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            duration = time.perf_counter() - started
+            route = scope.get("route")
+            # Requests that never reached a route (404s, and 413/429/503 from middleware) share one label,
+            # so client-chosen paths cannot grow the metric series without bound
+            route_path = getattr(route, "path", None) or "unmatched"
+            REQUEST_LATENCY.observe(duration, scope["method"], route_path)
+            REQUESTS.inc(scope["method"], route_path, str(status["code"]))
+
+            slow = TRACE_SLOW_SECONDS > 0 and duration >= TRACE_SLOW_SECONDS
+            if spans is not None and (sampled or slow):
+                _dump({
+                    "request_id": request_id,
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status["code"],
+                    "duration_ms": round(duration * 1000, 2),
+                    "spans": sorted(spans, key=lambda s: s["start_ms"]),
+                })
+            _spans.reset(spans_token)
+            _request_id.reset(id_token)
@@ -1,7 +1,216 @@
 from deep_translator import GoogleTranslator
+from deep_translator import google as deep_translator_google
+from deep_translator.constants import BASE_URLS
+from deep_translator.exceptions import RequestError, TooManyRequests
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Tuple
+import atexit
+import fcntl
+import hashlib
+import json
+import os
 import re
+import threading
+import time
 
+import requests
 
+from utils.tracing import traced
+from utils.upstream_health import upstream_available
+from utils.resilience import get_upstream, UpstreamUnavailable, TRANSLATE_TIMEOUT
+from utils.shared_store import get_shared_store
+
+# Point deep_translator at another Google Translate endpoint (the load-test fakes)
+GOOGLE_TRANSLATE_URL = os.getenv("GOOGLE_TRANSLATE_URL")
+if GOOGLE_TRANSLATE_URL:
+    BASE_URLS["GOOGLE_TRANSLATE"] = GOOGLE_TRANSLATE_URL
+
+
+class _RequestsWithTimeout:
+    """
+    The requests module as deep_translator sees it, with a default socket timeout:
+    it passes none, so an abandoned call would otherwise hold its upstream thread
+    for as long as the connection hangs.
+    """
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+    @staticmethod
+    def get(*args, timeout=None, **kwargs):
+        return requests.get(*args, timeout=timeout or TRANSLATE_TIMEOUT, **kwargs)
+
+
+deep_translator_google.requests = _RequestsWithTimeout()
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+GLOSSARY_PATH = os.path.join(DATA_DIR, "offline_glossary.json")
+# Static-text translations are kept on disk, so templates stay translated offline after a restart:
+# one row per entry in the shared store when there is one, else merged into this file
+TRANSLATION_CACHE_PATH = os.getenv("TRANSLATION_CACHE_PATH", os.path.join(DATA_DIR, "translation_cache.json"))
+# New entries are written to the file at most this often (and at exit)
+TRANSLATION_CACHE_FLUSH_SECONDS = float(os.getenv("TRANSLATION_CACHE_FLUSH_SECONDS", 5))
+
+# Failures that mean Google Translate could not be reached (not that the text was odd)
+_NETWORK_ERRORS = (requests.RequestException, RequestError, TooManyRequests)
+# ... plus the circuit breaker failing fast or the call running past its deadline
+_UNREACHABLE = _NETWORK_ERRORS + (UpstreamUnavailable,)
+
+# Cache of successful translations of static text, keyed by (text, language)
+_translation_cache: Dict[Tuple[str, str], str] = {}
+_translation_cache_lock = threading.Lock()
+_translation_cache_loaded = False
+# Entries not yet merged into TRANSLATION_CACHE_PATH
+_unsaved: Dict[Tuple[str, str], str] = {}
+_last_flush = 0.0
+
+
+def _read_cache_file() -> Dict[str, Dict[str, str]]:
+    try:
+        with open(TRANSLATION_CACHE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _load_translation_cache():
+    global _translation_cache_loaded
+    if _translation_cache_loaded:
+        return
+    with _translation_cache_lock:
+        if _translation_cache_loaded:
+            return
+        for lang, entries in _read_cache_file().items():
+            for text, translated in entries.items():
+                _translation_cache.setdefault((text, lang), translated)
+        _translation_cache_loaded = True
+
+
+def _store_key(text: str, lang: str) -> str:
+    return f"translation:{lang}:" + hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _remember(entries: Dict[Tuple[str, str], str]):
+    """Cache new translations in memory and persist them"""
+    with _translation_cache_lock:
+        _translation_cache.update(entries)
+    store = get_shared_store()
+    if store:
+        # One row per entry, so workers never overwrite each other's translations
+        with store.transaction():
+            for (text, lang), translated in entries.items():
+                store.set(_store_key(text, lang), translated)
+        return
+    with _translation_cache_lock:
+        _unsaved.update(entries)
+    _flush_translation_cache()
+
+
+def _flush_translation_cache(force: bool = False):
+    """
+    Merge unsaved entries into the cache file, keeping whatever other processes
+    wrote there since, and adopt their entries too. Batched: at most once per
+    TRANSLATION_CACHE_FLUSH_SECONDS unless forced.
+    """
+    global _last_flush
+    with _translation_cache_lock:
+        if not _unsaved or (not force and time.monotonic() - _last_flush < TRANSLATION_CACHE_FLUSH_SECONDS):
+            return
+        pending = dict(_unsaved)
+        _unsaved.clear()
+        _last_flush = time.monotonic()
+
+    tmp_path = f"{TRANSLATION_CACHE_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        # The lock file serialises read-merge-replace across processes
+        with open(f"{TRANSLATION_CACHE_PATH}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            by_lang = _read_cache_file()
+            for (text, lang), translated in pending.items():
+                by_lang.setdefault(lang, {})[text] = translated
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(by_lang, f, ensure_ascii=False)
+            os.replace(tmp_path, TRANSLATION_CACHE_PATH)
+    except OSError as e:
+        print(f"Could not save translation cache: {e}")
+        with _translation_cache_lock:
+            for key, translated in pending.items():
+                _unsaved.setdefault(key, translated)
+        return
+
+    with _translation_cache_lock:
+        for lang, entries in by_lang.items():
+            for text, translated in entries.items():
+                _translation_cache.setdefault((text, lang), translated)
+
+
+atexit.register(_flush_translation_cache, force=True)
+
+
+def _translate(text: str, source: str, target: str) -> str:
+    """One Google Translate call through the circuit breaker, hedged (a GET is safe to repeat)"""
+    # A translator per copy: translate() mutates the instance's request parameters
+    return get_upstream("translate").call(
+        lambda: GoogleTranslator(source=source, target=target).translate(text),
+        hedge=True, failures=_NETWORK_ERRORS,
+    )
+
+
+@lru_cache(maxsize=None)
+def _glossary() -> Tuple[Tuple[str, str], ...]:
+    """(local term, English keywords), longest terms first"""
+    with open(GLOSSARY_PATH, encoding="utf-8") as f:
+        data = json.load(f)
+    terms = {term: english for lang, entries in data.items() if not lang.startswith("_")
+             for term, english in entries.items()}
+    return tuple(sorted(terms.items(), key=lambda item: len(item[0]), reverse=True))
+
+
+def gloss_to_english(text: str) -> str:
+    """
+    Offline stand-in for translate_to_english: the English keywords of the
+    glossary terms in the text, in order, plus the place it names. Enough for
+    the intent router and the tools; text with no known term is returned as is.
+    """
+    if not (contains_telugu(text) or contains_hindi(text)):
+        return text
+
+    found = []
+    remaining = text
+    for term, english in _glossary():
+        position = remaining.find(term)
+        while position != -1:
+            found.append((position, english))
+            # Blank the match out so the words inside a longer phrase are not counted again
+            remaining = remaining[:position] + " " * len(term) + remaining[position + len(term):]
+            position = remaining.find(term)
+    words = [english for _, english in sorted(found)]
+
+    try:
+        from data.district_index import get_district_index
+        place = get_district_index().find_in_text(text)
+    except Exception:
+        place = None
+    if place:
+        words.append(f"in {place['name']}")
+    return " ".join(words) if words else text
+
+
+def cached_translation(text: str, target_lang: str) -> Optional[str]:
+    """A stored translation of static text, without any network call"""
+    _load_translation_cache()
+    translated = _translation_cache.get((text, target_lang))
+    if translated is None:
+        # Another worker may have translated it
+        store = get_shared_store()
+        translated = store.get(_store_key(text, target_lang)) if store else None
+        if translated is not None:
+            with _translation_cache_lock:
+                _translation_cache[(text, target_lang)] = translated
+    return translated
+
+
+@traced("translate.detect")
 def detect_language(text: str) -> str:
     """
     Enhanced language detection with better support for Indian languages
@@ -15,6 +224,10 @@ def detect_language(text: str) -> str:
         if contains_hindi(text):
             return 'hi'
 
+        # Latin script: without Google the best offline guess is English
+        if not upstream_available("translate"):
+            return 'en'
+
         # Fall back to Google Translator detection
         detected = GoogleTranslator(source='auto', target='en').detect(text)
 
@@ -54,14 +267,21 @@ def contains_hindi(text: str) -> bool:
     return bool(hindi_pattern.search(text))
 
 
+@traced("translate.to_english")
 def translate_to_english(text: str) -> str:
+    if not upstream_available("translate"):
+        return gloss_to_english(text)
     try:
-        return GoogleTranslator(source='auto', target='en').translate(text)
+        return _translate(text, 'auto', 'en')
+    except _UNREACHABLE as e:
+        print(f"Translation error: {e}")
+        return gloss_to_english(text)
     except Exception as e:
         print(f"Translation error: {e}")
         return text  # Return original text if translation fails
 
 
+@traced("translate.to_local")
 def translate_to_local(text: str, target_lang: str) -> str:
     try:
         # Ensure we have a valid target language code
@@ -78,7 +298,70 @@ def translate_to_local(text: str, target_lang: str) -> str:
         }
 
         target_code = lang_mapping.get(target_lang, target_lang)
-        return GoogleTranslator(source='en', target=target_code).translate(text)
+        if not upstream_available("translate"):
+            # Only pre-translated templates can be localised offline
+            return cached_translation(text, target_code) or text
+        try:
+            return _translate(text, 'en', target_code)
+        except _UNREACHABLE:
+            return cached_translation(text, target_code) or text
     except Exception as e:
         print(f"Translation error to {target_lang}: {e}")
         return text  # Return original text if translation fails
+
+
+def translate_cached(text: str, target_lang: str) -> str:
+    """
+    Translate static English text (labels, templates) with a per-language cache.
+    Only successful translations are cached, so a failed call is retried next time.
+    """
+    if not text or target_lang == 'en':
+        return text
+
+    key = (text, target_lang)
+    cached = cached_translation(text, target_lang)
+    if cached is not None:
+        return cached
+    if not upstream_available("translate"):
+        return text
+
+    try:
+        translated = _translate(text, 'en', target_lang)
+    except Exception as e:
+        print(f"Translation error to {target_lang}: {e}")
+        return text
+
+    if translated:
+        _remember({key: translated})
+        return translated
+    return text
+
+
+def pretranslate(texts: Iterable[str], target_lang: str) -> int:
+    """
+    Fill the translation cache for a set of static texts in one batch call.
+    Returns the number of newly cached translations.
+    """
+    if target_lang == 'en':
+        return 0
+
+    pending = [t for t in dict.fromkeys(texts) if t and cached_translation(t, target_lang) is None]
+    if not pending or not upstream_available("translate"):
+        return 0
+
+    try:
+        # One request per text: the deadline grows with the batch, and no hedging
+        translated = get_upstream("translate").call(
+            GoogleTranslator(source='en', target=target_lang).translate_batch, pending,
+            timeout=TRANSLATE_TIMEOUT * len(pending), failures=_NETWORK_ERRORS,
+        )
+    except Exception as e:
+        print(f"Batch translation error to {target_lang}: {e}")
+        return 0
+
+    entries = {(original, target_lang): result for original, result in zip(pending, translated) if result}
+    if entries:
+        _remember(entries)
+        # A batch is already one write; do not leave it waiting for the next flush
+        _flush_translation_cache(force=True)
+    return len(entries)
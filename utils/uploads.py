@@ -0,0 +1,190 @@
+# utils/uploads.py
+import base64
+import json
+import os
+from typing import Callable, Optional, Tuple
+
+from fastapi import UploadFile
+
+# Upper bound for any single upload (image or audio), in bytes
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 10 * 1024 * 1024))
+
+# Largest non-multipart request body (JSON with base64 audio/images): a base64-encoded
+# MAX_UPLOAD_BYTES payload plus the other fields
+MAX_JSON_BODY_BYTES = int(os.getenv("MAX_JSON_BODY_BYTES", 4 * ((MAX_UPLOAD_BYTES + 2) // 3) * 1.02 + 64 * 1024))
+
+# Size of each read from the spooled upload
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Bytes needed by the format sniffers below
+SNIFF_BYTES = 16
+
+
+class UploadTooLarge(Exception):
+    """Raised as soon as an upload crosses the configured size limit."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        super().__init__(f"Upload exceeds the {limit} byte limit")
+
+
+class UnsupportedUploadFormat(Exception):
+    """Raised when the leading bytes don't match any accepted format."""
+
+
+def detect_image_format_from_bytes(b: bytes) -> Optional[str]:
+    """Detect image format from file signature (magic numbers)"""
+    if len(b) < 12:
+        return None
+    if b[:3] == b'\xFF\xD8\xFF':
+        return 'jpeg'
+    if b[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'png'
+    if b[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if b[:4] == b'RIFF' and b[8:12] == b'WEBP':
+        return 'webp'
+    if b[:2] == b'BM':
+        return 'bmp'
+    if b[:4] in (b'II*\x00', b'MM\x00*'):
+        return 'tiff'
+    return None
+
+
+async def read_upload(
+        file: UploadFile,
+        max_bytes: int = MAX_UPLOAD_BYTES,
+        sniff: Optional[Callable[[bytes], Optional[str]]] = None,
+        require_format: bool = False
+) -> Tuple[bytes, Optional[str]]:
+    """
+    Read an upload in chunks, stopping as soon as it crosses max_bytes.
+    The first chunk is passed to `sniff` to detect the format; with
+    require_format=True an unrecognised header is rejected before the
+    rest of the body is read.
+    Returns: (data, detected_format)
+    """
+    # Reject up front when the client told us the size
+    if file.size is not None and file.size > max_bytes:
+        raise UploadTooLarge(max_bytes)
+
+    buffer = bytearray()
+    fmt = None
+    sniffed = sniff is None
+
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+
+        if len(buffer) + len(chunk) > max_bytes:
+            raise UploadTooLarge(max_bytes)
+        buffer += chunk
+
+        if not sniffed and len(buffer) >= SNIFF_BYTES:
+            fmt = sniff(bytes(buffer[:SNIFF_BYTES]))
+            sniffed = True
+            if fmt is None and require_format:
+                raise UnsupportedUploadFormat("Unrecognised file format")
+
+    # Very small uploads never reach SNIFF_BYTES
+    if not sniffed:
+        fmt = sniff(bytes(buffer))
+        if fmt is None and require_format:
+            raise UnsupportedUploadFormat("Unrecognised file format")
+
+    return bytes(buffer), fmt
+
+
+def max_base64_length(max_bytes: int = MAX_UPLOAD_BYTES) -> int:
+    """Length of the base64 encoding of a max_bytes payload"""
+    return 4 * ((max_bytes + 2) // 3)
+
+
+def decode_base64_limited(data: str, max_bytes: int = MAX_UPLOAD_BYTES) -> bytes:
+    """Decode base64 audio/image data, rejecting oversized payloads before decoding"""
+    # Allow for whitespace/newlines some clients insert
+    if len(data) > max_base64_length(max_bytes) + len(data) // 76 + 4:
+        raise UploadTooLarge(max_bytes)
+
+    decoded = base64.b64decode(data)
+    if len(decoded) > max_bytes:
+        raise UploadTooLarge(max_bytes)
+    return decoded
+
+
+class JSONBodyLimitMiddleware:
+    """
+    ASGI middleware capping request bodies (base64 audio in /voice/ask) before
+    FastAPI reads and parses them: a declared Content-Length over the limit is
+    refused at once, and a body that streams past it is cut off and answered
+    with 413. Every body is capped whatever its content type (FastAPI parses
+    application/vnd.api+json, Application/JSON and the like as JSON too),
+    except multipart uploads, which read_upload limits per file instead.
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_JSON_BODY_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        media_type = headers.get(b"content-type", b"").split(b";", 1)[0].strip().lower()
+        if media_type.startswith(b"multipart/"):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            declared = int(headers.get(b"content-length", b"0"))
+        except ValueError:
+            declared = 0
+        if declared > self.max_bytes:
+            await self._reject(send)
+            return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            if exceeded:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Stop reading; whatever the app answers is replaced by the 413 below
+                    exceeded = True
+                    raise UploadTooLarge(self.max_bytes)
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if exceeded:
+                if message["type"] == "http.response.start" and not response_started:
+                    response_started = True
+                    await self._reject(send)
+                return
+            response_started = response_started or message["type"] == "http.response.start"
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except UploadTooLarge:
+            if not response_started:
+                await self._reject(send)
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": f"Request body too large. Please keep uploads under "
+                                     f"{MAX_UPLOAD_BYTES // (1024 * 1024)}MB."}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode("latin-1"))],
+        })
+        await send({"type": "http.response.body", "body": body})
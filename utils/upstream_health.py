@@ -0,0 +1,244 @@
+# utils/upstream_health.py
+"""
+Reachability of the upstream services, and the offline mode built on it.
+
+A daemon thread probes each upstream (Groq, Google Translate, Google STT,
+gTTS, weatherapi.com) with a short GET; any HTTP answer below 500 counts as
+reachable. Call sites also report their own outcomes, so a dead upstream is
+marked down after a couple of failed calls without waiting for the next probe.
+
+While an upstream is down, the code that depends on it switches to its local
+stand-in instead of waiting for a timeout on every request:
+
+    groq       intent router + deterministic tools, retrieval FAQ answers
+    translate  script-based language detection, offline glossary, cached templates
+    stt        local recognition (Whisper if installed, else Sphinx)
+    tts        text-only answers
+    weather    last cached forecast, else the district's seasonal normals
+
+    OFFLINE_MODE            "auto" (default, follow the probes), "on" (always local), "off" (never)
+    OFFLINE_PROBE_INTERVAL  seconds between probes while everything is up (default 30)
+    OFFLINE_RECHECK_INTERVAL  seconds between probes while something is down (default 5)
+    OFFLINE_PROBE_TIMEOUT   per-probe timeout in seconds (default 2)
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+from utils.tracing import counter, gauge
+
+OFFLINE_MODE = os.getenv("OFFLINE_MODE", "auto").strip().lower()
+OFFLINE_PROBE_INTERVAL = float(os.getenv("OFFLINE_PROBE_INTERVAL", 30))
+OFFLINE_RECHECK_INTERVAL = float(os.getenv("OFFLINE_RECHECK_INTERVAL", 5))
+OFFLINE_PROBE_TIMEOUT = float(os.getenv("OFFLINE_PROBE_TIMEOUT", 2))
+# Consecutive failed calls that mark an upstream down before the next probe
+FAILURE_THRESHOLD = 2
+
+UPSTREAM_UP = gauge("agri_upstream_up", "1 while the upstream is reachable, 0 while local fallbacks are used",
+                    ("upstream",))
+TRANSITIONS = counter("agri_upstream_transitions_total", "Upstream reachability changes", ("upstream", "state"))
+
+
+def _groq_url() -> str:
+    from utils.llm_client import GROQ_BASE_URL
+    return f"{GROQ_BASE_URL}/models"
+
+
+def _translate_url() -> str:
+    from deep_translator.constants import BASE_URLS
+    import utils.translator  # noqa: F401  (applies GOOGLE_TRANSLATE_URL)
+    return BASE_URLS["GOOGLE_TRANSLATE"]
+
+
+def _stt_url() -> str:
+    from utils.voice_utils_simple import GOOGLE_STT_ENDPOINT
+    return GOOGLE_STT_ENDPOINT or "http://www.google.com/speech-api/v2/recognize"
+
+
+def _tts_url() -> str:
+    from utils.voice_utils_simple import GOOGLE_TTS_URL
+    return GOOGLE_TTS_URL or "https://translate.google.com"
+
+
+def _weather_url() -> str:
+    from tools.weather import WEATHER_API_URL
+    return WEATHER_API_URL
+
+
+PROBE_TARGETS: Dict[str, Callable[[], str]] = {
+    "groq": _groq_url,
+    "translate": _translate_url,
+    "stt": _stt_url,
+    "tts": _tts_url,
+    "weather": _weather_url,
+}
+
+
+@dataclass(slots=True)
+class UpstreamState:
+    name: str
+    up: bool = True
+    failures: int = 0
+    changed_at: float = 0.0
+    checked_at: Optional[float] = None
+    last_error: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "up": self.up,
+            "since": round(self.changed_at, 3),
+            "checked_at": round(self.checked_at, 3) if self.checked_at else None,
+            "last_error": self.last_error,
+        }
+
+
+class UpstreamHealth:
+    def __init__(self, targets: Dict[str, Callable[[], str]] = PROBE_TARGETS, mode: str = OFFLINE_MODE):
+        self.targets = targets
+        self.mode = mode
+        now = time.time()
+        # Optimistic until the first probe: never start a replica in offline mode by accident
+        self._states = {name: UpstreamState(name, changed_at=now) for name in targets}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._prober: Optional[threading.Thread] = None
+        for name in targets:
+            UPSTREAM_UP.set(name, value=1)
+
+    def available(self, name: str) -> bool:
+        """Whether calls to this upstream should be attempted at all"""
+        if self.mode == "on":
+            return False
+        if self.mode == "off":
+            return True
+        self.start()
+        state = self._states.get(name)
+        return state is None or state.up
+
+    def _set(self, state: UpstreamState, up: bool, error: Optional[str] = None):
+        """Record an observation; caller holds the lock"""
+        state.last_error = error if not up else state.last_error
+        if state.up == up:
+            return
+        state.up, state.changed_at = up, time.time()
+        UPSTREAM_UP.set(state.name, value=int(up))
+        TRANSITIONS.inc(state.name, "up" if up else "down")
+        if up:
+            print(f"Upstream {state.name} is reachable again")
+        else:
+            print(f"Upstream {state.name} is unreachable ({error}); using local fallbacks")
+
+    def report_success(self, name: str):
+        with self._lock:
+            state = self._states.get(name)
+            if state is not None:
+                state.failures = 0
+                self._set(state, True)
+
+    def report_failure(self, name: str, error: Exception):
+        with self._lock:
+            state = self._states.get(name)
+            if state is None:
+                return
+            state.failures += 1
+            if state.failures >= FAILURE_THRESHOLD:
+                self._set(state, False, f"{type(error).__name__}: {error}")
+                # Probe again soon, so recovery is noticed quickly
+                self._wake.set()
+
+    def _probe(self, name: str) -> Optional[str]:
+        """None if the upstream answered, else the error"""
+        try:
+            response = httpx.get(self.targets[name](), timeout=OFFLINE_PROBE_TIMEOUT)
+        except Exception as e:
+            return f"{type(e).__name__}: {e}"
+        return f"HTTP {response.status_code}" if response.status_code >= 500 else None
+
+    def probe_once(self):
+        """Probe every upstream concurrently and record the results"""
+        with ThreadPoolExecutor(max_workers=len(self.targets), thread_name_prefix="upstream-probe") as executor:
+            results = dict(zip(self.targets, executor.map(self._probe, self.targets)))
+        now = time.time()
+        with self._lock:
+            for name, error in results.items():
+                state = self._states[name]
+                state.checked_at = now
+                if error is None:
+                    state.failures = 0
+                self._set(state, error is None, error)
+
+    def start(self):
+        """Start the probe thread (once per process)"""
+        if self.mode != "auto" or (self._prober and self._prober.is_alive()):
+            return
+        with self._lock:
+            if self._prober and self._prober.is_alive():
+                return
+
+            def run():
+                while True:
+                    try:
+                        self.probe_once()
+                    except Exception as e:
+                        print(f"Upstream probe failed: {e}")
+                    interval = OFFLINE_PROBE_INTERVAL if self.all_up else OFFLINE_RECHECK_INTERVAL
+                    self._wake.wait(interval)
+                    self._wake.clear()
+
+            self._prober = threading.Thread(target=run, name="upstream-prober", daemon=True)
+            self._prober.start()
+
+    @property
+    def all_up(self) -> bool:
+        return all(state.up for state in self._states.values())
+
+    def down(self) -> List[str]:
+        """Upstreams currently served by local fallbacks"""
+        return [name for name in self.targets if not self.available(name)]
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            upstreams = {name: state.to_dict() for name, state in self._states.items()}
+        return {"mode": self.mode, "offline": self.down(), "upstreams": upstreams}
+
+
+_health = None
+_health_lock = threading.Lock()
+
+
+def get_upstream_health() -> UpstreamHealth:
+    global _health
+    if _health is None:
+        with _health_lock:
+            if _health is None:
+                _health = UpstreamHealth()
+    return _health
+
+
+def upstream_available(name: str) -> bool:
+    return get_upstream_health().available(name)
+
+
+def report_success(name: str):
+    get_upstream_health().report_success(name)
+
+
+def report_failure(name: str, error: Exception):
+    get_upstream_health().report_failure(name, error)
+
+
+def _after_fork_in_child():
+    # The parent's probe thread does not exist in a forked worker; start() makes a new one
+    global _health_lock
+    _health_lock = threading.Lock()
+    if _health is not None:
+        _health._lock = threading.Lock()
+        _health._prober = None
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
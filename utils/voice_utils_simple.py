@@ -1,22 +1,40 @@
 # utils/voice_utils_simple.py
-import speech_recognition as sr
-from gtts import gTTS
+"""
+Speech-to-text, text-to-speech and audio decoding.
+
+The audio stack (pydub + ffmpeg, SpeechRecognition, gTTS, langdetect and
+Whisper, which pulls in torch) is imported on first use, or by warm_up(), so
+importing this module costs nothing for text-only requests.
+"""
 import io
 import base64
+import importlib.util
 import tempfile
 import os
-from pydub import AudioSegment
-import numpy as np
-from typing import Tuple, Optional, List
+import threading
+from functools import lru_cache
+from typing import Tuple, Optional, List, TYPE_CHECKING
 import logging
 import subprocess
-import whisper
-from langdetect import detect, LangDetectException
+
+from utils.rate_limit import charge_current
+from utils.tracing import span, traced
+from utils.upstream_health import upstream_available, report_success, report_failure
+from utils.resilience import get_upstream, CircuitOpen, UpstreamUnavailable, STT_TIMEOUT
+
+if TYPE_CHECKING:
+    from pydub import AudioSegment
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+# Alternative Google speech endpoints (the load-test fakes); unset means the real services
+GOOGLE_STT_ENDPOINT = os.getenv("GOOGLE_STT_ENDPOINT")
+GOOGLE_TTS_URL = os.getenv("GOOGLE_TTS_URL")
+
+
 # Check if ffmpeg is available
 def check_ffmpeg():
     try:
@@ -25,10 +43,13 @@ def check_ffmpeg():
     except (subprocess.CalledProcessError, FileNotFoundError):
         return False
 
-# Only set ffmpeg paths if ffmpeg is available
-if check_ffmpeg():
-    logger.info("FFmpeg found in PATH")
-else:
+
+def _configure_ffmpeg(audio_segment_cls):
+    """Point pydub at ffmpeg, looking in common install locations if it is not on PATH"""
+    if check_ffmpeg():
+        logger.info("FFmpeg found in PATH")
+        return
+
     # Try to find ffmpeg in common locations
     possible_paths = [
         "C:\\ffmpeg\\bin\\",
@@ -36,31 +57,87 @@ else:
         "C:\\Users\\ujvsp\\Downloads\\ffmpeg-7.1.1-essentials_build\\ffmpeg-7.1.1-essentials_build\\bin\\",
         os.path.join(os.path.dirname(__file__), "..", "..", "ffmpeg", "bin")
     ]
-    
-    ffmpeg_found = False
+
     for path in possible_paths:
         if os.path.exists(os.path.join(path, "ffmpeg.exe")):
-            AudioSegment.converter = os.path.join(path, "ffmpeg.exe")
-            AudioSegment.ffprobe = os.path.join(path, "ffprobe.exe")
+            audio_segment_cls.converter = os.path.join(path, "ffmpeg.exe")
+            audio_segment_cls.ffprobe = os.path.join(path, "ffprobe.exe")
             logger.info(f"Using ffmpeg from: {path}")
-            ffmpeg_found = True
-            break
-    
-    if not ffmpeg_found:
-        logger.warning("FFmpeg not found. Audio processing may not work properly.")
-        # Set dummy paths to avoid errors
-        AudioSegment.converter = "ffmpeg"
-        AudioSegment.ffprobe = "ffprobe"
+            return
+
+    logger.warning("FFmpeg not found. Audio processing may not work properly.")
+    # Set dummy paths to avoid errors
+    audio_segment_cls.converter = "ffmpeg"
+    audio_segment_cls.ffprobe = "ffprobe"
+
+
+@lru_cache(maxsize=None)
+def _audio_segment():
+    """pydub's AudioSegment, imported and pointed at ffmpeg on first use"""
+    from pydub import AudioSegment
+    _configure_ffmpeg(AudioSegment)
+    return AudioSegment
+
+
+@lru_cache(maxsize=None)
+def _speech_recognition():
+    import speech_recognition
+    return speech_recognition
+
+
+@lru_cache(maxsize=None)
+def _gtts():
+    import gtts.tts
+    if GOOGLE_TTS_URL:
+        gtts.tts._translate_url = lambda tld="com", path="": f"{GOOGLE_TTS_URL.rstrip('/')}/{path}"
+    return gtts
+
+
+@lru_cache(maxsize=None)
+def _langdetect():
+    import langdetect
+    return langdetect
+
+
+@lru_cache(maxsize=None)
+def _whisper_model():
+    """Whisper model, loaded once (importing whisper also imports torch)"""
+    import whisper
+    logger.info(f"Loading Whisper model '{WHISPER_MODEL}'")
+    return whisper.load_model(WHISPER_MODEL)
+
 
 class SimpleVoiceProcessor:
     def __init__(self):
-        self.recognizer = sr.Recognizer()
-        # Use the original settings that were working
-        self.recognizer.energy_threshold = 4000
-        self.recognizer.dynamic_energy_threshold = True
-        self.recognizer.pause_threshold = 0.8
-        self.recognizer.phrase_threshold = 0.1  # Lower phrase threshold
-        self.recognizer.non_speaking_duration = 0.3  # Shorter non-speaking duration
+        self._recognizer = None
+        self._recognizer_lock = threading.Lock()
+
+    @property
+    def recognizer(self):
+        """SpeechRecognition recognizer, created on first use"""
+        if self._recognizer is None:
+            with self._recognizer_lock:
+                if self._recognizer is None:
+                    recognizer = _speech_recognition().Recognizer()
+                    # Use the original settings that were working
+                    recognizer.energy_threshold = 4000
+                    recognizer.dynamic_energy_threshold = True
+                    recognizer.pause_threshold = 0.8
+                    recognizer.phrase_threshold = 0.1  # Lower phrase threshold
+                    recognizer.non_speaking_duration = 0.3  # Shorter non-speaking duration
+                    # Socket timeout for recognize_google, so a call abandoned at the STT deadline frees its thread
+                    recognizer.operation_timeout = STT_TIMEOUT
+                    self._recognizer = recognizer
+        return self._recognizer
+
+    def warm_up(self, whisper: bool = False):
+        """Import the audio stack ahead of the first voice request"""
+        _audio_segment()
+        _langdetect()
+        _gtts()
+        self.recognizer
+        if whisper:
+            _whisper_model()
 
     ####################################################
     # New helper: detect format from the first bytes
@@ -102,13 +179,18 @@ class SimpleVoiceProcessor:
     ####################################################
     # Conversion + validation helpers (use format hint if possible)
     ####################################################
-    def _convert_audio_to_segment(self, audio_data: bytes) -> AudioSegment:
+    @traced("audio.decode")
+    def _convert_audio_to_segment(self, audio_data: bytes, fmt: Optional[str] = None) -> "AudioSegment":
         """
         Convert raw audio bytes to AudioSegment, handling various formats.
         Uses header-based detection and passes explicit format to pydub to avoid ffprobe.
+        A format already sniffed by the upload reader can be passed as `fmt`.
         """
+        AudioSegment = _audio_segment()
+
         # First try to detect format from bytes
-        fmt = self.detect_format_from_bytes(audio_data)
+        if fmt is None:
+            fmt = self.detect_format_from_bytes(audio_data)
         logger.info(f"Detected format from bytes: {fmt}")
 
         # Try using the format hint
@@ -146,12 +228,14 @@ class SimpleVoiceProcessor:
             logger.error(f"Alternative audio conversion failed: {e2}")
             raise ValueError(f"Unsupported audio format: {e2}")
 
-    def validate_audio_format(self, audio_data: bytes) -> bool:
+    def validate_audio_format(self, audio_data: bytes, fmt: Optional[str] = None) -> bool:
         """
         Validate if audio data is in supported format with better error handling
         """
         try:
-            fmt = self.detect_format_from_bytes(audio_data)
+            AudioSegment = _audio_segment()
+            if fmt is None:
+                fmt = self.detect_format_from_bytes(audio_data)
             logger.info(f"validate_audio_format, detected: {fmt}")
             
             if fmt:
@@ -192,13 +276,14 @@ class SimpleVoiceProcessor:
             logger.error(f"Audio validation error: {e}")
             return False
 
-    def convert_audio_format(self, audio_data: bytes, target_format: str = "wav") -> bytes:
+    def convert_audio_format(self, audio_data: bytes, target_format: str = "wav",
+                             source_format: Optional[str] = None) -> bytes:
         """
         Convert audio to target format
         """
         try:
             # Use detected format if possible
-            audio_segment = self._convert_audio_to_segment(audio_data)
+            audio_segment = self._convert_audio_to_segment(audio_data, source_format)
 
             # Export to target format into BytesIO
             output = io.BytesIO()
@@ -247,11 +332,17 @@ class SimpleVoiceProcessor:
         "sv": "en",  # Swedish -> English (sometimes misclassified)
     }
 
-    def speech_to_text(self, audio_data: bytes, language: str = "auto") -> Tuple[str, str]:
+    @traced("stt")
+    def speech_to_text(self, audio_data: bytes, language: str = "auto",
+                       audio_format: Optional[str] = None) -> Tuple[str, str]:
+        if not upstream_available("stt"):
+            return self.speech_to_text_local(audio_data, audio_format)
+        sr = _speech_recognition()
+        langdetect = _langdetect()
         try:
             logger.info(f"Starting speech_to_text with {len(audio_data)} bytes, language: {language}")
             
-            audio_segment = self._convert_audio_to_segment(audio_data)
+            audio_segment = self._convert_audio_to_segment(audio_data, audio_format)
             logger.info(f"Audio segment created: {audio_segment.duration_seconds:.2f}s, {audio_segment.channels} channels, {audio_segment.frame_rate}Hz")
 
             # Save debug audio file to inspect
@@ -261,6 +352,7 @@ class SimpleVoiceProcessor:
 
             # Standardize audio
             audio_segment = audio_segment.set_frame_rate(16000).set_channels(1)
+            audio_seconds = audio_segment.duration_seconds
             current_dbfs = audio_segment.dBFS
             logger.info(f"Original audio dBFS: {current_dbfs}")
             if current_dbfs < -30:
@@ -289,23 +381,36 @@ class SimpleVoiceProcessor:
             }
             languages_to_try = ["en-IN", "en-US","te-IN", "hi-IN"]
             results = []
+            stt_endpoint = {"endpoint": GOOGLE_STT_ENDPOINT} if GOOGLE_STT_ENDPOINT else {}
 
             for lang in languages_to_try:
                 try:
                     logger.info(f"Trying recognition with language: {lang}")
-                    text = self.recognizer.recognize_google(audio, language=lang, show_all=False)
+                    # Each language attempt sends the whole clip upstream
+                    charge_current("stt_seconds", audio_seconds)
+                    # Recognition is idempotent, so a slow attempt is hedged
+                    with span("stt.google", language=lang):
+                        text = get_upstream("stt").call(
+                            self.recognizer.recognize_google, audio, language=lang, show_all=False,
+                            hedge=True, failures=(sr.RequestError,), **stt_endpoint
+                        )
                     if text and text.strip():
                         try:
-                            detected_lang = detect(text)
+                            detected_lang = langdetect.detect(text)
                             # Apply language corrections
                             corrected_lang = self.LANGUAGE_CORRECTIONS.get(detected_lang, detected_lang)
                             logger.info(f"Recognition with {lang}: '{text}' | Detected: {detected_lang} -> Corrected: {corrected_lang}")
                             results.append((text, lang, corrected_lang))
-                        except LangDetectException:
+                        except langdetect.LangDetectException:
                             logger.warning(f"Could not detect language for text: '{text}'")
                 except sr.UnknownValueError:
                     logger.warning(f"Could not recognize speech with language {lang}")
-                except sr.RequestError as e:
+                except CircuitOpen:
+                    # The other languages would fail fast the same way; the caller falls back to local STT
+                    logger.warning("Speech recognition circuit is open, skipping the remaining languages")
+                    break
+                except (sr.RequestError, UpstreamUnavailable) as e:
+                    # Skip this language; the breaker stops the loop if the service is down
                     logger.error(f"Speech recognition service error with language {lang}: {e}")
 
             # Prefer result where recognizer language matches detected language
@@ -328,7 +433,11 @@ class SimpleVoiceProcessor:
             logger.error(f"Speech to text error: {e}")
             return "", "en"
 
+    @traced("tts")
     def text_to_speech(self, text: str, language: str = "en") -> bytes:
+        if not upstream_available("tts"):
+            # Offline: the caller sends the answer as text only
+            return b""
         try:
             lang_mapping = {
                 'te': 'te',
@@ -339,16 +448,20 @@ class SimpleVoiceProcessor:
                 'de': 'de',
             }
             tts_lang = lang_mapping.get(language, 'en')
-            tts = gTTS(text=text, lang=tts_lang, slow=False)
+            charge_current("tts_chars", len(text))
+            tts = _gtts().gTTS(text=text, lang=tts_lang, slow=False)
             with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as temp_file:
                 tts.save(temp_file.name)
                 temp_name = temp_file.name
             with open(temp_name, 'rb') as f:
                 audio_bytes = f.read()
             os.unlink(temp_name)
+            report_success("tts")
             return audio_bytes
         except Exception as e:
             logger.error(f"Text to speech error: {e}")
+            if isinstance(e, _gtts().gTTSError):
+                report_failure("tts", e)
             return b""
 
     def get_supported_languages(self) -> dict:
@@ -381,12 +494,23 @@ class SimpleVoiceProcessor:
         """
         return ["wav", "mp3", "ogg", "webm", "m4a", "mp4"]
 
-    def speech_to_text_offline(self, audio_data: bytes) -> Tuple[str, str]:
+    def speech_to_text_local(self, audio_data: bytes, audio_format: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Recognition without the Google service: Whisper when it is installed
+        (it also detects Hindi and Telugu), else Sphinx (English only)
+        """
+        if importlib.util.find_spec("whisper") is not None:
+            return self.speech_to_text_whisper(audio_data, audio_format)
+        return self.speech_to_text_offline(audio_data, audio_format)
+
+    @traced("stt.offline")
+    def speech_to_text_offline(self, audio_data: bytes, audio_format: Optional[str] = None) -> Tuple[str, str]:
         """
         Try offline speech recognition as fallback
         """
+        sr = _speech_recognition()
         try:
-            audio_segment = self._convert_audio_to_segment(audio_data)
+            audio_segment = self._convert_audio_to_segment(audio_data, audio_format)
             audio_segment = audio_segment.set_frame_rate(16000).set_channels(1)
             
             with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_wav:
@@ -419,26 +543,29 @@ class SimpleVoiceProcessor:
             logger.error(f"Offline speech to text error: {e}")
             return "", "en"
 
-    def speech_to_text_whisper(self, audio_data: bytes) -> Tuple[str, str]:
+    @traced("stt.whisper")
+    def speech_to_text_whisper(self, audio_data: bytes, audio_format: Optional[str] = None) -> Tuple[str, str]:
         """
         Use OpenAI Whisper for speech recognition
         """
         try:
             logger.info("Trying Whisper speech recognition...")
             
-            audio_segment = self._convert_audio_to_segment(audio_data)
+            audio_segment = self._convert_audio_to_segment(audio_data, audio_format)
             audio_segment = audio_segment.set_frame_rate(16000).set_channels(1)
             
             with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_wav:
                 audio_segment.export(temp_wav.name, format='wav')
                 temp_name = temp_wav.name
 
-            # Load Whisper model
-            model = whisper.load_model("base")
+            # Loaded on the first call, then reused
+            model = _whisper_model()
             
             # Transcribe
             result = model.transcribe(temp_name)
             text = result["text"].strip()
+            language = result.get("language")
+            detected_lang = language if language in ("en", "hi", "te") else "en"
             
             try:
                 os.unlink(temp_name)
@@ -446,8 +573,8 @@ class SimpleVoiceProcessor:
                 pass
             
             if text:
-                logger.info(f"Whisper recognition successful: '{text}'")
-                return text, "en"
+                logger.info(f"Whisper recognition successful: '{text}' ({language})")
+                return text, detected_lang
             else:
                 logger.warning("Whisper recognition returned empty text")
                 return "", "en"
@@ -0,0 +1,223 @@
+# utils/warmup.py
+"""
+Startup warm-up and readiness.
+
+Each heavy subsystem registers a loader. At startup the selected loaders run
+in parallel on worker threads; /health/ready reports 503 until every required
+one has finished, so a load balancer only routes to hot replicas, while
+/health/live answers as soon as the process serves HTTP. Optional components
+never hold up readiness, and one still loading after WARMUP_OPTIONAL_TIMEOUT
+is reported as failed (it keeps loading in the background).
+
+Components marked shared are read-only once loaded. Under gunicorn with
+preload_app they are loaded once in the master by preload_shared(), and the
+forked workers share those pages copy-on-write instead of each loading a copy.
+
+    WARMUP            "none" (lazy, ready at once), "core" (text path, default),
+                      "all" (also STT, TTS and Whisper) or a comma list of names
+    WARMUP_LANGUAGES  languages whose static disease-report text is pre-translated
+    WARMUP_OPTIONAL_TIMEOUT  seconds the optional loaders get (default 60)
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+WARMUP = os.getenv("WARMUP", "core").strip().lower()
+WARMUP_LANGUAGES = [lang.strip() for lang in os.getenv("WARMUP_LANGUAGES", "te,hi").split(",") if lang.strip()]
+WARMUP_OPTIONAL_TIMEOUT = float(os.getenv("WARMUP_OPTIONAL_TIMEOUT", 60))
+
+PENDING, WARMING, READY, FAILED, SKIPPED = "pending", "warming", "ready", "failed", "skipped"
+
+
+@dataclass(slots=True)
+class Component:
+    name: str
+    loader: Callable[[], object]
+    # Readiness waits for required components; optional ones may fail (their feature degrades)
+    required: bool = True
+    core: bool = True
+    # Read-only after loading, so safe to load before forking workers
+    shared: bool = False
+    status: str = PENDING
+    seconds: Optional[float] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        report = {"status": self.status, "required": self.required}
+        if self.seconds is not None:
+            report["seconds"] = round(self.seconds, 3)
+        if self.error:
+            report["error"] = self.error
+        return report
+
+
+class WarmupRegistry:
+    def __init__(self, selection: str = WARMUP):
+        self.selection = selection
+        self._components: Dict[str, Component] = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def register(self, name: str, loader: Callable[[], object], required: bool = True, core: bool = True,
+                 shared: bool = False):
+        """core components are warmed by WARMUP=core; the rest only by "all" or by name"""
+        self._components[name] = Component(name, loader, required, core, shared)
+
+    def _selected(self, component: Component) -> bool:
+        if self.selection == "none":
+            return False
+        if self.selection == "all":
+            return True
+        if self.selection == "core":
+            return component.core
+        return component.name in {name.strip() for name in self.selection.split(",")}
+
+    def _warm(self, component: Component):
+        with self._lock:
+            component.status = WARMING
+        started = time.perf_counter()
+        try:
+            component.loader()
+            status, error = READY, None
+        except Exception as e:
+            status, error = FAILED, f"{type(e).__name__}: {e}"
+            print(f"Warm-up of {component.name} failed: {error}")
+        with self._lock:
+            component.status, component.error = status, error
+            component.seconds = time.perf_counter() - started
+
+    def preload_shared(self):
+        """Load the shared components in this (pre-fork) process, one after another"""
+        for component in self._components.values():
+            if component.shared and self._selected(component):
+                self._warm(component)
+
+    async def run(self, optional_timeout: float = WARMUP_OPTIONAL_TIMEOUT):
+        """Warm every selected component concurrently; optional ones get optional_timeout seconds"""
+        selected = [c for c in self._components.values() if self._selected(c) and c.status != READY]
+        for component in self._components.values():
+            if not self._selected(component):
+                component.status = SKIPPED
+        if selected:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + optional_timeout
+            executor = ThreadPoolExecutor(max_workers=len(selected), thread_name_prefix="warmup")
+            futures = {loop.run_in_executor(executor, self._warm, c): c for c in selected}
+            required = [f for f, c in futures.items() if c.required]
+            optional = [f for f, c in futures.items() if not c.required]
+            if required:
+                await asyncio.gather(*required)
+            if optional:
+                _, late = await asyncio.wait(optional, timeout=max(0.0, deadline - loop.time()))
+                with self._lock:
+                    for future in late:
+                        # _warm still records the outcome if the loader finishes later
+                        component = futures[future]
+                        component.status = FAILED
+                        component.error = f"did not finish within {optional_timeout:g}s"
+                        print(f"Warm-up of {component.name} is still running after {optional_timeout:g}s")
+            # Do not wait for loaders that overran their deadline
+            executor.shutdown(wait=False)
+        self.finished_at = time.time()
+
+    @property
+    def ready(self) -> bool:
+        """Every selected required component is loaded; optional ones never hold this up"""
+        with self._lock:
+            return all(
+                c.status in (READY, SKIPPED) for c in self._components.values()
+                if c.required and self._selected(c)
+            )
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            components = {name: c.to_dict() for name, c in self._components.items()}
+        return {
+            "ready": self.ready,
+            "mode": self.selection,
+            "warmup_seconds": round(self.finished_at - self.started_at, 3) if self.finished_at else None,
+            "components": components,
+        }
+
+
+def _pretranslate():
+    from tools.disease_detector import pretranslate_disease_blocks
+    from utils.translator import pretranslate
+    from agent import OFFLINE_MESSAGES
+    for lang in WARMUP_LANGUAGES:
+        pretranslate_disease_blocks(lang)
+        # Offline answers are served from this cache when Google Translate is unreachable
+        pretranslate(OFFLINE_MESSAGES, lang)
+
+
+def _llm_pool():
+    from utils.llm_client import get_llm_client
+    get_llm_client().warm_up()
+
+
+def _router():
+    from utils.intent_router import get_intent_router
+    get_intent_router()
+
+
+def _retrieval():
+    from utils.retrieval import get_retrieval_index
+    get_retrieval_index()
+
+
+def _districts():
+    from data.district_index import get_district_index
+    get_district_index()
+
+
+def _schemes():
+    from data.gov_scheme_loader import get_scheme_catalogue
+    get_scheme_catalogue()
+
+
+def _agent():
+    from agent import warm_up_agent
+    warm_up_agent()
+
+
+def _audio():
+    from utils.voice_utils_simple import voice_processor
+    voice_processor.warm_up()
+
+
+def _whisper():
+    from utils.voice_utils_simple import voice_processor
+    voice_processor.warm_up(whisper=True)
+
+
+def default_registry() -> WarmupRegistry:
+    registry = WarmupRegistry()
+    registry.register("intent_router", _router, shared=True)
+    registry.register("retrieval_index", _retrieval, shared=True)
+    registry.register("scheme_catalogue", _schemes, shared=True)
+    registry.register("district_index", _districts, shared=True)
+    registry.register("agent", _agent)
+    # Needs the network; a failure only means the first LLM call connects itself
+    registry.register("llm_pool", _llm_pool, required=False)
+    registry.register("translation_cache", _pretranslate, required=False)
+    registry.register("stt_tts", _audio, core=False)
+    registry.register("whisper", _whisper, required=False, core=False)
+    return registry
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_warmup_registry() -> WarmupRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = default_registry()
+    return _registry
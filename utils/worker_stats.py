@@ -0,0 +1,105 @@
+# utils/worker_stats.py
+"""
+Host-wide view of the per-process statistics in multi-worker mode.
+
+Metrics, cache, router, LLM and admission counters live in each worker
+process. With a shared store every worker publishes the raw state of each
+registered source under stats:<source>:<pid> every WORKER_STATS_INTERVAL
+seconds (and its own fresh state whenever it serves a stats endpoint), with a
+TTL so that workers which exited drop out. collect_stats() returns the states of
+all live workers, which each source combines into one report. Without a
+shared store collect_stats() returns only this process's state.
+
+    WORKER_STATS_INTERVAL   seconds between publishes (default 5)
+"""
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from utils.shared_store import get_shared_store
+
+WORKER_STATS_INTERVAL = float(os.getenv("WORKER_STATS_INTERVAL", 5))
+
+_PREFIX = "stats:"
+
+# Source name -> callable returning its JSON-serializable state (None while it has none)
+_sources: Dict[str, Callable[[], Optional[Any]]] = {}
+_publisher = None
+_stop = threading.Event()
+
+
+def multi_worker() -> bool:
+    return get_shared_store() is not None
+
+
+def register_stats(name: str, state: Callable[[], Optional[Any]]):
+    _sources[name] = state
+
+
+def _key(name: str) -> str:
+    return f"{_PREFIX}{name}:{os.getpid()}"
+
+
+def _publish(store, name: str, state: Optional[Any]):
+    if state is not None:
+        # Three missed publishes and the worker is taken for gone
+        store.set(_key(name), state, ttl=3 * WORKER_STATS_INTERVAL)
+
+
+def publish_stats():
+    """Write every source's current state for this worker"""
+    store = get_shared_store()
+    if store is None:
+        return
+    for name, state in _sources.items():
+        try:
+            _publish(store, name, state())
+        except Exception as e:
+            print(f"Publishing {name} stats failed: {e}")
+
+
+def collect_stats(name: str) -> Dict[str, Any]:
+    """State of the source in every live worker, by pid (this process's is always current)"""
+    own = _sources[name]()
+    store = get_shared_store()
+    if store is None:
+        return {str(os.getpid()): own} if own is not None else {}
+    _publish(store, name, own)
+    prefix = f"{_PREFIX}{name}:"
+    return {key[len(prefix):]: state for key, state in store.items_prefix(prefix).items()}
+
+
+def start_stats_publisher():
+    """Publish from a daemon thread; a no-op without a shared store. Call once per worker"""
+    global _publisher
+    if get_shared_store() is None or _publisher is not None:
+        return
+    _stop.clear()
+
+    def run():
+        while not _stop.wait(WORKER_STATS_INTERVAL):
+            publish_stats()
+
+    publish_stats()
+    _publisher = threading.Thread(target=run, name="worker-stats", daemon=True)
+    _publisher.start()
+
+
+def stop_stats_publisher():
+    """Stop the thread and withdraw this worker's states, so totals drop it at once"""
+    global _publisher
+    _stop.set()
+    _publisher = None
+    store = get_shared_store()
+    if store is not None:
+        for name in _sources:
+            store.delete(_key(name))
+
+
+def _after_fork_in_child():
+    # The publisher thread is not copied into a forked worker; the worker starts its own
+    global _publisher
+    _publisher = None
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)